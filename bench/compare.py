@@ -0,0 +1,64 @@
+"""
+Compares two bench.run reports scenario by scenario.
+
+    python -m bench.compare before.json after.json
+"""
+import sys
+import json
+import argparse
+
+METRICS = [
+    ("throughput_rps", lambda s: s["throughput_rps"]),
+    ("p50_ms", lambda s: s["latency_ms"]["p50"]),
+    ("p95_ms", lambda s: s["latency_ms"]["p95"]),
+    ("p99_ms", lambda s: s["latency_ms"]["p99"]),
+    ("errors", lambda s: s["errors"]),
+]
+
+
+def compare(before: dict, after: dict) -> dict:
+    result = {"scenarios": {}, "peak_rss_mb": _delta(before.get("peak_rss_mb"), after.get("peak_rss_mb"))}
+    for name in sorted(set(before["scenarios"]) | set(after["scenarios"])):
+        old, new = before["scenarios"].get(name), after["scenarios"].get(name)
+        if old is None or new is None:
+            continue
+        result["scenarios"][name] = {metric: _delta(get(old), get(new)) for metric, get in METRICS}
+    return result
+
+
+def _delta(old, new):
+    if old is None or new is None:
+        return {"before": old, "after": new}
+    change = round((new - old) / old * 100, 1) if old else None
+    return {"before": old, "after": new, "change_pct": change}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two benchmark reports")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--json", action="store_true", help="print the diff as JSON")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    diff = compare(before, after)
+
+    if args.json:
+        json.dump(diff, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{'scenario':<22}{'metric':<16}{'before':>12}{'after':>12}{'change':>10}")
+    for name, metrics in diff["scenarios"].items():
+        for metric, d in metrics.items():
+            change = f"{d['change_pct']:+.1f}%" if d.get("change_pct") is not None else "-"
+            print(f"{name:<22}{metric:<16}{d['before']:>12}{d['after']:>12}{change:>10}")
+    rss = diff["peak_rss_mb"]
+    print(f"{'peak_rss_mb':<38}{rss['before']!s:>12}{rss['after']!s:>12}")
+
+
+if __name__ == "__main__":
+    main()
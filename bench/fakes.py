@@ -0,0 +1,134 @@
+"""
+Local stand-ins for the external services the API calls, so benchmarks run
+offline and measure our own code rather than network variance.
+"""
+import json
+import math
+import asyncio
+import hashlib
+import threading
+from types import SimpleNamespace
+
+# Roughly what Gemini sends per streamed chunk.
+STREAM_CHUNK_CHARS = 120
+
+FAKE_QUIZ = {
+    "mcqs": [{"question": f"Question {i}?", "options": ["A", "B", "C", "D"], "answer_index": i % 4,
+              "explanation": "Because."} for i in range(5)],
+    "saqs": [{"question": f"Short question {i}?", "answer": "A short answer."} for i in range(3)],
+    "laqs": [{"question": "Long question?", "answer_outline": ["Point one", "Point two"]}],
+}
+
+
+class FakeGeminiModel:
+    """
+    Mimics google.generativeai.GenerativeModel: waits `latency` seconds to
+    first token, then streams the reply at `tokens_per_second`.
+    """
+    latency = 0.3
+    tokens_per_second = 200.0
+
+    def __init__(self, model_name: str = "fake", **kwargs):
+        self.model_name = model_name
+
+    def _reply(self, prompt: str) -> str:
+        if "exam generator" in prompt:
+            return "```json\n" + json.dumps(FAKE_QUIZ) + "\n```"
+        return "This is a benchmark answer (p. 1). " * 8
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False, **kwargs):
+        text = self._reply(prompt if isinstance(prompt, str) else json.dumps(prompt, default=str))
+        if stream:
+            return self._stream(text)
+        tokens = len(text) / 4
+        await asyncio.sleep(self.latency + tokens / self.tokens_per_second)
+        return _fake_response(text)
+
+    async def _stream(self, text: str):
+        await asyncio.sleep(self.latency)
+        for i in range(0, len(text), STREAM_CHUNK_CHARS):
+            piece = text[i:i + STREAM_CHUNK_CHARS]
+            await asyncio.sleep(len(piece) / 4 / self.tokens_per_second)
+            yield _fake_response(piece)
+
+
+def _fake_response(text: str):
+    part = SimpleNamespace(text=text)
+    candidate = SimpleNamespace(content=SimpleNamespace(parts=[part]), finish_reason="STOP")
+    return SimpleNamespace(candidates=[candidate], text=text)
+
+
+class FakeEmbeddings:
+    """
+    Deterministic hashing embedder with the same dimension as the real model,
+    so nothing has to be downloaded.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def _embed(self, text: str):
+        vector = [0.0] * self.dimension
+        for word in text.lower().split():
+            h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vector[h % self.dimension] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_query(self, text: str):
+        return self._embed(text)
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+
+class FakeVectorIndex:
+    """
+    In-process replacement for a Pinecone index: upsert, query (cosine over
+    normalised vectors), delete and describe_index_stats per namespace.
+    """
+
+    def __init__(self):
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors, namespace: str = ""):
+        with self._lock:
+            store = self._namespaces.setdefault(namespace, {})
+            for v in vectors:
+                store[v["id"]] = (v["values"], v.get("metadata", {}))
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector, top_k: int = 10, namespace: str = "", include_metadata: bool = False, **kwargs):
+        with self._lock:
+            items = list(self._namespaces.get(namespace, {}).items())
+        scored = []
+        for vector_id, (values, metadata) in items:
+            score = sum(a * b for a, b in zip(vector, values))
+            scored.append(SimpleNamespace(id=vector_id, score=score,
+                                          metadata=metadata if include_metadata else None))
+        scored.sort(key=lambda m: m.score, reverse=True)
+        return SimpleNamespace(matches=scored[:top_k])
+
+    def delete(self, ids=None, delete_all: bool = False, namespace: str = "", **kwargs):
+        with self._lock:
+            if delete_all:
+                self._namespaces.pop(namespace, None)
+            else:
+                store = self._namespaces.get(namespace, {})
+                for vector_id in ids or []:
+                    store.pop(vector_id, None)
+        return {}
+
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            return {"namespaces": {ns: {"vector_count": len(store)} for ns, store in self._namespaces.items()},
+                    "total_vector_count": sum(len(s) for s in self._namespaces.values())}
+
+
+def fake_verify_id_token(token: str, *args, **kwargs) -> dict:
+    # Benchmark tokens are "bench-<uid>"; anything else is rejected like a bad JWT.
+    if not token.startswith("bench-"):
+        raise ValueError("Invalid benchmark token")
+    uid = token[len("bench-"):]
+    return {"uid": uid, "email": f"{uid}@bench.local", "name": uid}
@@ -0,0 +1,54 @@
+"""
+Measures how long `import main` takes in a fresh interpreter and which
+modules dominate, using `python -X importtime`. Prints JSON so the numbers
+can be tracked across versions alongside bench.run reports.
+
+    python -m bench.import_time --repeat 5
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+
+def measure_once(module: str):
+    env = dict(os.environ, LOG_LEVEL="WARNING")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    # Lines look like: "import time:  self [us] | cumulative | imported package"
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of the API")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [measure_once(args.module) for _ in range(args.repeat)]
+    totals = [run.get(args.module, 0) / 1e6 for run in runs]
+    packages = {name: us for name, us in runs[-1].items() if "." not in name and name != args.module}
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    print(json.dumps({
+        "module": args.module,
+        "import_seconds": {"median": round(statistics.median(totals), 4), "min": round(min(totals), 4),
+                           "max": round(max(totals), 4), "runs": len(totals)},
+        "heaviest_modules_seconds": {name: round(us / 1e6, 4) for name, us in heaviest},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
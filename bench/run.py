@@ -0,0 +1,297 @@
+"""
+Offline load benchmark for the API.
+
+Runs the FastAPI app in-process against local fakes for Gemini, Pinecone,
+Firebase and (optionally) MongoDB, drives the main endpoints at a fixed
+concurrency and prints a JSON report that can be diffed between versions
+with `python -m bench.compare`.
+
+    python -m bench.run --concurrency 16 --requests 200 --output before.json
+"""
+import os
+import tempfile
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+from datetime import datetime
+from types import SimpleNamespace
+
+from bench.fakes import FakeGeminiModel, FakeEmbeddings, FakeVectorIndex, fake_verify_id_token, FAKE_QUIZ
+
+SCENARIOS = ["upload", "chat_ask", "quiz_generate", "quiz_generate_stream", "progress",
+             "revise_chat_ask", "revise_chat_history", "revise_chat_session"]
+
+
+def install_fakes(args) -> FakeVectorIndex:
+    """
+    Patches external clients before `main` is imported. Must run first.
+    """
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    os.environ.setdefault("PINECONE_API_KEY", "bench")
+    os.environ.setdefault("PINECONE_ENVIRONMENT", "bench")
+    os.environ["RAG_ENABLED"] = "true"
+    os.environ["YOUTUBE_API_KEY"] = ""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["WARMUP_ON_STARTUP"] = "false"
+    # A handful of bench users would exhaust their buckets immediately.
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    # Every bench user repeats the same request; reusing finished results
+    # would measure the cache rather than quiz and answer generation.
+    os.environ["QUIZ_FLIGHT_GRACE_SECONDS"] = "0"
+    os.environ["ANSWER_FLIGHT_GRACE_SECONDS"] = "0"
+    os.environ.setdefault("BLOB_CACHE_DIR", tempfile.mkdtemp(prefix="revisely-bench-blobs-"))
+
+    import google.generativeai as genai
+    FakeGeminiModel.latency = args.gemini_latency
+    FakeGeminiModel.tokens_per_second = args.gemini_token_rate
+    genai.GenerativeModel = FakeGeminiModel
+
+    import firebase_admin
+    from firebase_admin import auth as firebase_auth
+    firebase_auth.verify_id_token = fake_verify_id_token
+    firebase_admin._apps.setdefault("[DEFAULT]", SimpleNamespace(name="[DEFAULT]"))
+
+    if args.mongo == "memory":
+        import mongomock
+        import mongomock_motor
+        import pymongo
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = lambda *a, **kw: mongomock_motor.AsyncMongoMockClient()
+        pymongo.MongoClient = lambda *a, **kw: mongomock.MongoClient()
+
+    vector_index = FakeVectorIndex()
+    import services.pinecone_client as pinecone_client
+    import services.rag_engine as rag_engine
+    pinecone_client.get_pinecone_index = lambda dimension=384, metric="cosine", name=None: vector_index
+    rag_engine.get_pinecone_index = pinecone_client.get_pinecone_index
+    rag_engine._embeddings = FakeEmbeddings()
+    return vector_index
+
+
+def make_pdf(pages: int) -> bytes:
+    import fitz
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        text = (f"Chapter {i + 1}. Photosynthesis converts light energy into chemical energy. "
+                "Chlorophyll absorbs light in the chloroplast, and the Calvin cycle fixes carbon dioxide. ") * 12
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=10)
+    return doc.tobytes()
+
+
+async def seed(db, args, pdf_bytes: bytes):
+    from services.rag_engine import index_pdf_content
+
+    users = []
+    for i in range(args.users):
+        uid = f"bench{i}"
+        result = await db.users.insert_one({"uid": uid, "email": f"{uid}@bench.local",
+                                            "display_name": uid, "created_at": datetime.utcnow()})
+        user_id = str(result.inserted_id)
+        content = await db.pdfs_content.insert_one({"filename": "bench.pdf", "content": pdf_bytes,
+                                                    "mimetype": "application/pdf", "created_at": datetime.utcnow(),
+                                                    "user_id": user_id})
+        pdf = await db.pdfs.insert_one({"title": "bench.pdf", "user_id": user_id, "file_id": str(content.inserted_id),
+                                        "created_at": datetime.utcnow(), "is_indexed": True})
+        pdf_id = str(pdf.inserted_id)
+        await asyncio.to_thread(index_pdf_content, pdf_id, pdf_bytes)
+
+        quiz = await db.quizzes.insert_one({"pdf_id": pdf_id, "questions": FAKE_QUIZ,
+                                            "created_at": datetime.utcnow()})
+        for _ in range(args.history):
+            await db.quiz_attempts.insert_one({"quiz_id": str(quiz.inserted_id), "user_id": user_id, "score": 3,
+                                               "answers": {"mcq": {"0": 0, "1": 1}}, "created_at": datetime.utcnow()})
+            await db.revise_chat_sessions.insert_one({"user_id": user_id, "title": "Bench session",
+                                                      "messages": [{"role": "user", "content": "What is ATP?", "timestamp": datetime.utcnow()},
+                                                                   {"role": "assistant", "content": "An energy carrier.", "timestamp": datetime.utcnow()}],
+                                                      "created_at": datetime.utcnow(), "updated_at": datetime.utcnow()})
+        session = await db.revise_chat_sessions.find_one({"user_id": user_id})
+        users.append({"headers": {"Authorization": f"Bearer bench-{uid}"}, "pdf_id": pdf_id,
+                      "session_id": str(session["_id"]) if session else None})
+    return users
+
+
+def build_scenarios(pdf_bytes: bytes):
+    async def upload(client, user):
+        return await client.post("/upload/upload", headers=user["headers"],
+                                 files={"file": ("bench.pdf", pdf_bytes, "application/pdf")})
+
+    async def chat_ask(client, user):
+        return await client.post("/chat/ask", headers=user["headers"],
+                                 json={"pdf_id": user["pdf_id"], "question": "How does the Calvin cycle fix carbon?"})
+
+    async def quiz_generate(client, user):
+        return await client.post("/quiz/generate", headers=user["headers"], params={"pdf_id": user["pdf_id"]})
+
+    async def quiz_generate_stream(client, user):
+        return await client.post("/quiz/generate/stream", headers=user["headers"], params={"pdf_id": user["pdf_id"]})
+
+    async def progress(client, user):
+        return await client.get("/progress/", headers=user["headers"])
+
+    async def revise_chat_ask(client, user):
+        return await client.post("/revise-chat/ask", headers=user["headers"],
+                                 json={"question": "Explain oxidative phosphorylation.", "session_id": user["session_id"]})
+
+    async def revise_chat_history(client, user):
+        return await client.get("/revise-chat/history", headers=user["headers"])
+
+    async def revise_chat_session(client, user):
+        return await client.get(f"/revise-chat/{user['session_id']}", headers=user["headers"])
+
+    return {
+        "upload": upload,
+        "chat_ask": chat_ask,
+        "quiz_generate": quiz_generate,
+        "quiz_generate_stream": quiz_generate_stream,
+        "progress": progress,
+        "revise_chat_ask": revise_chat_ask,
+        "revise_chat_history": revise_chat_history,
+        "revise_chat_session": revise_chat_session,
+    }
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile.
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+async def run_scenario(client, users, fn, total: int, concurrency: int, warmup: int) -> dict:
+    for i in range(warmup):
+        await fn(client, users[i % len(users)])
+
+    latencies = []
+    errors = 0
+    status_codes = {}
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            user = users[i % len(users)]
+            started = time.perf_counter()
+            try:
+                response = await fn(client, user)
+                code = response.status_code
+            except Exception:
+                code = "exception"
+            latencies.append(time.perf_counter() - started)
+            status_codes[str(code)] = status_codes.get(str(code), 0) + 1
+            if code == "exception" or code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "status_codes": status_codes,
+        "duration_s": round(duration, 4),
+        "throughput_rps": round(total / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+async def run(args) -> dict:
+    install_fakes(args)
+    import httpx
+    import main
+    if args.mongo == "memory":
+        async def mongo_ok(client):
+            return True
+        main.check_db_connection = mongo_ok
+
+    pdf_bytes = make_pdf(args.pages)
+    report_scenarios = {}
+    async with main.app.router.lifespan_context(main.app):
+        users = await seed(main.app.db, args, pdf_bytes)
+        scenarios = build_scenarios(pdf_bytes)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for name in args.scenarios:
+                report_scenarios[name] = await run_scenario(
+                    client, users, scenarios[name], args.requests, args.concurrency, args.warmup)
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "users": args.users,
+            "history": args.history,
+            "pages": args.pages,
+            "mongo": args.mongo,
+            "gemini_latency_s": args.gemini_latency,
+            "gemini_token_rate": args.gemini_token_rate,
+        },
+        "scenarios": report_scenarios,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline API benchmark")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per scenario")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--history", type=int, default=20, help="quiz attempts and chat sessions seeded per user")
+    parser.add_argument("--pages", type=int, default=20, help="pages in the generated PDF")
+    parser.add_argument("--mongo", choices=["memory", "uri"], default="memory",
+                        help="in-memory mongomock, or the server at MONGODB_URI (use a throwaway database)")
+    parser.add_argument("--gemini-latency", type=float, default=0.3, help="seconds to first token")
+    parser.add_argument("--gemini-token-rate", type=float, default=200.0, help="output tokens per second")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Measures memory per server worker, to size how many workers fit on a node.
+
+Starts the API with 1..N workers either pre-forked from a preloaded master
+(`gunicorn -c gunicorn.conf.py`) or as independently spawned processes
+(`uvicorn --workers`), waits for it to settle, and reads RSS, PSS and USS of
+every process from /proc (Linux only). PSS splits shared copy-on-write pages
+between the processes that map them, so total PSS is the real footprint and
+its growth per added worker is the cost of one more worker.
+
+    python -m bench.worker_memory --workers 1 2 4 --mode prefork spawn
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+import urllib.request
+
+
+def _children(pid: int):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def _memory(pid: int) -> dict:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    uss = values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+    return {"pid": pid, "rss_mb": round(values.get("Rss", 0) / 1024, 1),
+            "pss_mb": round(values.get("Pss", 0) / 1024, 1), "uss_mb": round(uss / 1024, 1)}
+
+
+def _wait_healthy(port: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=2) as r:
+                if r.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"server on port {port} did not become healthy in {timeout}s")
+
+
+def measure(mode: str, workers: int, port: int, settle: float, timeout: float) -> dict:
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), LOG_LEVEL="WARNING")
+    if mode == "prefork":
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers)]
+
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_healthy(port, timeout)
+        # Give the post-startup warm-up (model loading in spawned workers) time to finish.
+        time.sleep(settle)
+        master = _memory(proc.pid)
+        worker_stats = [_memory(pid) for pid in _children(proc.pid)]
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    everything = [master] + worker_stats
+    return {
+        "mode": mode,
+        "workers": workers,
+        "total_rss_mb": round(sum(p["rss_mb"] for p in everything), 1),
+        "total_pss_mb": round(sum(p["pss_mb"] for p in everything), 1),
+        "master": master,
+        "processes": worker_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory per API worker")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--mode", nargs="+", choices=["prefork", "spawn"], default=["prefork", "spawn"])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--settle", type=float, default=20.0, help="seconds to wait after the server is healthy")
+    parser.add_argument("--timeout", type=float, default=180.0)
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.mode:
+        previous = None
+        for workers in sorted(args.workers):
+            result = measure(mode, workers, args.port, args.settle, args.timeout)
+            if previous is not None:
+                result["pss_mb_per_added_worker"] = round(
+                    (result["total_pss_mb"] - previous["total_pss_mb"]) / (workers - previous["workers"]), 1)
+            results.append(result)
+            previous = result
+
+    print(json.dumps({"results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# Pre-fork multi-worker server: gunicorn imports the app and loads the
+# embedding model once in the master, then forks workers that share those
+# pages copy-on-write. Run with:
+#
+#     gunicorn -c gunicorn.conf.py main:app
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# Read by the app, e.g. to share rate-limit buckets between the workers.
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+# Metrics from all workers are aggregated through files in this directory.
+# It must be set before prometheus_client is imported, i.e. before the app.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR",
+                      tempfile.mkdtemp(prefix="revisely-prometheus-"))
+
+
+def when_ready(server):
+    from services.prefork import preload_shared_state
+    preload_shared_state()
+    server.log.info("Preloaded shared state; forking %s workers", server.num_workers)
+
+
+def post_fork(server, worker):
+    from services.prefork import reset_after_fork
+    reset_after_fork(server.num_workers)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
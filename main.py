@@ -1,43 +1,107 @@
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from routers import auth, upload, quiz, progress, chat, youtube, revise_chat
+from services.logging_config import configure_logging
+
+configure_logging()
+
+from routers import auth, upload, quiz, progress, chat, youtube, revise_chat, admin
 import os
-from fastapi import FastAPI, BackgroundTasks
+import asyncio
+import logging
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import motor.motor_asyncio
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from services import readiness
+from services import index_versions
+from services.job_queue import ensure_job_indexes
+from services.pagination import ensure_list_indexes
+from services.rate_limit import ensure_rate_limit_indexes
+from services.gemini_client import LLMOverloaded
+from services.youtube_recommender import ensure_youtube_cache_indexes, close_http_client
+from services.metrics import HTTP_REQUESTS, HTTP_REQUEST_LATENCY, MongoCommandListener, update_job_queue_depth, render_metrics
+from services.request_timing import start_request_timing, end_request_timing, server_timing_header
+from services.profiler import maybe_start_profiler, finish_profiler, refresh_profiling_settings, keep_profiling_settings_fresh
+from prometheus_client import CONTENT_TYPE_LATEST
+
+logger = logging.getLogger("main")
 
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/revisely_db")
+MONGO_PING_TIMEOUT_SECONDS = 5
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+RAG_ENABLED = os.getenv("RAG_ENABLED", "true").lower() in ("1", "true", "yes")
 
-async_client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
-db = async_client.get_database("revisely_db")
+app = FastAPI(title="BeyondChats Backend (Full)", default_response_class=ORJSONResponse)
+app.state.warmup_task = None
 
-sync_client = MongoClient(MONGODB_URI)
-sync_db = sync_client.get_database("revisely_db")
 
-def check_db_connection():
+async def check_db_connection(client) -> bool:
     try:
-        sync_client.admin.command('ismaster')
+        await asyncio.wait_for(client.admin.command("ping"), timeout=MONGO_PING_TIMEOUT_SECONDS)
         return True
-    except ConnectionFailure:
+    except Exception as e:
+        logger.warning("MongoDB ping failed: %s", e)
         return False
 
-app = FastAPI(title="BeyondChats Backend (Full)")
+
+def _warm_subsystems():
+    # Runs in a thread after startup so the first user request doesn't pay for
+    # model loading; each subsystem failing only leaves it cold.
+    from services.gemini_client import get_genai
+    from services.pinecone_client import get_pinecone_client
+    from services.rag_engine import get_embeddings
+
+    warmers = [("firebase", auth.get_firebase_auth), ("gemini", get_genai)]
+    if RAG_ENABLED:
+        warmers += [("pinecone", get_pinecone_client), ("embeddings", get_embeddings)]
+    for name, warm in warmers:
+        try:
+            warm()
+        except Exception as e:
+            logger.warning("Failed to warm up %s: %s", name, e)
+
 
 @app.on_event("startup")
 async def startup_db_client():
-    app.mongodb_client = async_client
-    app.db = db
-    if not check_db_connection():
-        print("Warning: MongoDB connection failed. Some features may not work.")
+    app.mongodb_client = motor.motor_asyncio.AsyncIOMotorClient(
+        MONGODB_URI, event_listeners=[MongoCommandListener()])
+    app.db = app.mongodb_client.get_database("revisely_db")
+    if not await check_db_connection(app.mongodb_client):
+        logger.warning("MongoDB connection failed. Some features may not work.")
     else:
-        print("MongoDB connected successfully")
+        logger.info("MongoDB connected successfully")
+        readiness.mark_warm("mongo")
+        await ensure_job_indexes(app.db)
+        await ensure_youtube_cache_indexes(app.db)
+        await ensure_list_indexes(app.db)
+        await ensure_rate_limit_indexes(app.db)
+        await index_versions.refresh_index_configs(app.db)
+        await refresh_profiling_settings(app.db)
+    app.state.stop = asyncio.Event()
+    app.state.index_config_task = asyncio.create_task(
+        index_versions.keep_index_configs_fresh(app.db, app.state.stop))
+    app.state.profiling_settings_task = asyncio.create_task(
+        keep_profiling_settings_fresh(app.db, app.state.stop))
+    if WARMUP_ON_STARTUP:
+        app.state.warmup_task = asyncio.create_task(asyncio.to_thread(_warm_subsystems))
+
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded(request: Request, exc: LLMOverloaded):
+    return ORJSONResponse({"detail": "Server is busy, please retry shortly"}, status_code=429,
+                          headers={"Retry-After": str(exc.retry_after)})
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.stop.set()
+    await app.state.index_config_task
+    await app.state.profiling_settings_task
+    await close_http_client()
     app.mongodb_client.close()
 
 allowed_origins = [
@@ -45,7 +109,7 @@ allowed_origins = [
     os.getenv("FRONTEND_URL", ""),
 ]
 allowed_origins = [origin for origin in allowed_origins if origin]
-print(f"[DEBUG] CORS allowed origins: {allowed_origins}")
+logger.debug("CORS allowed origins: %s", allowed_origins)
 
 app.add_middleware(
     CORSMiddleware,
@@ -53,15 +117,66 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
-async def build_index_background(pdf_id: str, file_id: str):
-    from services.rag_engine import build_vectorstore_for_pdf
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    started = time.perf_counter()
+    timing_token = start_request_timing()
+    profiler = maybe_start_profiler()
+    status = 500
     try:
-        await build_vectorstore_for_pdf(pdf_id, file_id, app.db)
-        print(f"Successfully built index for PDF {pdf_id}")
+        response = await call_next(request)
+        status = response.status_code
+        elapsed = time.perf_counter() - started
+        response.headers["Server-Timing"] = server_timing_header(
+            end_request_timing(timing_token), total=elapsed)
+        timing_token = None
+        return response
+    finally:
+        if timing_token is not None:
+            end_request_timing(timing_token)
+        # Label by route template, not raw path, to keep label cardinality bounded.
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        HTTP_REQUESTS.labels(request.method, route_path, status).inc()
+        HTTP_REQUEST_LATENCY.labels(request.method, route_path).observe(
+            time.perf_counter() - started)
+        if profiler is not None:
+            # Joins the sampler thread and writes the file; keep both off the event loop.
+            await asyncio.to_thread(finish_profiler, profiler, f"{request.method}-{route_path}")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    try:
+        await update_job_queue_depth(app.db)
     except Exception as e:
-        print(f"Failed to build index for PDF {pdf_id}: {e}")
+        logger.warning("Failed to read job queue depth: %s", e)
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    if await check_db_connection(app.mongodb_client):
+        readiness.mark_warm("mongo")
+    else:
+        readiness.mark_cold("mongo")
+    warmup_task = app.state.warmup_task
+    warmup_done = warmup_task is None or warmup_task.done()
+    ready = readiness.is_warm("mongo") and warmup_done
+    body = {
+        "ready": ready,
+        "warmup_done": warmup_done,
+        "subsystems": readiness.snapshot(),
+        "import_seconds": IMPORT_SECONDS,
+    }
+    return ORJSONResponse(body, status_code=200 if ready else 503)
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(upload.router, prefix="/upload", tags=["upload"])
@@ -70,3 +185,7 @@ app.include_router(progress.router, prefix="/progress", tags=["progress"])
 app.include_router(chat.router, prefix="/chat", tags=["chat"])
 app.include_router(youtube.router, prefix="/youtube", tags=["youtube"])
 app.include_router(revise_chat.router, prefix="/revise-chat", tags=["revise-chat"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
+
+IMPORT_SECONDS = round(time.perf_counter() - IMPORT_STARTED, 4)
+logger.info("Imported main in %.3fs", IMPORT_SECONDS, extra={"import_seconds": IMPORT_SECONDS})
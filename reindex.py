@@ -0,0 +1,236 @@
+"""
+Rebuilds every PDF's vectors into a new, versioned Pinecone index, e.g.
+after changing the embedding model or chunking, then switches reads to it.
+
+    python reindex.py --model sentence-transformers/all-mpnet-base-v2 --dimension 768
+    python reindex.py --resume            # continue an interrupted run
+
+While the build runs, the worker also indexes new uploads into the new
+index, so nothing is missing when reads switch over. Progress is
+checkpointed in `reindex_runs` after every batch.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import logging
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from bson.objectid import ObjectId
+import motor.motor_asyncio
+from services import index_versions
+from services import blob_cache
+from services.cleanup import NOT_DELETED
+from services.logging_config import configure_logging
+from services.metrics import MongoCommandListener
+
+logger = logging.getLogger("reindex")
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/revisely_db")
+MAX_RUN_ERRORS = 50
+
+
+def _init_reindex_process(model_name: str):
+    from services.rag_engine import get_embeddings
+    get_embeddings(model_name)
+
+
+def _reindex_pdf(pdf_id: str, pdf_content, config: dict) -> dict:
+    from services.rag_engine import index_pdf_content
+    result = index_pdf_content(pdf_id, pdf_content, config=config)
+    return {"pages": result["pages"], "chunks": result["chunks"]}
+
+
+async def _reindex_batch(db, executor, config: dict, pdfs: list) -> dict:
+    contents = await blob_cache.load_pdfs(db, [pdf["file_id"] for pdf in pdfs], fill=False)
+
+    loop = asyncio.get_running_loop()
+
+    async def one(pdf):
+        pdf_id = str(pdf["_id"])
+        content = contents.get(pdf["file_id"])
+        if content is None:
+            return pdf_id, {"error": "PDF content not found"}
+        try:
+            try:
+                return pdf_id, await loop.run_in_executor(executor, _reindex_pdf, pdf_id, content, config)
+            except FileNotFoundError:
+                if not isinstance(content, str):
+                    raise
+                # Evicted from the blob cache before the pool process linked it.
+                content = await blob_cache.fetch_pdf(db, pdf["file_id"], fill=False)
+                if content is None:
+                    raise
+                return pdf_id, await loop.run_in_executor(executor, _reindex_pdf, pdf_id, content, config)
+        except Exception as e:
+            return pdf_id, {"error": f"{type(e).__name__}: {e}"}
+
+    totals = {"processed": 0, "failed": 0, "pages": 0, "chunks": 0, "errors": []}
+    for pdf_id, result in await asyncio.gather(*(one(pdf) for pdf in pdfs)):
+        if "error" in result:
+            totals["failed"] += 1
+            totals["errors"].append({"pdf_id": pdf_id, "error": result["error"], "at": datetime.utcnow()})
+            continue
+        totals["processed"] += 1
+        totals["pages"] += result["pages"]
+        totals["chunks"] += result["chunks"]
+    return totals
+
+
+async def _start_or_resume(db, args) -> dict:
+    """
+    Returns the run document for the index version being built, registering
+    a new version unless --resume picks up the one already registered.
+    """
+    await index_versions.refresh_index_configs(db)
+    building = index_versions.building_config()
+    if args.resume:
+        if not building:
+            raise SystemExit("Nothing to resume: no index version is being built.")
+        run = await db.reindex_runs.find_one({"_id": building["version"]})
+        if run:
+            return run
+        config = building
+    else:
+        if building:
+            raise SystemExit(f"Index version {building['version']} is already being built; "
+                             "use --resume to continue it or --abandon to drop it.")
+        config = await index_versions.start_build(
+            db, args.model, args.dimension, args.chunk_size, args.chunk_overlap)
+        # Give the API and workers a refresh cycle to pick up the build, so
+        # they index new uploads into it before the walk gets near the end.
+        logger.info("Registered index version %s (%s); waiting %.0fs for readers to pick it up",
+                    config["version"], config["index_name"], index_versions.INDEX_CONFIG_REFRESH_SECONDS)
+        await asyncio.sleep(index_versions.INDEX_CONFIG_REFRESH_SECONDS)
+
+    run = {
+        "_id": config["version"],
+        "config": config,
+        "status": "running",
+        "last_pdf_id": None,
+        "processed": 0,
+        "failed": 0,
+        "pages": 0,
+        "chunks": 0,
+        "elapsed_seconds": 0.0,
+        "errors": [],
+        "started_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    }
+    await db.reindex_runs.replace_one({"_id": run["_id"]}, run, upsert=True)
+    return run
+
+
+def _rates(run: dict) -> str:
+    elapsed = run["elapsed_seconds"] or 1e-9
+    return (f"{run['processed']} PDFs, {run['failed']} failed, "
+            f"{run['pages'] / elapsed:.1f} pages/s, {run['chunks'] / elapsed:.1f} chunks/s")
+
+
+async def reindex(args):
+    client = motor.motor_asyncio.AsyncIOMotorClient(
+        MONGODB_URI, event_listeners=[MongoCommandListener()])
+    db = client.get_database("revisely_db")
+
+    if args.abandon:
+        await index_versions.refresh_index_configs(db)
+        building = index_versions.building_config()
+        if building and await index_versions.abandon_build(db, building["version"]):
+            await db.reindex_runs.update_one({"_id": building["version"]}, {"$set": {"status": "abandoned"}})
+            logger.info("Abandoned index version %s; delete index %s in Pinecone if it was created",
+                        building["version"], building["index_name"])
+        client.close()
+        return
+
+    run = await _start_or_resume(db, args)
+    config = run["config"]
+    logger.info("Re-indexing into %s (model %s, dimension %s, chunks %s/%s), resuming after %s",
+                config["index_name"], config["model"], config["dimension"],
+                config["chunk_size"], config["chunk_overlap"], run["last_pdf_id"])
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    ctx = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx,
+                                   initializer=_init_reindex_process, initargs=(config["model"],))
+    try:
+        while not stop.is_set():
+            query = dict(NOT_DELETED)
+            if run["last_pdf_id"]:
+                query["_id"] = {"$gt": ObjectId(run["last_pdf_id"])}
+            pdfs = await db.pdfs.find(query, {"file_id": 1}).sort("_id", 1) \
+                .limit(args.batch_size).to_list(length=args.batch_size)
+            if not pdfs:
+                break
+
+            started = time.perf_counter()
+            totals = await _reindex_batch(db, executor, config, pdfs)
+            elapsed = time.perf_counter() - started
+
+            run["last_pdf_id"] = str(pdfs[-1]["_id"])
+            for key in ("processed", "failed", "pages", "chunks"):
+                run[key] += totals[key]
+            run["elapsed_seconds"] += elapsed
+            await db.reindex_runs.update_one({"_id": run["_id"]}, {
+                "$set": {"last_pdf_id": run["last_pdf_id"], "elapsed_seconds": run["elapsed_seconds"],
+                         "updated_at": datetime.utcnow()},
+                "$inc": {key: totals[key] for key in ("processed", "failed", "pages", "chunks")},
+                "$push": {"errors": {"$each": totals["errors"], "$slice": -MAX_RUN_ERRORS}},
+            })
+            logger.info("Batch of %s in %.1fs (%.1f pages/s, %.1f chunks/s); total %s",
+                        len(pdfs), elapsed, totals["pages"] / elapsed, totals["chunks"] / elapsed, _rates(run))
+    finally:
+        executor.shutdown(wait=True)
+
+    if stop.is_set():
+        logger.info("Interrupted after %s; run again with --resume to continue", _rates(run))
+        client.close()
+        return
+
+    if run["failed"] and not args.allow_failures:
+        logger.warning("Finished with %s failed PDFs (see reindex_runs.errors); not switching. "
+                       "Re-run with --resume --allow-failures to switch anyway.", run["failed"])
+        await db.reindex_runs.update_one({"_id": run["_id"]}, {"$set": {"status": "built"}})
+    elif args.no_switch:
+        logger.info("Built %s; not switching (--no-switch)", _rates(run))
+        await db.reindex_runs.update_one({"_id": run["_id"]}, {"$set": {"status": "built"}})
+    elif await index_versions.switch_to_build(db, config["version"]):
+        await db.reindex_runs.update_one({"_id": run["_id"]}, {"$set": {
+            "status": "done", "finished_at": datetime.utcnow()}})
+        logger.info("Switched reads to %s after %s", config["index_name"], _rates(run))
+    else:
+        logger.error("Index version %s is no longer being built; not switching", config["version"])
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild all PDF vectors into a new index version")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", index_versions.DEFAULT_INDEX_CONFIG["model"]))
+    parser.add_argument("--dimension", type=int,
+                        default=int(os.getenv("EMBEDDING_DIMENSION", index_versions.DEFAULT_INDEX_CONFIG["dimension"])))
+    parser.add_argument("--chunk-size", type=int, default=index_versions.DEFAULT_INDEX_CONFIG["chunk_size"])
+    parser.add_argument("--chunk-overlap", type=int, default=index_versions.DEFAULT_INDEX_CONFIG["chunk_overlap"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="pool processes")
+    parser.add_argument("--batch-size", type=int, default=50, help="PDFs per checkpointed batch")
+    parser.add_argument("--resume", action="store_true", help="continue the version being built")
+    parser.add_argument("--no-switch", action="store_true", help="build but leave reads on the active index")
+    parser.add_argument("--allow-failures", action="store_true", help="switch even if some PDFs failed")
+    parser.add_argument("--abandon", action="store_true", help="drop the version being built")
+    args = parser.parse_args()
+
+    configure_logging()
+    asyncio.run(reindex(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1 @@
-from . import auth, upload, quiz, progress, chat, youtube
+from . import auth, upload, quiz, progress, chat, youtube, revise_chat, admin
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, Request
+from pydantic import BaseModel, Field
+from routers.auth import get_admin_user
+from services.profiler import profiling_settings, list_profiles, save_profiling_settings, PROFILE_DIR
+
+router = APIRouter()
+
+
+class ProfilingSettings(BaseModel):
+    sample_rate: float = Field(ge=0, le=1)
+    interval_ms: float = Field(default=5.0, ge=1, le=100)
+    max_concurrent: int = Field(default=1, ge=1, le=8)
+
+
+@router.get("/profiling")
+async def get_profiling(user=Depends(get_admin_user)):
+    return {"settings": profiling_settings, "profile_dir": PROFILE_DIR, "profiles": list_profiles()}
+
+
+@router.put("/profiling")
+async def update_profiling(payload: ProfilingSettings, request: Request, user=Depends(get_admin_user)):
+    # Shared through Mongo, so every worker and instance follows, not just this one.
+    await save_profiling_settings(request.app.db, payload.dict())
+    return {"settings": profiling_settings}
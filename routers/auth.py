@@ -1,18 +1,31 @@
 import os
 import json
+import logging
+import threading
 from dotenv import load_dotenv
 from fastapi import APIRouter, HTTPException, Depends, Header, Request
 from pydantic import BaseModel
-import firebase_admin
-from firebase_admin import credentials, auth as firebase_auth
 from datetime import datetime
 from bson.objectid import ObjectId
+from services.metrics import observe_stage
+from services.readiness import warming
+from services.rate_limit import check_rate_limit, client_address
 
 load_dotenv()
 
 router = APIRouter()
 
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+logger = logging.getLogger(__name__)
+
+_firebase_auth = None
+_firebase_lock = threading.Lock()
+
 def _init_firebase():
+    import firebase_admin
+    from firebase_admin import credentials
+
     if firebase_admin._apps:
         return
 
@@ -35,13 +48,33 @@ def _init_firebase():
     
     firebase_admin.initialize_app(cred)
 
-_init_firebase()
+def get_firebase_auth():
+    """
+    Initializes the Firebase app on first use and returns firebase_admin.auth.
+    """
+    global _firebase_auth
+    if _firebase_auth is None:
+        with _firebase_lock:
+            if _firebase_auth is None:
+                with warming("firebase"):
+                    _init_firebase()
+                    from firebase_admin import auth as firebase_auth
+                _firebase_auth = firebase_auth
+    return _firebase_auth
+
+def _firebase_auth_or_503():
+    try:
+        return get_firebase_auth()
+    except (RuntimeError, ValueError) as e:
+        logger.error("Firebase is not configured: %s", e)
+        raise HTTPException(status_code=503, detail="Authentication service unavailable")
 
 class TokenIn(BaseModel):
     token: str
 
 @router.post("/verify")
 async def verify_token(payload: TokenIn, request: Request):
+    firebase_auth = _firebase_auth_or_503()
     try:
         decoded = firebase_auth.verify_id_token(payload.token)
         uid = decoded["uid"]
@@ -62,28 +95,25 @@ async def verify_token(payload: TokenIn, request: Request):
 
         return {"uid": uid, "valid": True, "user": {"id": str(user["_id"]), "email": user["email"], "name": user["display_name"]}}
     except Exception as e:
-        print(f"Token verification error: {str(e)}")
+        logger.warning("Token verification error: %s", e)
         raise HTTPException(status_code=401, detail="Invalid token")
 
 async def get_current_user(request: Request, authorization: str = Header(None)):
-    print(
-        f"[DEBUG] get_current_user called, authorization header present: {bool(authorization)}")
     if not authorization:
-        print("[DEBUG] No authorization header")
+        logger.debug("No authorization header")
         raise HTTPException(
             status_code=401, detail="Missing Authorization header")
+    firebase_auth = _firebase_auth_or_503()
     try:
         token = authorization.split("Bearer ")[1]
-        print(f"[DEBUG] Token extracted, length: {len(token)}\n")
-        decoded = firebase_auth.verify_id_token(token)
+        with observe_stage("auth"):
+            decoded = firebase_auth.verify_id_token(token)
         uid = decoded["uid"]
-        print(f"[DEBUG] Token verified, uid: {uid}\n")
 
         user = await request.app.db.users.find_one({"uid": uid})
         if not user:
-            print(f"[DEBUG] User not found in database for uid: {uid}\n")
+            logger.debug("User not found in database for uid: %s", uid)
             raise HTTPException(status_code=401, detail="User not found")
-        print(f"[DEBUG] User found: {user['uid']}\n")
 
         class CurrentUser(BaseModel):
             id: str
@@ -97,6 +127,32 @@ async def get_current_user(request: Request, authorization: str = Header(None)):
     except HTTPException:
         raise
     except Exception as e:
-        print(
-            f"[DEBUG] Token verification failed: {type(e).__name__}: {str(e)}\n")
+        logger.debug("Token verification failed: %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+
+async def get_admin_user(user=Depends(get_current_user)):
+    if not user.email or user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+
+def limit_per_user(route: str):
+    """
+    Rate-limits an authenticated route per user (see services.rate_limit).
+    Returns the current user, so it can stand in for get_current_user.
+    """
+    async def dependency(request: Request, user=Depends(get_current_user)):
+        await check_rate_limit(request, route, user.id)
+        return user
+    return dependency
+
+
+def limit_per_client(route: str):
+    """
+    Rate-limits a route that has no authentication per client address
+    (see services.rate_limit.client_address).
+    """
+    async def dependency(request: Request):
+        await check_rate_limit(request, route, client_address(request))
+    return dependency
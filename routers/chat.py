@@ -2,17 +2,27 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from schemas import ChatRequest, ChatResp
 from services.rag_engine import answer_with_context
 from services.gemini_client import get_gemini_response
-from routers.auth import get_current_user
+from routers.auth import limit_per_user
+from services.cleanup import NOT_DELETED
 from bson.objectid import ObjectId
 
 router = APIRouter()
 
 
 @router.post("/ask", response_model=ChatResp)
-async def ask(payload: ChatRequest, request: Request, user=Depends(get_current_user)):
-    pdf = await request.app.db.pdfs.find_one({"_id": ObjectId(payload.pdf_id), "user_id": user.id})
-    if not pdf:
+async def ask(payload: ChatRequest, request: Request, user=Depends(limit_per_user("chat_ask"))):
+    pdf_ids = payload.all_pdf_ids()
+    if not all(ObjectId.is_valid(pdf_id) for pdf_id in pdf_ids):
+        raise HTTPException(status_code=400, detail="Invalid PDF ID format")
+
+    pdfs = await request.app.db.pdfs.find(
+        {"_id": {"$in": [ObjectId(pdf_id) for pdf_id in pdf_ids]}, "user_id": user.id, **NOT_DELETED},
+        {"title": 1}
+    ).to_list(length=len(pdf_ids))
+    if len(pdfs) != len(pdf_ids):
         raise HTTPException(status_code=404, detail="PDF not found")
+
+    titles = {str(pdf["_id"]): pdf.get("title") or str(pdf["_id"]) for pdf in pdfs}
     res = await answer_with_context(
-        payload.pdf_id, payload.question, top_k=payload.top_k or 4)
+        pdf_ids, payload.question, top_k=payload.top_k or 4, titles=titles)
     return {"answer": res.get("answer"), "sources": res.get("sources", [])}
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
 from routers.auth import get_current_user
 from schemas import QuizSubmit
 import math
@@ -6,9 +7,15 @@ from bson.objectid import ObjectId
 from datetime import datetime
 from thefuzz import fuzz
 from collections import defaultdict
+from typing import Optional
+from pymongo import ReturnDocument, UpdateOne
+from services.pagination import fetch_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter()
 
+ATTEMPT_PROJECTION = {"quiz_id": 1, "created_at": 1, "breakdown": 1}
+SUMMARY_BACKFILL_BATCH = 500
+
 
 @router.post("/submit")
 async def submit_quiz(payload: QuizSubmit, request: Request, user=Depends(get_current_user)):
@@ -65,14 +72,27 @@ async def submit_quiz(payload: QuizSubmit, request: Request, user=Depends(get_cu
             laq_results.append(
                 {"user_answer": user_answer, "is_correct": is_correct})
 
+    breakdown = _score_breakdown(questions, payload.answers or {})
     attempt_doc = {
         "quiz_id": payload.quiz_id,
         "user_id": user.id,
         "score": int(score),
         "answers": payload.answers,
+        "breakdown": breakdown,
         "created_at": datetime.utcnow()
     }
     await request.app.db.quiz_attempts.insert_one(attempt_doc)
+    # A summary created here only covers attempts from this one on; "since"
+    # marks where the next read's backfill of older attempts has to stop.
+    await request.app.db.progress_summaries.update_one(
+        {"_id": user.id},
+        {"$inc": {
+            "total_questions": breakdown["mcq_total"] + breakdown["saq_total"] + breakdown["laq_total"],
+            "correct_answers": breakdown["mcq_correct"] + breakdown["saq_correct"] + breakdown["laq_correct"]
+        }, "$set": {"updated_at": datetime.utcnow()},
+            "$setOnInsert": {"since": attempt_doc["_id"]}},
+        upsert=True
+    )
 
     topic = f"pdf_{quiz['pdf_id']}"
     pct = (score/total)*100 if total > 0 else 0
@@ -109,78 +129,165 @@ async def submit_quiz(payload: QuizSubmit, request: Request, user=Depends(get_cu
 
 
 @router.get("/")
-async def get_progress(request: Request, user=Depends(get_current_user)):
-    all_attempts = await request.app.db.quiz_attempts.find({"user_id": user.id}).sort("created_at", -1).to_list(length=None)
+async def get_progress(request: Request, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, user=Depends(get_current_user)):
+    db = request.app.db
+    try:
+        attempts, next_cursor = await fetch_page(
+            db.quiz_attempts, {"user_id": user.id}, ATTEMPT_PROJECTION, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    overall_total_questions = 0
-    overall_correct_answers = 0
-    processed_attempts = []
+    await _fill_missing_breakdowns(db, attempts)
+    summary = await _get_summary(db, user.id)
 
-    for attempt in all_attempts:
-        quiz_id = attempt["quiz_id"]
-        quiz = await request.app.db.quizzes.find_one({"_id": ObjectId(quiz_id)})
-        if not quiz:
+    processed_attempts = []
+    for attempt in attempts:
+        b = attempt.get("breakdown")
+        if not b:
             continue
-
-        questions_data = quiz.get("questions", {})
-        mcqs = questions_data.get("mcqs", [])
-        saqs = questions_data.get("saqs", [])
-        laqs = questions_data.get("laqs", [])
-
-        attempt_mcq_correct = 0
-        attempt_mcq_total = len(mcqs)
-        if "mcq" in attempt["answers"]:
-            user_mcq_answers = attempt["answers"]["mcq"]
-            for i, q in enumerate(mcqs):
-                if str(i) in user_mcq_answers and user_mcq_answers[str(i)] == q.get("answer_index"):
-                    attempt_mcq_correct += 1
-
-        attempt_saq_correct = 0
-        attempt_saq_total = len(saqs)
-        if "saq" in attempt["answers"]:
-            user_saq_answers = attempt["answers"]["saq"]
-            for i, q in enumerate(saqs):
-                user_answer = user_saq_answers.get(str(i), "")
-                correct_answer = q.get("answer")
-                if fuzz.ratio(user_answer.lower(), correct_answer.lower()) > 80:
-                    attempt_saq_correct += 1
-
-        attempt_laq_correct = 0
-        attempt_laq_total = len(laqs)
-        if "laq" in attempt["answers"]:
-            user_laq_answers = attempt["answers"]["laq"]
-            for i, q in enumerate(laqs):
-                user_answer = user_laq_answers.get(str(i), "")
-                correct_outline = " ".join(q.get("answer_outline", []))
-                if fuzz.ratio(user_answer.lower(), correct_outline.lower()) > 70:
-                    attempt_laq_correct += 1
-
-        overall_total_questions += (attempt_mcq_total +
-                                    attempt_saq_total + attempt_laq_total)
-        overall_correct_answers += (attempt_mcq_correct +
-                                    attempt_saq_correct + attempt_laq_correct)
-
+        correct = b["mcq_correct"] + b["saq_correct"] + b["laq_correct"]
+        total = b["mcq_total"] + b["saq_total"] + b["laq_total"]
         processed_attempts.append({
             "attempt_id": str(attempt["_id"]),
             "created_at": attempt["created_at"],
-            "mcq_score": f"{attempt_mcq_correct}/{attempt_mcq_total}",
-            "saq_score": f"{attempt_saq_correct}/{attempt_saq_total}",
-            "laq_score": f"{attempt_laq_correct}/{attempt_laq_total}",
-            "overall_score": f"{attempt_mcq_correct + attempt_saq_correct + attempt_laq_correct}/{attempt_mcq_total + attempt_saq_total + attempt_laq_total}"
+            "mcq_score": f"{b['mcq_correct']}/{b['mcq_total']}",
+            "saq_score": f"{b['saq_correct']}/{b['saq_total']}",
+            "laq_score": f"{b['laq_correct']}/{b['laq_total']}",
+            "overall_score": f"{correct}/{total}"
         })
 
+    overall_total_questions = summary["total_questions"]
+    overall_correct_answers = summary["correct_answers"]
     overall_percentage = (overall_correct_answers / overall_total_questions) * \
         100 if overall_total_questions > 0 else 0
 
-    return {
+    return ORJSONResponse({
         "overall_summary": {
             "total_questions_attempted": overall_total_questions,
             "total_correct_answers": overall_correct_answers,
             "overall_accuracy_percentage": round(overall_percentage, 2)
         },
-        "attempts": processed_attempts
+        "attempts": processed_attempts,
+        "next_cursor": next_cursor
+    })
+
+
+def _score_breakdown(questions: dict, answers: dict) -> dict:
+    """
+    Per-section correct/total counts for one attempt. Totals count every
+    question in the quiz, answered or not.
+    """
+    mcqs = questions.get("mcqs", []) or []
+    saqs = questions.get("saqs", []) or []
+    laqs = questions.get("laqs", []) or []
+    breakdown = {
+        "mcq_correct": 0, "mcq_total": len(mcqs),
+        "saq_correct": 0, "saq_total": len(saqs),
+        "laq_correct": 0, "laq_total": len(laqs),
     }
 
+    if "mcq" in answers:
+        user_mcq_answers = answers["mcq"]
+        for i, q in enumerate(mcqs):
+            if str(i) in user_mcq_answers and user_mcq_answers[str(i)] == q.get("answer_index"):
+                breakdown["mcq_correct"] += 1
+
+    if "saq" in answers:
+        user_saq_answers = answers["saq"]
+        for i, q in enumerate(saqs):
+            user_answer = user_saq_answers.get(str(i), "") or ""
+            correct_answer = q.get("answer") or ""
+            if fuzz.ratio(user_answer.lower(), correct_answer.lower()) > 80:
+                breakdown["saq_correct"] += 1
+
+    if "laq" in answers:
+        user_laq_answers = answers["laq"]
+        for i, q in enumerate(laqs):
+            user_answer = user_laq_answers.get(str(i), "") or ""
+            correct_outline = " ".join(q.get("answer_outline", []))
+            if fuzz.ratio(user_answer.lower(), correct_outline.lower()) > 70:
+                breakdown["laq_correct"] += 1
+
+    return breakdown
+
+
+async def _fill_missing_breakdowns(db, attempts: list):
+    """
+    Attempts submitted before breakdowns were stored get them computed here,
+    with one batched quiz lookup, and persisted so this only happens once.
+    """
+    legacy = [a for a in attempts if "breakdown" not in a]
+    if not legacy:
+        return
+
+    answers = {}
+    async for doc in db.quiz_attempts.find({"_id": {"$in": [a["_id"] for a in legacy]}}, {"answers": 1}):
+        answers[doc["_id"]] = doc.get("answers", {}) or {}
+
+    quiz_ids = list({ObjectId(a["quiz_id"]) for a in legacy if ObjectId.is_valid(a["quiz_id"])})
+    quizzes = {}
+    async for quiz in db.quizzes.find({"_id": {"$in": quiz_ids}}, {"questions": 1}):
+        quizzes[str(quiz["_id"])] = quiz.get("questions", {}) or {}
+
+    updates = []
+    for attempt in legacy:
+        questions = quizzes.get(attempt["quiz_id"])
+        if questions is None:
+            attempt["breakdown"] = None
+            continue
+        attempt["breakdown"] = _score_breakdown(questions, answers.get(attempt["_id"], {}))
+        updates.append(UpdateOne({"_id": attempt["_id"]}, {"$set": {"breakdown": attempt["breakdown"]}}))
+    if updates:
+        await db.quiz_attempts.bulk_write(updates, ordered=False)
+
+
+async def _get_summary(db, user_id: str) -> dict:
+    """
+    Running totals per user, kept up to date by submit_quiz. A summary with
+    a "since" watermark is still missing the attempts before it; they are
+    added once, on the first read, and the watermark removed.
+    """
+    summary = await db.progress_summaries.find_one({"_id": user_id})
+    if summary and "since" not in summary:
+        return summary
+    if not summary:
+        # Attempts submitted from here on are counted by submit_quiz.
+        summary = await db.progress_summaries.find_one_and_update(
+            {"_id": user_id},
+            {"$setOnInsert": {"since": ObjectId(), "total_questions": 0, "correct_answers": 0}},
+            upsert=True, return_document=ReturnDocument.AFTER)
+        if "since" not in summary:
+            return summary
+    since = summary["since"]
+
+    total_questions = 0
+    correct_answers = 0
+    batch = []
+
+    async def add_batch():
+        nonlocal total_questions, correct_answers
+        await _fill_missing_breakdowns(db, batch)
+        for attempt in batch:
+            b = attempt.get("breakdown")
+            if b:
+                total_questions += b["mcq_total"] + b["saq_total"] + b["laq_total"]
+                correct_answers += b["mcq_correct"] + b["saq_correct"] + b["laq_correct"]
+        batch.clear()
+
+    async for attempt in db.quiz_attempts.find({"user_id": user_id, "_id": {"$lt": since}}, ATTEMPT_PROJECTION):
+        batch.append(attempt)
+        if len(batch) >= SUMMARY_BACKFILL_BATCH:
+            await add_batch()
+    await add_batch()
+
+    # Matching on the watermark lets only one concurrent reader add the history.
+    backfilled = await db.progress_summaries.find_one_and_update(
+        {"_id": user_id, "since": since},
+        {"$inc": {"total_questions": total_questions, "correct_answers": correct_answers},
+         "$set": {"updated_at": datetime.utcnow()}, "$unset": {"since": ""}},
+        return_document=ReturnDocument.AFTER)
+    return backfilled or await db.progress_summaries.find_one({"_id": user_id})
+
 
 @router.get("/attempt/{attempt_id}")
 async def get_attempt_details(attempt_id: str, request: Request, user=Depends(get_current_user)):
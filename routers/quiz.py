@@ -1,48 +1,122 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from services.pdf_reader import extract_text
-from services.quiz_generator import generate_quiz_from_text
+from services.blob_cache import open_pdf
+from services.quiz_generator import generate_quiz_from_text, stream_quiz_items, QuizGenerationError, QUIZ_SCHEMAS
+from services.gemini_client import LLMOverloaded
 from services.rag_engine import retrieve_top_k_if_exists
+from services.cleanup import NOT_DELETED
+from services.context_builder import build_context
+from routers.auth import limit_per_client
+from services.single_flight import SingleFlight
+import os
 import json
+import asyncio
+import logging
 from bson.objectid import ObjectId
 from datetime import datetime
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
 
-@router.post("/generate")
+QUIZ_CONTEXT_TOKEN_BUDGET = int(os.getenv("QUIZ_CONTEXT_TOKEN_BUDGET", "800"))
+# How long a finished generation is reused for identical requests; 0 turns reuse off.
+QUIZ_FLIGHT_GRACE_SECONDS = float(os.getenv("QUIZ_FLIGHT_GRACE_SECONDS", "10"))
+
+quiz_flight = SingleFlight("quiz_generate", grace_seconds=QUIZ_FLIGHT_GRACE_SECONDS)
+
+
+@router.post("/generate", dependencies=[Depends(limit_per_client("quiz_generate"))])
 async def generate(request: Request, pdf_id: str = Query(...), mcq: int = 5, saq: int = 3, laq: int = 1):
 
-    pdf_metadata = await request.app.db.pdfs.find_one({"_id": ObjectId(pdf_id)})
+    pdf_metadata = await request.app.db.pdfs.find_one({"_id": ObjectId(pdf_id), **NOT_DELETED})
     if not pdf_metadata:
         raise HTTPException(status_code=404, detail="PDF not found")
 
-    pdf_content_doc = await request.app.db.pdfs_content.find_one({"_id": ObjectId(pdf_metadata["file_id"])})
-    if not pdf_content_doc:
-        raise HTTPException(status_code=404, detail="PDF content not found")
+    # Double clicks and client retries share one generation (and one saved quiz).
+    return await quiz_flight.do(
+        (pdf_id, mcq, saq, laq),
+        lambda: _generate_and_save(request.app.db, pdf_id, pdf_metadata["file_id"], mcq, saq, laq))
+
+
+async def _quiz_inputs(db, pdf_id: str, file_id: str):
+    """
+    Returns the PDF's text and the retrieved context that goes with it.
+    """
+    async with open_pdf(db, file_id) as pdf_content:
+        if pdf_content is None:
+            raise HTTPException(status_code=404, detail="PDF content not found")
 
-    text = extract_text(pdf_content_doc["content"])
+        text = await asyncio.to_thread(extract_text, pdf_content)
 
     context = None
     try:
         query_text = " ".join(text.split()[:100])
-        context = retrieve_top_k_if_exists(pdf_id, query_text, k=3)
+        docs = await asyncio.to_thread(retrieve_top_k_if_exists, pdf_id, query_text, 3)
+        context = build_context(docs, token_budget=QUIZ_CONTEXT_TOKEN_BUDGET)
     except Exception:
         context = None
+    return text, context
 
-    questions = await generate_quiz_from_text(
-        text, mcq=mcq, saq=saq, laq=laq, context=context)
-
-    if isinstance(questions, dict):
-        saved = questions
-    else:
-
-        saved = {"raw": str(questions)}
 
+async def _save_quiz(db, pdf_id: str, questions: dict) -> str:
     quiz_doc = {
         "pdf_id": pdf_id,
-        "questions": saved,
+        "questions": questions,
         "created_at": datetime.utcnow()
     }
-    result = await request.app.db.quizzes.insert_one(quiz_doc)
+    result = await db.quizzes.insert_one(quiz_doc)
+    return str(result.inserted_id)
+
+
+async def _generate_and_save(db, pdf_id: str, file_id: str, mcq: int, saq: int, laq: int):
+    text, context = await _quiz_inputs(db, pdf_id, file_id)
+
+    try:
+        questions = await generate_quiz_from_text(
+            text, mcq=mcq, saq=saq, laq=laq, context=context)
+    except QuizGenerationError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+    quiz_id = await _save_quiz(db, pdf_id, questions)
+    return {"quiz_id": quiz_id, "questions": questions}
+
+
+@router.post("/generate/stream", dependencies=[Depends(limit_per_client("quiz_generate"))])
+async def generate_stream(request: Request, pdf_id: str = Query(...), mcq: int = 5, saq: int = 3, laq: int = 1):
+    """
+    Streams the quiz as NDJSON: an "item" line per question as soon as it is
+    generated and validated, then a "done" line with the saved quiz_id, or
+    an "error" line if generation fails after the stream has started.
+    """
+    pdf_metadata = await request.app.db.pdfs.find_one({"_id": ObjectId(pdf_id), **NOT_DELETED})
+    if not pdf_metadata:
+        raise HTTPException(status_code=404, detail="PDF not found")
+
+    db = request.app.db
+    text, context = await _quiz_inputs(db, pdf_id, pdf_metadata["file_id"])
+
+    async def lines():
+        questions = {kind: [] for kind in QUIZ_SCHEMAS}
+        try:
+            async for kind, index, question in stream_quiz_items(
+                    text, mcq=mcq, saq=saq, laq=laq, context=context):
+                questions[kind].append(question)
+                yield _ndjson({"type": "item", "kind": kind, "index": index, "item": question})
+            if not any(questions.values()):
+                raise QuizGenerationError("The model returned no usable questions")
+            quiz_id = await _save_quiz(db, pdf_id, questions)
+            yield _ndjson({"type": "done", "quiz_id": quiz_id,
+                           "counts": {kind: len(items) for kind, items in questions.items()}})
+        except LLMOverloaded as e:
+            yield _ndjson({"type": "error", "detail": "Too many requests", "retry_after": e.retry_after})
+        except Exception as e:
+            logger.error("Streaming quiz generation failed for PDF %s: %s", pdf_id, e)
+            yield _ndjson({"type": "error", "detail": "Quiz generation failed"})
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 
-    return {"quiz_id": str(result.inserted_id), "questions": saved}
+def _ndjson(event: dict) -> str:
+    return json.dumps(event) + "\n"
@@ -1,23 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Response
-from schemas import ChatResp, ReviseChatRequestCreate, ReviseChatSession, ReviseChatMessage, ReviseChatSessionCreate
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
+from schemas import ChatResp, ReviseChatRequestCreate, ReviseChatSession, ReviseChatSessionSummary, ReviseChatMessage, ReviseChatSessionCreate
 from services.gemini_client import get_gemini_response
-from routers.auth import get_current_user
+from routers.auth import get_current_user, limit_per_user
+from services.pagination import fetch_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from services.conversation_memory import MEMORY_PROJECTION, build_prompt, update_summary
 from typing import List, Optional
 from bson.objectid import ObjectId
 from datetime import datetime
+import os
+import logging
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
 
-@router.get("/history", response_model=List[ReviseChatSession])
-async def get_revise_chat_history(request: Request, user=Depends(get_current_user)):
-    sessions = await request.app.db.revise_chat_sessions.find({"user_id": user.id}).sort("updated_at", -1).to_list(length=None)
-    return sessions
+SESSION_LIST_PROJECTION = {"user_id": 1, "title": 1, "message_count": 1, "created_at": 1, "updated_at": 1}
+# Newest messages returned for one session, so long chats don't grow the payload without bound.
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "200"))
+SESSION_PROJECTION = {**SESSION_LIST_PROJECTION, "messages": {"$slice": -SESSION_MAX_MESSAGES}}
+
+
+@router.get("/history", response_model=List[ReviseChatSessionSummary])
+async def get_revise_chat_history(request: Request, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, user=Depends(get_current_user)):
+    try:
+        sessions, next_cursor = await fetch_page(
+            request.app.db.revise_chat_sessions, {"user_id": user.id}, SESSION_LIST_PROJECTION, limit, cursor, sort_field="updated_at")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for session in sessions:
+        session["_id"] = str(session["_id"])
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    # Deliberately bypasses response_model validation, which dominated the
+    # cost of large pages. The projection yields exactly the model's fields,
+    # so the JSON matches what response_model would have produced.
+    return ORJSONResponse(sessions, headers=headers)
 
 
 @router.get("/{session_id}", response_model=ReviseChatSession)
 async def get_revise_chat_session(session_id: str, request: Request, user=Depends(get_current_user)):
-    session = await request.app.db.revise_chat_sessions.find_one({"_id": ObjectId(session_id), "user_id": user.id})
+    session = await request.app.db.revise_chat_sessions.find_one({"_id": ObjectId(session_id), "user_id": user.id}, SESSION_PROJECTION)
     if not session:
         raise HTTPException(
             status_code=404, detail="Revise Chat Session not found")
@@ -25,26 +48,38 @@ async def get_revise_chat_session(session_id: str, request: Request, user=Depend
 
 
 @router.post("/ask", response_model=ChatResp)
-async def revise_chat_ask(payload: ReviseChatRequestCreate, request: Request, user=Depends(get_current_user)):
-    user_message = ReviseChatMessage(role="user", content=payload.question)
-    response_content = await get_gemini_response(payload.question)
-    ai_message = ReviseChatMessage(role="assistant", content=response_content)
-
+async def revise_chat_ask(payload: ReviseChatRequestCreate, request: Request, background_tasks: BackgroundTasks, user=Depends(limit_per_user("revise_chat_ask"))):
+    session = None
     if payload.session_id:
-
-        session = await request.app.db.revise_chat_sessions.find_one({"_id": ObjectId(payload.session_id), "user_id": user.id})
+        session = await request.app.db.revise_chat_sessions.find_one(
+            {"_id": ObjectId(payload.session_id), "user_id": user.id}, MEMORY_PROJECTION)
         if not session:
             raise HTTPException(
                 status_code=404, detail="Revise Chat Session not found")
 
-        await request.app.db.revise_chat_sessions.update_one(
-            {"_id": ObjectId(payload.session_id)},
-            {
-                "$push": {"messages": {"$each": [user_message.dict(), ai_message.dict()]}},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
+    user_message = ReviseChatMessage(role="user", content=payload.question)
+    prompt = build_prompt(session, payload.question)
+    if prompt:
+        response_content = await get_gemini_response(prompt, raw_prompt=True)
+    else:
+        response_content = await get_gemini_response(payload.question)
+    ai_message = ReviseChatMessage(role="assistant", content=response_content)
+
+    if session:
+        update = {
+            "$push": {"messages": {"$each": [user_message.dict(), ai_message.dict()]}},
+            "$set": {"updated_at": datetime.utcnow()}
+        }
+        if "message_count" in session:
+            update["$inc"] = {"message_count": 2}
+        else:
+            # Sessions created before message_count was tracked are counted once.
+            full = await request.app.db.revise_chat_sessions.find_one({"_id": session["_id"]}, {"messages": 1})
+            update["$set"]["message_count"] = len(full.get("messages", [])) + 2
+
+        await request.app.db.revise_chat_sessions.update_one({"_id": ObjectId(payload.session_id)}, update)
         session_id = payload.session_id
+        background_tasks.add_task(update_summary, request.app.db, session_id)
     else:
 
         title = payload.question[:50] + \
@@ -53,6 +88,7 @@ async def revise_chat_ask(payload: ReviseChatRequestCreate, request: Request, us
             user_id=user.id,
             title=title,
             messages=[user_message, ai_message],
+            message_count=2,
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow()
         )
@@ -64,9 +100,9 @@ async def revise_chat_ask(payload: ReviseChatRequestCreate, request: Request, us
 
 @router.delete("/{session_id}", status_code=204)
 async def delete_revise_chat_session(session_id: str, request: Request, user=Depends(get_current_user)):
-    print(f"Deleting session {session_id} for user {user.id}")
     result = await request.app.db.revise_chat_sessions.delete_one({"_id": ObjectId(session_id), "user_id": user.id})
-    print(f"Delete result: {result.deleted_count}")
+    logger.debug("Deleted %s revise chat session(s) %s for user %s",
+                 result.deleted_count, session_id, user.id)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Revise Chat Session not found")
     return Response(status_code=204)
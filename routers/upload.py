@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Response, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Response, Query
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from datetime import datetime
 from bson.objectid import ObjectId
 from .auth import get_current_user
-from typing import List
+from services.job_queue import enqueue_index_job, enqueue_batch_index_job, enqueue_delete_job
+from services.cleanup import NOT_DELETED
+from services.blob_cache import load_pdf, evict
+from services.pagination import fetch_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from services.index_status import new_index_status, status_from_doc, status_broadcaster, INDEX_STATUS_PROJECTION, TERMINAL_STAGES
+from typing import List, Optional
+from schemas import IndexStatusResp
 from pydantic import BaseModel
 import os
+import json
+import mmap
+import logging
+import asyncio
 
 
 class PDFFileBase(BaseModel):
@@ -25,9 +36,23 @@ class PDFFileBase(BaseModel):
 
 router = APIRouter()
 
+PDF_LIST_PROJECTION = {"title": 1, "user_id": 1, "is_indexed": 1, "created_at": 1, "file_id": 1}
+
+logger = logging.getLogger(__name__)
+
+SSE_KEEPALIVE_SECONDS = 15
+
+BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", "50"))
+# Files per insert_many group and per batch indexing job.
+BATCH_INDEX_MAX_FILES = int(os.getenv("BATCH_INDEX_MAX_FILES", "10"))
+# PDFs are stored as a single Mongo document, which caps out at 16 MB.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(15 * 1024 * 1024)))
+UPLOAD_READ_CHUNK_BYTES = 1024 * 1024
+FILE_STREAM_CHUNK_BYTES = 256 * 1024
+
 
 @router.post("/upload")
-async def upload_pdf(request: Request, background_tasks: BackgroundTasks, file: UploadFile = File(...), current_user=Depends(get_current_user)):
+async def upload_pdf(request: Request, file: UploadFile = File(...), current_user=Depends(get_current_user)):
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(
             status_code=400, detail="Only PDF files are allowed")
@@ -50,14 +75,14 @@ async def upload_pdf(request: Request, background_tasks: BackgroundTasks, file:
         "user_id": current_user.id,
         "file_id": file_id,
         "created_at": datetime.utcnow(),
-        "is_indexed": False
+        "is_indexed": False,
+        "index_status": new_index_status()
     }
     result_metadata = await request.app.db.pdfs.insert_one(pdf_metadata)
 
     if os.getenv("RAG_ENABLED", "true").lower() in ("1", "true", "yes"):
-        from main import build_index_background
-        background_tasks.add_task(
-            build_index_background, str(result_metadata.inserted_id), file_id)
+        await enqueue_index_job(
+            request.app.db, str(result_metadata.inserted_id), file_id)
 
     return {
         "id": str(result_metadata.inserted_id),
@@ -69,21 +94,172 @@ async def upload_pdf(request: Request, background_tasks: BackgroundTasks, file:
     }
 
 
+async def _read_pdf_upload(file: UploadFile) -> bytes:
+    """
+    Reads an upload in chunks, rejecting it with ValueError as soon as it
+    exceeds UPLOAD_MAX_BYTES or turns out not to be a PDF.
+    """
+    if not file.filename or not file.filename.lower().endswith('.pdf'):
+        raise ValueError("Only PDF files are allowed")
+    chunks = []
+    size = 0
+    while True:
+        chunk = await file.read(UPLOAD_READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        if not chunks and not chunk.startswith(b"%PDF"):
+            raise ValueError("File is not a PDF")
+        size += len(chunk)
+        if size > UPLOAD_MAX_BYTES:
+            raise ValueError(f"File is larger than {UPLOAD_MAX_BYTES // (1024 * 1024)} MB")
+        chunks.append(chunk)
+    if not chunks:
+        raise ValueError("File is empty")
+    return b"".join(chunks)
+
+
+@router.post("/batch")
+async def upload_pdf_batch(request: Request, files: List[UploadFile] = File(...), current_user=Depends(get_current_user)):
+    """
+    Uploads many PDFs in one request. Files are stored and enqueued in groups
+    of BATCH_INDEX_MAX_FILES, each group with two insert_many calls and one
+    batch indexing job, so only one group is held in memory at a time. Bad
+    files are reported without failing the rest.
+    """
+    if len(files) > BATCH_UPLOAD_MAX_FILES:
+        raise HTTPException(
+            status_code=400, detail=f"At most {BATCH_UPLOAD_MAX_FILES} files per batch")
+
+    db = request.app.db
+    rag_enabled = os.getenv("RAG_ENABLED", "true").lower() in ("1", "true", "yes")
+    results = [None] * len(files)
+    for start in range(0, len(files), BATCH_INDEX_MAX_FILES):
+        group = []
+        for position in range(start, min(start + BATCH_INDEX_MAX_FILES, len(files))):
+            file = files[position]
+            try:
+                group.append((position, file.filename, await _read_pdf_upload(file)))
+            except ValueError as e:
+                results[position] = {"filename": file.filename, "status": "rejected", "error": str(e)}
+            finally:
+                await file.close()
+        if not group:
+            continue
+
+        now = datetime.utcnow()
+        content_result = await db.pdfs_content.insert_many([{
+            "filename": filename,
+            "content": contents,
+            "mimetype": "application/pdf",
+            "created_at": now,
+            "user_id": current_user.id
+        } for _, filename, contents in group])
+        file_ids = [str(file_id) for file_id in content_result.inserted_ids]
+
+        metadata_docs = [{
+            "title": filename,
+            "user_id": current_user.id,
+            "file_id": file_id,
+            "created_at": now,
+            "is_indexed": False,
+            "index_status": new_index_status()
+        } for (_, filename, _), file_id in zip(group, file_ids)]
+        metadata_result = await db.pdfs.insert_many(metadata_docs)
+        pdf_ids = [str(pdf_id) for pdf_id in metadata_result.inserted_ids]
+
+        if rag_enabled:
+            await enqueue_batch_index_job(
+                db, [{"pdf_id": pdf_id, "file_id": file_id} for pdf_id, file_id in zip(pdf_ids, file_ids)])
+
+        for (position, _, _), doc, pdf_id in zip(group, metadata_docs, pdf_ids):
+            results[position] = {
+                "filename": doc["title"],
+                "status": "accepted",
+                "id": pdf_id,
+                "file_id": doc["file_id"],
+                "is_indexed": False,
+                "created_at": doc["created_at"],
+            }
+
+    accepted = sum(1 for r in results if r["status"] == "accepted")
+    return {"accepted": accepted, "rejected": len(results) - accepted, "files": results}
+
+
 @router.get("/list", response_model=List[PDFFileBase])
-async def list_pdfs(request: Request, current_user=Depends(get_current_user)):
-    pdfs = []
-    cursor = request.app.db.pdfs.find({"user_id": current_user.id})
-    async for doc in cursor:
-        doc["id"] = str(doc["_id"])
-        doc.pop("_id")
-        pdfs.append(PDFFileBase(**doc))
-    return pdfs
+async def list_pdfs(request: Request, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, current_user=Depends(get_current_user)):
+    try:
+        docs, next_cursor = await fetch_page(
+            request.app.db.pdfs, {"user_id": current_user.id, **NOT_DELETED}, PDF_LIST_PROJECTION, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for doc in docs:
+        # The key response_model would emit (by alias).
+        doc["_id"] = str(doc["_id"])
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    # Deliberately bypasses response_model validation, which dominated the
+    # cost of large pages. The projection yields exactly the model's fields,
+    # so the JSON matches what response_model would have produced.
+    return ORJSONResponse(docs, headers=headers)
+
+
+async def _get_index_status(request: Request, pdf_id: str, user_id: str) -> dict:
+    try:
+        pdf_obj_id = ObjectId(pdf_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid PDF ID format")
+
+    doc = await request.app.db.pdfs.find_one({"_id": pdf_obj_id, "user_id": user_id, **NOT_DELETED}, INDEX_STATUS_PROJECTION)
+    if not doc:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    return status_from_doc(doc)
+
+
+@router.get("/{pdf_id}/status", response_model=IndexStatusResp)
+async def get_pdf_status(pdf_id: str, request: Request, current_user=Depends(get_current_user)):
+    return await _get_index_status(request, pdf_id, current_user.id)
+
+
+@router.get("/{pdf_id}/status/stream")
+async def stream_pdf_status(pdf_id: str, request: Request, current_user=Depends(get_current_user)):
+    status = await _get_index_status(request, pdf_id, current_user.id)
+
+    async def events():
+        last = status
+        yield _sse_event(status)
+        if status["stage"] in TERMINAL_STAGES:
+            return
+
+        queue = status_broadcaster.subscribe(request.app.db, pdf_id)
+        try:
+            while True:
+                try:
+                    update = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                if (update["stage"], update["progress"]) == (last["stage"], last["progress"]):
+                    continue
+                last = update
+                yield _sse_event(update)
+                if update["stage"] in TERMINAL_STAGES:
+                    return
+        finally:
+            status_broadcaster.unsubscribe(pdf_id, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _sse_event(status: dict) -> str:
+    return f"event: status\ndata: {json.dumps(status, default=str)}\n\n"
 
 
 @router.get("/{pdf_id}", response_model=PDFFileBase)
 async def get_pdf(pdf_id: str, request: Request, current_user=Depends(get_current_user)):
     try:
-        pdf = await request.app.db.pdfs.find_one({"_id": ObjectId(pdf_id), "user_id": current_user.id})
+        pdf = await request.app.db.pdfs.find_one({"_id": ObjectId(pdf_id), "user_id": current_user.id, **NOT_DELETED})
         if not pdf:
             raise HTTPException(status_code=404, detail="PDF not found")
 
@@ -98,58 +274,83 @@ async def get_pdf(pdf_id: str, request: Request, current_user=Depends(get_curren
 @router.get("/file/{file_id}")
 async def get_file(file_id: str, request: Request, current_user=Depends(get_current_user)):
     try:
-        print(f"Fetching file with ID: {file_id} for user: {current_user.id}")
+        logger.debug("Fetching file %s for user %s", file_id, current_user.id)
 
         try:
             file_obj_id = ObjectId(file_id)
         except Exception as e:
-            print(f"Invalid file_id format: {file_id}")
+            logger.debug("Invalid file_id format: %s", file_id)
             raise HTTPException(
                 status_code=400, detail=f"Invalid file ID format: {str(e)}")
 
-        file_content = await request.app.db.pdfs_content.find_one({
+        # Only the metadata comes from Mongo here; the bytes come from the blob cache.
+        file_meta = await request.app.db.pdfs_content.find_one({
             "_id": file_obj_id,
-            "user_id": current_user.id
-        })
+            "user_id": current_user.id,
+            **NOT_DELETED
+        }, {"filename": 1})
 
-        if not file_content:
-            print(f"File not found. ID: {file_id}, User: {current_user.id}")
+        if not file_meta:
+            logger.debug("File %s not found for user %s", file_id, current_user.id)
             raise HTTPException(status_code=404, detail="File not found")
 
-        print(f"File found. Size: {len(file_content['content'])} bytes")
+        pdf_content = await load_pdf(request.app.db, file_id)
+        if pdf_content is None:
+            raise HTTPException(status_code=404, detail="File not found")
+
+        headers = {
+            "Content-Disposition": f'inline; filename="{file_meta.get("filename", "document.pdf")}"',
+            "Cache-Control": "max-age=3600"
+        }
+        if isinstance(pdf_content, mmap.mmap):
+            # Streamed straight from the mapping taken at lookup, so an
+            # eviction in the meantime can't break the response.
+            return StreamingResponse(
+                _stream_mapping(pdf_content), media_type="application/pdf",
+                headers={**headers, "Content-Length": str(len(pdf_content))})
 
         return Response(
-            content=file_content["content"],
+            content=pdf_content,
             media_type="application/pdf",
-            headers={
-                "Content-Disposition": f'inline; filename="{file_content.get("filename", "document.pdf")}"',
-                "Content-Length": str(len(file_content["content"])),
-                "Cache-Control": "max-age=3600"
-            }
+            headers={**headers, "Content-Length": str(len(pdf_content))}
         )
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error serving file: {str(e)}")
+        logger.error("Error serving file %s: %s", file_id, e)
         raise HTTPException(
             status_code=500, detail=f"Error serving file: {str(e)}")
 
 
+async def _stream_mapping(mapping: mmap.mmap):
+    try:
+        for offset in range(0, len(mapping), FILE_STREAM_CHUNK_BYTES):
+            yield mapping[offset:offset + FILE_STREAM_CHUNK_BYTES]
+    finally:
+        mapping.close()
+
+
 @router.delete("/{pdf_id}")
 async def delete_pdf(pdf_id: str, request: Request, current_user=Depends(get_current_user)):
     try:
-
-        pdf_metadata = await request.app.db.pdfs.find_one({"_id": ObjectId(pdf_id), "user_id": current_user.id})
+        # Hide the PDF right away; vectors, quizzes and the rest are removed by the worker.
+        now = datetime.utcnow()
+        pdf_metadata = await request.app.db.pdfs.find_one_and_update(
+            {"_id": ObjectId(pdf_id), "user_id": current_user.id, **NOT_DELETED},
+            {"$set": {"deleted_at": now}},
+            projection={"file_id": 1}
+        )
         if not pdf_metadata:
             raise HTTPException(status_code=404, detail="PDF not found")
 
         file_id = pdf_metadata["file_id"]
-
-        await request.app.db.pdfs_content.delete_one({"_id": ObjectId(file_id)})
-
-        await request.app.db.pdfs.delete_one({"_id": ObjectId(pdf_id)})
+        await request.app.db.pdfs_content.update_one({"_id": ObjectId(file_id)}, {"$set": {"deleted_at": now}})
+        await asyncio.to_thread(evict, file_id)
+        await enqueue_delete_job(request.app.db, pdf_id, file_id)
 
         return {"message": "PDF deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error deleting PDF: {str(e)}")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import Any, List, Optional, Callable 
 from datetime import datetime
 from bson import ObjectId 
@@ -55,6 +55,15 @@ class PDFFileBase(BaseModel):
         json_encoders = {ObjectId: str}
 
 
+class IndexStatusResp(BaseModel):
+    pdf_id: str
+    stage: str
+    progress: int
+    is_indexed: bool
+    error: Optional[str] = None
+    updated_at: Optional[datetime] = None
+
+
 class GenerateQuizResp(BaseModel):
     quiz_id: str = Field(alias="_id") 
     questions: Any
@@ -65,11 +74,28 @@ class GenerateQuizResp(BaseModel):
         json_encoders = {ObjectId: str}
 
 
+MAX_CHAT_PDFS = 20
+
+
 class ChatRequest(BaseModel):
-    pdf_id: str
+    pdf_id: Optional[str] = None
+    pdf_ids: Optional[List[str]] = None
     question: str
     top_k: Optional[int] = 4
 
+    @model_validator(mode="after")
+    def check_pdfs(self):
+        if not self.pdf_id and not self.pdf_ids:
+            raise ValueError("Provide pdf_id or pdf_ids")
+        if len(self.all_pdf_ids()) > MAX_CHAT_PDFS:
+            raise ValueError(f"At most {MAX_CHAT_PDFS} PDFs can be searched at once")
+        return self
+
+    def all_pdf_ids(self) -> List[str]:
+        # pdf_id is kept for older clients; order is preserved, duplicates dropped.
+        ids = ([self.pdf_id] if self.pdf_id else []) + (self.pdf_ids or [])
+        return list(dict.fromkeys(ids))
+
 
 class ChatResp(BaseModel):
     answer: str
@@ -92,6 +118,9 @@ class ReviseChatSessionCreate(BaseModel):
     user_id: str
     title: str
     messages: List[ReviseChatMessage] = []
+    message_count: int = 0
+    summary: str = ""
+    summarized_count: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -110,6 +139,46 @@ class ReviseChatSession(BaseModel):
         json_encoders = {ObjectId: str}
 
 
+# A session in the /revise-chat/history listing, without its messages.
+class ReviseChatSessionSummary(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    user_id: str
+    title: str
+    message_count: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        validate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+
+class MCQ(BaseModel):
+    question: str = Field(min_length=1)
+    options: List[str] = Field(min_length=4, max_length=4)
+    answer_index: int = Field(ge=0, le=3)
+    explanation: str = ""
+
+
+class SAQ(BaseModel):
+    question: str = Field(min_length=1)
+    answer: str = Field(min_length=1)
+
+
+class LAQ(BaseModel):
+    question: str = Field(min_length=1)
+    answer_outline: List[str] = Field(min_length=1)
+
+    @field_validator("answer_outline", mode="before")
+    @classmethod
+    def split_outline(cls, value):
+        # Models sometimes write the outline as one string of lines.
+        if isinstance(value, str):
+            return [line.strip(" -*\t") for line in value.splitlines() if line.strip(" -*\t")]
+        return value
+
+
 class QuizSubmit(BaseModel):
     quiz_id: str
     answers: Any  
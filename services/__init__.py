@@ -1,5 +0,0 @@
-from . import pdf_reader
-from . import gemini_client
-from . import quiz_generator
-from . import rag_engine
-from . import youtube_recommender
@@ -0,0 +1,217 @@
+import os
+import mmap
+import time
+import asyncio
+import logging
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, Optional, Union
+from bson.objectid import ObjectId
+from services.metrics import BLOB_CACHE_REQUESTS
+from services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Node-local copies of PDF bytes, shared by every process on the node.
+BLOB_CACHE_DIR = os.path.abspath(os.getenv("BLOB_CACHE_DIR", "blob_cache"))
+BLOB_CACHE_MAX_BYTES = int(float(os.getenv("BLOB_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+TMP_PREFIX = ".tmp-"
+# Temp files older than this were left behind by a crashed writer.
+STALE_TMP_SECONDS = 3600
+
+blob_flight = SingleFlight("blob_fetch")
+
+
+def _path(file_id: str) -> str:
+    # Round-tripped through ObjectId so a file_id can never name a path outside the cache.
+    return os.path.join(BLOB_CACHE_DIR, f"{ObjectId(file_id)}.pdf")
+
+
+def cached_path(file_id: str) -> Optional[str]:
+    """
+    Returns the cached file's path, or None on a miss. A hit bumps the
+    file's mtime, which is the recency every process on the node evicts by.
+    """
+    if BLOB_CACHE_MAX_BYTES <= 0:
+        return None
+    path = _path(file_id)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def open_cached(file_id: str) -> Optional[mmap.mmap]:
+    """
+    Maps the cached file read-only, or returns None on a miss. The mapping
+    stays valid if the file is evicted afterwards, so a reader can never
+    lose the file between lookup and use. Bumps the mtime like cached_path.
+    """
+    if BLOB_CACHE_MAX_BYTES <= 0:
+        return None
+    try:
+        with open(_path(file_id), "rb") as f:
+            os.utime(f.fileno())
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+
+def store(file_id: str, content: bytes) -> Optional[str]:
+    """
+    Writes the content to the cache and returns its path, or None if it
+    can't be cached. The write goes to a temp file that is renamed into
+    place, so readers only ever see complete files.
+    """
+    if not 0 < len(content) <= BLOB_CACHE_MAX_BYTES:
+        return None
+    try:
+        os.makedirs(BLOB_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=TMP_PREFIX, dir=BLOB_CACHE_DIR)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, _path(file_id))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        logger.warning("Failed to cache file %s: %s", file_id, e)
+        return None
+    try:
+        _evict_to_fit(keep=file_id)
+    except OSError as e:
+        logger.warning("Blob cache eviction failed: %s", e)
+    return _path(file_id)
+
+
+def _evict_to_fit(keep: str):
+    """
+    Removes the least recently used files until the cache fits
+    BLOB_CACHE_MAX_BYTES. Other processes may be reading an evicted file;
+    their open handles stay valid after the unlink.
+    """
+    now = time.time()
+    entries = []
+    total = 0
+    with os.scandir(BLOB_CACHE_DIR) as it:
+        for entry in it:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.startswith(TMP_PREFIX):
+                if now - stat.st_mtime > STALE_TMP_SECONDS:
+                    _unlink(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    keep_path = _path(keep)
+    for _, size, path in sorted(entries):
+        if total <= BLOB_CACHE_MAX_BYTES:
+            break
+        if path == keep_path:
+            continue
+        _unlink(path)
+        total -= size
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def evict(file_id: str):
+    _unlink(_path(file_id))
+
+
+async def _fetch(db, file_id: str, fill: bool) -> Optional[bytes]:
+    doc = await db.pdfs_content.find_one({"_id": ObjectId(file_id)}, {"content": 1})
+    if not doc:
+        return None
+    if fill:
+        await asyncio.to_thread(store, file_id, doc["content"])
+    return doc["content"]
+
+
+async def fetch_pdf(db, file_id: str, fill: bool = True) -> Optional[bytes]:
+    """
+    Reads a PDF's bytes from Mongo and, unless fill=False, stores them in
+    the cache. None if the content doesn't exist.
+    """
+    # Concurrent misses for the same file share one fetch.
+    return await blob_flight.do((file_id, fill), lambda: _fetch(db, file_id, fill))
+
+
+@asynccontextmanager
+async def open_pdf(db, file_id: str):
+    """
+    Yields a PDF as a read-only mmap of the cached file, or as bytes fetched
+    from Mongo on a miss; None if the content doesn't exist. The mapping is
+    closed on exit. Callers check ownership and deletion themselves.
+    """
+    pdf_content = await load_pdf(db, file_id)
+    try:
+        yield pdf_content
+    finally:
+        if isinstance(pdf_content, mmap.mmap):
+            pdf_content.close()
+
+
+async def load_pdf(db, file_id: str) -> Optional[Union[mmap.mmap, bytes]]:
+    """
+    Like open_pdf, for callers that outlive a `with` block (e.g. a streamed
+    response); they must close a returned mmap themselves.
+    """
+    pdf_content = await asyncio.to_thread(open_cached, file_id)
+    if pdf_content is not None:
+        BLOB_CACHE_REQUESTS.labels("hit").inc()
+        return pdf_content
+    BLOB_CACHE_REQUESTS.labels("miss").inc()
+    return await fetch_pdf(db, file_id)
+
+
+async def load_pdf_source(db, file_id: str) -> Optional[Union[str, bytes]]:
+    """
+    Returns a PDF as a path into the cache, for handing to a process pool
+    without pickling the bytes, or as bytes on a miss. The file may be
+    evicted before the pool process opens it; rag_engine then raises
+    FileNotFoundError and the caller retries with fetch_pdf.
+    """
+    path = await asyncio.to_thread(cached_path, file_id)
+    if path:
+        BLOB_CACHE_REQUESTS.labels("hit").inc()
+        return path
+    BLOB_CACHE_REQUESTS.labels("miss").inc()
+    return await fetch_pdf(db, file_id)
+
+
+async def load_pdfs(db, file_ids: Iterable[str], fill: bool = True) -> Dict[str, Union[str, bytes]]:
+    """
+    Like load_pdf_source for several files, with one Mongo query for all misses.
+    Files whose content doesn't exist are left out. With fill=False misses
+    are returned as bytes without being cached, so a bulk pass over every
+    PDF doesn't evict the hot ones.
+    """
+    sources = {}
+    missing = []
+    for file_id in file_ids:
+        path = await asyncio.to_thread(cached_path, file_id)
+        if path:
+            BLOB_CACHE_REQUESTS.labels("hit").inc()
+            sources[file_id] = path
+        else:
+            BLOB_CACHE_REQUESTS.labels("miss").inc()
+            missing.append(file_id)
+
+    if missing:
+        async for doc in db.pdfs_content.find(
+                {"_id": {"$in": [ObjectId(file_id) for file_id in missing]}}, {"content": 1}):
+            file_id = str(doc["_id"])
+            path = await asyncio.to_thread(store, file_id, doc["content"]) if fill else None
+            sources[file_id] = path or doc["content"]
+    return sources
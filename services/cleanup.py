@@ -0,0 +1,201 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+from services import job_queue
+from services import blob_cache
+from services.rag_engine import get_vector_index
+from services.pinecone_client import pinecone_configured
+from services.index_versions import active_config, write_configs
+
+logger = logging.getLogger(__name__)
+
+CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", "1000"))
+ORPHAN_SWEEP_INTERVAL_SECONDS = int(os.getenv("ORPHAN_SWEEP_INTERVAL_SECONDS", "3600"))
+# Content younger than this may belong to an upload whose metadata insert
+# hasn't landed yet, so the sweep leaves it alone.
+ORPHAN_GRACE_SECONDS = 3600
+
+SWEEP_LOCK_ID = "orphan_sweep"
+
+RAG_ENABLED = os.getenv("RAG_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Matches documents where deleted_at is missing or null.
+NOT_DELETED = {"deleted_at": None}
+
+
+async def ensure_cleanup_indexes(db):
+    # Cascade deletes and the orphan sweep look documents up by their parent.
+    await db.pdfs.create_index("file_id")
+    await db.pdfs.create_index("deleted_at", sparse=True)
+    await db.quizzes.create_index("pdf_id")
+    await db.quiz_attempts.create_index("quiz_id")
+    await db.youtube_cache.create_index("pdf_id")
+
+
+async def acquire_sweep_lock(db, owner: str, ttl_seconds: int = ORPHAN_SWEEP_INTERVAL_SECONDS) -> bool:
+    """
+    Takes the sweep lease for ttl_seconds so only one worker sweeps per
+    interval. The lease is never released early; it just expires.
+    """
+    now = datetime.utcnow()
+    try:
+        await db.locks.find_one_and_update(
+            {"_id": SWEEP_LOCK_ID, "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another worker holds an unexpired lease, so the upsert collided with it.
+        return False
+    return True
+
+
+def _vectors_enabled() -> bool:
+    # Without RAG or Pinecone credentials no vectors were ever written.
+    return RAG_ENABLED and pinecone_configured()
+
+
+def _delete_vector_namespace(namespace: str, configs=None):
+    # Every index that may hold the namespace, including one being re-indexed into.
+    for config in configs or write_configs():
+        try:
+            get_vector_index(config).delete(delete_all=True, namespace=namespace)
+        except Exception as e:
+            # Deleting a namespace that was never written (or is already gone) is a no-op for us.
+            if "not found" in str(e).lower() or "404" in str(e):
+                continue
+            raise
+
+
+async def _delete_quizzes(db, quiz_query: dict) -> dict:
+    """
+    Deletes matching quizzes and their attempts in batches. Users whose
+    attempts were removed lose their progress summary, which is rebuilt on
+    their next /progress/ read.
+    """
+    counts = {"quizzes": 0, "quiz_attempts": 0}
+    while True:
+        quiz_ids = [q["_id"] async for q in db.quizzes.find(quiz_query, {"_id": 1}).limit(CLEANUP_BATCH_SIZE)]
+        if not quiz_ids:
+            return counts
+        quiz_id_strs = [str(quiz_id) for quiz_id in quiz_ids]
+        user_ids = await db.quiz_attempts.distinct("user_id", {"quiz_id": {"$in": quiz_id_strs}})
+        attempts = await db.quiz_attempts.delete_many({"quiz_id": {"$in": quiz_id_strs}})
+        if user_ids:
+            await db.progress_summaries.delete_many({"_id": {"$in": user_ids}})
+        quizzes = await db.quizzes.delete_many({"_id": {"$in": quiz_ids}})
+        counts["quiz_attempts"] += attempts.deleted_count
+        counts["quizzes"] += quizzes.deleted_count
+
+
+async def delete_pdf_cascade(db, pdf_id: str, file_id: str) -> dict:
+    """
+    Removes everything hanging off a PDF: its vector namespace, quizzes and
+    their attempts, progress topic, cached YouTube results, content and,
+    last, the PDF document itself so a failed run can be retried.
+    """
+    vectors_deleted = False
+    if _vectors_enabled():
+        try:
+            await asyncio.to_thread(_delete_vector_namespace, str(pdf_id))
+            vectors_deleted = True
+        except Exception as e:
+            # The Mongo cleanup must not hang on Pinecone; the orphan sweep
+            # removes the namespace once the PDF document is gone.
+            logger.warning("Failed to delete vectors of PDF %s: %s", pdf_id, e)
+
+    counts = await _delete_quizzes(db, {"pdf_id": pdf_id})
+    progress = await db.progress.delete_many({"topic": f"pdf_{pdf_id}"})
+    youtube = await db.youtube_cache.delete_many({"pdf_id": pdf_id})
+    content = await db.pdfs_content.delete_one({"_id": ObjectId(file_id)})
+    await asyncio.to_thread(blob_cache.evict, file_id)
+    pdf = await db.pdfs.delete_one({"_id": ObjectId(pdf_id)})
+
+    counts.update({
+        "vector_namespace": vectors_deleted,
+        "progress": progress.deleted_count,
+        "youtube_cache": youtube.deleted_count,
+        "pdfs_content": content.deleted_count,
+        "pdfs": pdf.deleted_count,
+    })
+    return counts
+
+
+async def _live_pdf_ids(db, pdf_ids: list) -> set:
+    object_ids = [ObjectId(p) for p in pdf_ids if ObjectId.is_valid(p)]
+    live = db.pdfs.find({"_id": {"$in": object_ids}, **NOT_DELETED}, {"_id": 1})
+    return {str(doc["_id"]) async for doc in live}
+
+
+async def _sweep_vector_namespaces(db) -> int:
+    config = active_config()
+    stats = await asyncio.to_thread(lambda: get_vector_index(config).describe_index_stats())
+    namespaces = [ns for ns in stats["namespaces"] if ns]
+    deleted = 0
+    for i in range(0, len(namespaces), CLEANUP_BATCH_SIZE):
+        batch = namespaces[i:i + CLEANUP_BATCH_SIZE]
+        live = await _live_pdf_ids(db, batch)
+        for namespace in batch:
+            if namespace not in live and ObjectId.is_valid(namespace):
+                await asyncio.to_thread(_delete_vector_namespace, namespace, [config])
+                deleted += 1
+    return deleted
+
+
+async def sweep_orphans(db) -> dict:
+    """
+    Catches what per-PDF deletes missed: PDFs marked deleted without a
+    finished cleanup, vector namespaces, content and quizzes whose PDF no
+    longer exists (e.g. deleted before cascade cleanup existed).
+    """
+    counts = {"requeued_deletes": 0, "vector_namespaces": 0, "pdfs_content": 0, "quizzes": 0, "quiz_attempts": 0}
+    cutoff = datetime.utcnow() - timedelta(seconds=ORPHAN_GRACE_SECONDS)
+
+    async for pdf in db.pdfs.find({"deleted_at": {"$lt": cutoff}}, {"file_id": 1}):
+        pending = await db.jobs.find_one({
+            "type": job_queue.DELETE_PDF_JOB, "payload.pdf_id": str(pdf["_id"]),
+            "status": {"$in": [job_queue.STATUS_QUEUED, job_queue.STATUS_RUNNING]}
+        }, {"_id": 1})
+        if not pending:
+            await job_queue.enqueue_delete_job(db, str(pdf["_id"]), pdf["file_id"])
+            counts["requeued_deletes"] += 1
+
+    if _vectors_enabled():
+        try:
+            counts["vector_namespaces"] = await _sweep_vector_namespaces(db)
+        except Exception as e:
+            # A Pinecone outage shouldn't stop the Mongo passes below.
+            logger.warning("Vector namespace sweep failed: %s", e)
+
+    last_id = None
+    while True:
+        query = {"created_at": {"$lt": cutoff}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        content_ids = [doc["_id"] async for doc in db.pdfs_content.find(query, {"_id": 1}).sort("_id", 1).limit(CLEANUP_BATCH_SIZE)]
+        if not content_ids:
+            break
+        last_id = content_ids[-1]
+        referenced = await db.pdfs.distinct("file_id", {"file_id": {"$in": [str(c) for c in content_ids]}})
+        orphaned = [c for c in content_ids if str(c) not in set(referenced)]
+        if orphaned:
+            result = await db.pdfs_content.delete_many({"_id": {"$in": orphaned}})
+            counts["pdfs_content"] += result.deleted_count
+            for content_id in orphaned:
+                await asyncio.to_thread(blob_cache.evict, str(content_id))
+
+    quiz_pdf_ids = await db.quizzes.distinct("pdf_id")
+    for i in range(0, len(quiz_pdf_ids), CLEANUP_BATCH_SIZE):
+        batch = quiz_pdf_ids[i:i + CLEANUP_BATCH_SIZE]
+        existing = {str(doc["_id"]) async for doc in db.pdfs.find(
+            {"_id": {"$in": [ObjectId(p) for p in batch if ObjectId.is_valid(p)]}}, {"_id": 1})}
+        missing = [p for p in batch if p not in existing]
+        if missing:
+            removed = await _delete_quizzes(db, {"pdf_id": {"$in": missing}})
+            counts["quizzes"] += removed["quizzes"]
+            counts["quiz_attempts"] += removed["quiz_attempts"]
+
+    return counts
@@ -0,0 +1,119 @@
+import os
+from typing import Callable, List, Optional
+from services.tokens import estimate_tokens, truncate_to_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Shortest shared prefix/suffix treated as splitter overlap rather than coincidence.
+MIN_OVERLAP_CHARS = 20
+# Don't emit a truncated block smaller than this; the space is better left unused.
+MIN_BLOCK_TOKENS = 40
+
+
+def _overlap(left: str, right: str) -> int:
+    """
+    Length of the longest suffix of `left` that is also a prefix of `right`.
+    """
+    for size in range(min(len(left), len(right)), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_into(segments: List[str], text: str) -> bool:
+    """
+    Merges text into the first segment it overlaps or contains, or is
+    contained by. False if it touches none of them.
+    """
+    for i, segment in enumerate(segments):
+        if text in segment:
+            return True
+        if segment in text:
+            segments[i] = text
+            return True
+        size = _overlap(segment, text)
+        if size:
+            segments[i] = segment + text[size:]
+            return True
+        size = _overlap(text, segment)
+        if size:
+            segments[i] = text + segment[size:]
+            return True
+    return False
+
+
+def _merge_segments(chunks: List[dict]) -> List[str]:
+    """
+    Merges chunks of one page that overlap or contain each other into
+    contiguous segments. Chunks indexed with a start_index are ordered by
+    (page, start_index); older ones keep retrieval order and are matched on
+    their text alone. Passes repeat until nothing merges, so a chunk that
+    bridges two earlier segments joins them too.
+    """
+    if all("start_index" in c["metadata"] for c in chunks):
+        chunks = sorted(chunks, key=lambda c: (c["metadata"].get("page") or 0, c["metadata"]["start_index"]))
+
+    segments = [chunk["page_content"].strip() for chunk in chunks]
+    merged = True
+    while merged:
+        merged = False
+        result: List[str] = []
+        for text in segments:
+            if _merge_into(result, text):
+                merged = True
+            else:
+                result.append(text)
+        segments = result
+    return segments
+
+
+def page_label(block: dict) -> str:
+    return f"p. {block['page']}" if block["page"] is not None else "document"
+
+
+def build_context_blocks(docs: List[dict], token_budget: int = CONTEXT_TOKEN_BUDGET,
+                         label: Callable[[dict], str] = page_label) -> List[dict]:
+    """
+    Groups retrieved chunks by PDF and page, merges the splitter's overlaps
+    and keeps whole pages in relevance order (best chunk score, or retrieval
+    order when there is none) until token_budget is spent. The last page
+    that doesn't fit is truncated if enough budget remains.
+
+    Each block has pdf_id, page, score, text, and `tagged`: the text under
+    a "[p. N]" header (or whatever `label` returns) for the prompt.
+    """
+    groups = {}
+    for rank, doc in enumerate(docs):
+        key = (doc.get("pdf_id"), doc["metadata"].get("page"))
+        group = groups.setdefault(key, {"chunks": [], "score": doc.get("score"), "rank": rank})
+        group["chunks"].append(doc)
+        if doc.get("score") is not None and (group["score"] is None or doc["score"] > group["score"]):
+            group["score"] = doc["score"]
+
+    ordered = sorted(groups.items(), key=lambda item: (
+        -(item[1]["score"] if item[1]["score"] is not None else float("-inf")), item[1]["rank"]))
+
+    blocks = []
+    remaining = token_budget
+    for (pdf_id, page), group in ordered:
+        block = {"pdf_id": pdf_id, "page": page, "score": group["score"],
+                 "text": "\n...\n".join(_merge_segments(group["chunks"]))}
+        header = f"[{label(block)}]\n"
+        cost = estimate_tokens(header + block["text"])
+        if cost > remaining:
+            room = remaining - estimate_tokens(header)
+            if room < MIN_BLOCK_TOKENS:
+                break
+            block["text"] = truncate_to_tokens(block["text"], room)
+            cost = remaining
+        block["tagged"] = header + block["text"]
+        blocks.append(block)
+        remaining -= cost
+    return blocks
+
+
+def build_context(docs: List[dict], token_budget: int = CONTEXT_TOKEN_BUDGET,
+                  label: Callable[[dict], str] = page_label) -> Optional[str]:
+    blocks = build_context_blocks(docs, token_budget, label)
+    if not blocks:
+        return None
+    return "\n\n".join(block["tagged"] for block in blocks)
@@ -0,0 +1,113 @@
+import os
+import logging
+from datetime import datetime
+from typing import List, Optional
+from bson.objectid import ObjectId
+from services.gemini_client import get_gemini_response
+from services.tokens import estimate_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Recent turns (a question and its answer) sent verbatim, newest first, as far as the budget allows.
+MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "6"))
+# Older turns are folded into the summary a few at a time, so there is one summarisation call every few turns.
+MEMORY_SUMMARY_BATCH_TURNS = int(os.getenv("MEMORY_SUMMARY_BATCH_TURNS", "2"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "300"))
+# Upper bound on messages folded by one summarisation call (sessions that predate the summary).
+MAX_FOLD_MESSAGES = 40
+
+RECENT_MESSAGES = 2 * MEMORY_RECENT_TURNS
+WINDOW_MESSAGES = 2 * (MEMORY_RECENT_TURNS + MEMORY_SUMMARY_BATCH_TURNS)
+
+MEMORY_PROJECTION = {
+    "summary": 1, "summarized_count": 1, "message_count": 1,
+    "messages": {"$slice": -WINDOW_MESSAGES},
+}
+
+
+def _format_message(message: dict) -> str:
+    speaker = "Student" if message["role"] == "user" else "Assistant"
+    return f"{speaker}: {message['content']}"
+
+
+def unsummarized_messages(session: dict) -> List[dict]:
+    """
+    Returns the messages in a session loaded with MEMORY_PROJECTION that are
+    not yet covered by its summary.
+    """
+    messages = session.get("messages", [])
+    first_index = session.get("message_count", len(messages)) - len(messages)
+    skip = max(session.get("summarized_count", 0) - first_index, 0)
+    return messages[skip:]
+
+
+def build_prompt(session: Optional[dict], question: str) -> Optional[str]:
+    """
+    Packs the session summary and as many recent messages as fit in
+    MEMORY_TOKEN_BUDGET around the new question. Returns None for a new
+    or empty session, where the question is sent on its own.
+    """
+    if not session:
+        return None
+    summary = truncate_to_tokens(session.get("summary") or "", SUMMARY_TOKEN_BUDGET)
+    budget = MEMORY_TOKEN_BUDGET - (estimate_tokens(summary) if summary else 0)
+
+    recent = []
+    for message in reversed(unsummarized_messages(session)[-RECENT_MESSAGES:]):
+        line = _format_message(message)
+        cost = estimate_tokens(line)
+        if cost > budget:
+            break
+        recent.append(line)
+        budget -= cost
+    recent.reverse()
+
+    if not summary and not recent:
+        return None
+
+    parts = ["You are a helpful study assistant continuing a conversation with a student."]
+    if summary:
+        parts.append(f"Summary of the earlier conversation:\n{summary}")
+    if recent:
+        parts.append("Recent conversation:\n" + "\n".join(recent))
+    parts.append(f"Student: {question}\n\nAnswer the student's latest message concisely, using the conversation for context.")
+    return "\n\n".join(parts)
+
+
+async def update_summary(db, session_id: str):
+    """
+    Folds turns that have dropped out of the recent window into the stored
+    summary. Runs after the response is sent; a concurrent update of the
+    same session makes this one a no-op.
+    """
+    session = await db.revise_chat_sessions.find_one({"_id": ObjectId(session_id)}, {"summary": 1, "summarized_count": 1, "message_count": 1})
+    if not session or "message_count" not in session:
+        return
+    summarized_count = session.get("summarized_count", 0)
+    fold_until = session["message_count"] - RECENT_MESSAGES
+    if fold_until - summarized_count < 2 * MEMORY_SUMMARY_BATCH_TURNS:
+        return
+    fold_from = max(summarized_count, fold_until - MAX_FOLD_MESSAGES)
+
+    doc = await db.revise_chat_sessions.find_one(
+        {"_id": ObjectId(session_id)}, {"messages": {"$slice": [fold_from, fold_until - fold_from]}})
+    transcript = "\n".join(_format_message(m) for m in doc.get("messages", []))
+    prompt = (
+        "Update the running summary of a study conversation between a student and an assistant. "
+        f"Keep the topics covered, facts established and open questions, in at most {SUMMARY_TOKEN_BUDGET * 3 // 4} words.\n\n"
+        f"Current summary:\n{session.get('summary') or '(none)'}\n\n"
+        f"New messages:\n{transcript}\n\n"
+        "Updated summary:"
+    )
+    try:
+        summary = await get_gemini_response(prompt, max_tokens=SUMMARY_TOKEN_BUDGET * 2, raw_prompt=True)
+    except Exception as e:
+        logger.warning("Failed to summarise revise chat session %s: %s", session_id, e)
+        return
+
+    await db.revise_chat_sessions.update_one(
+        {"_id": ObjectId(session_id), "summarized_count": session.get("summarized_count")},
+        {"$set": {"summary": truncate_to_tokens(summary.strip(), SUMMARY_TOKEN_BUDGET),
+                  "summarized_count": fold_until, "summarized_at": datetime.utcnow()}}
+    )
@@ -1,31 +1,102 @@
 import os
+import time
+import asyncio
 import logging
-import google.generativeai as genai
+import threading
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+from services.metrics import observe_stage, LLM_INFLIGHT, LLM_QUEUED, LLM_QUEUE_WAIT, RATE_LIMITED
+from services.readiness import warming
 
 load_dotenv()
 
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-genai.configure(api_key=GEMINI_API_KEY)
+# Per process: with N workers the node runs up to N * LLM_MAX_CONCURRENCY calls.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "2"))
+LLM_OVERLOAD_RETRY_AFTER_SECONDS = 5
 
+_genai = None
+_genai_lock = threading.Lock()
+_llm_semaphore = None
 
-async def get_gemini_response(prompt: str, max_tokens: int = 2048):
+
+class LLMOverloaded(Exception):
+    """
+    Raised when no Gemini slot frees up within LLM_QUEUE_TIMEOUT_SECONDS.
+    main.py answers it with 429 and Retry-After.
+    """
+
+    def __init__(self, retry_after: int = LLM_OVERLOAD_RETRY_AFTER_SECONDS):
+        super().__init__("LLM capacity exhausted")
+        self.retry_after = retry_after
+
+
+@asynccontextmanager
+async def llm_slot():
+    """
+    Caps concurrent Gemini calls in this process at LLM_MAX_CONCURRENCY.
+    Callers queue for up to LLM_QUEUE_TIMEOUT_SECONDS, then get LLMOverloaded.
+    """
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+    if _llm_semaphore.locked():
+        LLM_QUEUED.inc()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(_llm_semaphore.acquire(), timeout=LLM_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            RATE_LIMITED.labels("llm", "overloaded").inc()
+            raise LLMOverloaded()
+        finally:
+            LLM_QUEUE_WAIT.observe(time.perf_counter() - started)
+    else:
+        await _llm_semaphore.acquire()
+    try:
+        yield
+    finally:
+        _llm_semaphore.release()
+
+
+def get_genai():
+    """
+    Imports and configures the Gemini SDK on first use.
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                with warming("gemini"):
+                    import google.generativeai as genai
+                    genai.configure(api_key=GEMINI_API_KEY)
+                _genai = genai
+    return _genai
+
+
+async def get_gemini_response(prompt: str, max_tokens: int = 2048, raw_prompt: bool = False):
+    """
+    Sends a question to Gemini with a "concise answer" preamble. Callers that
+    build their own instructions pass raw_prompt=True to send it unchanged.
+    """
     if not GEMINI_API_KEY:
         raise ValueError("GEMINI_API_KEY not set in environment variables.")
 
-    model = genai.GenerativeModel('gemini-2.5-flash')
+    model = get_genai().GenerativeModel('gemini-2.5-flash')
 
-    full_prompt = f"Please provide a concise answer to the following question: {prompt}"
+    full_prompt = prompt if raw_prompt else f"Please provide a concise answer to the following question: {prompt}"
 
     try:
-        response = await model.generate_content_async(full_prompt, generation_config={
-            "max_output_tokens": max_tokens
-        })
+        async with llm_slot():
+            with LLM_INFLIGHT.track_inprogress(), observe_stage("gemini"):
+                response = await model.generate_content_async(full_prompt, generation_config={
+                    "max_output_tokens": max_tokens
+                })
 
         if response.candidates and response.candidates[0].content.parts:
             generated_text = response.candidates[0].content.parts[0].text
@@ -34,9 +105,38 @@ async def get_gemini_response(prompt: str, max_tokens: int = 2048):
 
             finish_reason = response.candidates[0].finish_reason if response.candidates else None
             logger.warning(
-                f"Gemini API did not return text content. Finish reason: {finish_reason}")
+                "Gemini API did not return text content. Finish reason: %s", finish_reason)
             return "I'm sorry, I couldn't generate a complete response. Please try again or rephrase your question."
 
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        logger.error("Gemini API call failed: %s", e)
+        raise
+
+
+async def stream_gemini_response(prompt: str, max_tokens: int = 2048):
+    """
+    Yields Gemini's reply to a prompt, sent unchanged, as text chunks while
+    it is generated. The concurrency slot is held until the stream ends.
+    """
+    if not GEMINI_API_KEY:
+        raise ValueError("GEMINI_API_KEY not set in environment variables.")
+
+    model = get_genai().GenerativeModel('gemini-2.5-flash')
+
+    try:
+        async with llm_slot():
+            with LLM_INFLIGHT.track_inprogress(), observe_stage("gemini"):
+                response = await model.generate_content_async(prompt, generation_config={
+                    "max_output_tokens": max_tokens
+                }, stream=True)
+                async for chunk in response:
+                    if chunk.candidates and chunk.candidates[0].content.parts:
+                        yield "".join(part.text for part in chunk.candidates[0].content.parts)
+
+    except LLMOverloaded:
+        raise
     except Exception as e:
-        logger.error(f"Gemini API call failed: {e}")
+        logger.error("Gemini streaming call failed: %s", e)
         raise
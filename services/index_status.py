@@ -0,0 +1,122 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Set
+from bson.objectid import ObjectId
+
+logger = logging.getLogger(__name__)
+
+STATUS_POLL_INTERVAL_SECONDS = float(
+    os.getenv("INDEX_STATUS_POLL_INTERVAL", "1"))
+
+STAGE_QUEUED = "queued"
+STAGE_EXTRACTING = "extracting"
+STAGE_SPLITTING = "splitting"
+STAGE_EMBEDDING = "embedding"
+STAGE_UPSERTING = "upserting"
+STAGE_RETRYING = "retrying"
+STAGE_INDEXED = "indexed"
+STAGE_FAILED = "failed"
+
+TERMINAL_STAGES = (STAGE_INDEXED, STAGE_FAILED)
+
+STAGE_PROGRESS = {
+    STAGE_QUEUED: 0,
+    STAGE_EXTRACTING: 10,
+    STAGE_SPLITTING: 25,
+    STAGE_EMBEDDING: 30,
+    STAGE_UPSERTING: 85,
+    STAGE_INDEXED: 100,
+}
+
+INDEX_STATUS_PROJECTION = {"index_status": 1, "is_indexed": 1}
+
+
+def new_index_status(stage: str = STAGE_QUEUED) -> dict:
+    return {"stage": stage, "progress": STAGE_PROGRESS.get(stage, 0), "error": None, "updated_at": datetime.utcnow()}
+
+
+async def set_index_status(db, pdf_id: str, stage: str, progress: Optional[int] = None, error: Optional[str] = None, only_if_active: bool = False):
+    status = new_index_status(stage)
+    if progress is not None:
+        status["progress"] = progress
+    status["error"] = error
+    query = {"_id": ObjectId(pdf_id)}
+    if only_if_active:
+        # Late progress reports must not overwrite a finished job's status.
+        query["index_status.stage"] = {"$nin": list(TERMINAL_STAGES)}
+    await db.pdfs.update_one(query, {"$set": {"index_status": status}})
+
+
+def status_from_doc(doc: dict) -> dict:
+    status = doc.get("index_status")
+    if not status:
+        # PDFs uploaded before stages were tracked only carry is_indexed.
+        status = new_index_status(
+            STAGE_INDEXED if doc.get("is_indexed") else STAGE_QUEUED)
+    return {
+        "pdf_id": str(doc["_id"]),
+        "stage": status["stage"],
+        "progress": status.get("progress", 0),
+        "is_indexed": bool(doc.get("is_indexed")),
+        "error": status.get("error"),
+        "updated_at": status.get("updated_at"),
+    }
+
+
+class IndexStatusBroadcaster:
+    """
+    Fans index status transitions out to subscribers (SSE streams). All
+    subscriptions in this process share one batched `$in` projection query
+    per poll interval, however many clients are connected.
+    """
+
+    def __init__(self, poll_interval: float = STATUS_POLL_INTERVAL_SECONDS):
+        self.poll_interval = poll_interval
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._last_seen: Dict[str, tuple] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, db, pdf_id: str) -> asyncio.Queue:
+        # Keyed the way status_from_doc reports ids, whatever casing the caller used.
+        pdf_id = str(ObjectId(pdf_id))
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(pdf_id, set()).add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(db))
+        return queue
+
+    def unsubscribe(self, pdf_id: str, queue: asyncio.Queue):
+        pdf_id = str(ObjectId(pdf_id))
+        queues = self._subscribers.get(pdf_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[pdf_id]
+            self._last_seen.pop(pdf_id, None)
+
+    async def _run(self, db):
+        while self._subscribers:
+            try:
+                await self._poll(db)
+            except Exception as e:
+                logger.warning("Index status poll failed: %s", e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _poll(self, db):
+        pdf_ids = [ObjectId(pdf_id) for pdf_id in self._subscribers]
+        cursor = db.pdfs.find({"_id": {"$in": pdf_ids}}, INDEX_STATUS_PROJECTION)
+        async for doc in cursor:
+            status = status_from_doc(doc)
+            key = (status["stage"], status["progress"], status["error"])
+            pdf_id = status["pdf_id"]
+            if self._last_seen.get(pdf_id) == key:
+                continue
+            self._last_seen[pdf_id] = key
+            for queue in self._subscribers.get(pdf_id, ()):
+                queue.put_nowait(status)
+
+
+status_broadcaster = IndexStatusBroadcaster()
@@ -0,0 +1,125 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from services.pinecone_client import REVISELY_INDEX_NAME
+
+logger = logging.getLogger(__name__)
+
+INDEX_CONFIG_REFRESH_SECONDS = float(os.getenv("INDEX_CONFIG_REFRESH_SECONDS", "30"))
+SETTINGS_ID = "vector_index"
+
+# Version 0 is the index every deployment started with, before versioning.
+DEFAULT_INDEX_CONFIG = {
+    "version": 0,
+    "index_name": REVISELY_INDEX_NAME,
+    "model": "sentence-transformers/all-MiniLM-L6-v2",
+    "dimension": 384,
+    "chunk_size": 1000,
+    "chunk_overlap": 200,
+}
+
+# Replaced as a whole on refresh, so readers never see half an update.
+_configs = {"active": DEFAULT_INDEX_CONFIG, "building": None}
+
+
+def index_name_for(version: int) -> str:
+    return REVISELY_INDEX_NAME if version == 0 else f"{REVISELY_INDEX_NAME}-v{version}"
+
+
+def active_config() -> dict:
+    """
+    The index configuration reads go to, as of the last refresh.
+    """
+    return _configs["active"]
+
+
+def building_config() -> Optional[dict]:
+    return _configs["building"]
+
+
+def write_configs() -> List[dict]:
+    """
+    Every index new vectors must land in: the active one and, while a
+    re-index runs, the one being built, so PDFs uploaded mid-build aren't
+    missing after the switch.
+    """
+    building = _configs["building"]
+    return [_configs["active"]] + ([building] if building else [])
+
+
+async def refresh_index_configs(db):
+    global _configs
+    doc = await db.settings.find_one({"_id": SETTINGS_ID})
+    if doc:
+        _configs = {"active": doc.get("active") or DEFAULT_INDEX_CONFIG, "building": doc.get("building")}
+    else:
+        _configs = {"active": DEFAULT_INDEX_CONFIG, "building": None}
+
+
+async def keep_index_configs_fresh(db, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await refresh_index_configs(db)
+        except Exception as e:
+            logger.warning("Failed to refresh index configuration: %s", e)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=INDEX_CONFIG_REFRESH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def start_build(db, model: str, dimension: int, chunk_size: int, chunk_overlap: int) -> dict:
+    """
+    Registers a new index version as `building` and returns its config.
+    Raises ValueError if another build is already registered.
+    """
+    await refresh_index_configs(db)
+    if _configs["building"]:
+        raise ValueError(f"Index version {_configs['building']['version']} is already being built")
+    version = _configs["active"]["version"] + 1
+    config = {
+        "version": version,
+        "index_name": index_name_for(version),
+        "model": model,
+        "dimension": dimension,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "created_at": datetime.utcnow(),
+    }
+    try:
+        doc = await db.settings.find_one_and_update(
+            {"_id": SETTINGS_ID, "building": None},
+            {"$set": {"building": config}, "$setOnInsert": {"active": DEFAULT_INDEX_CONFIG}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The settings document exists but gained a build since the check above.
+        raise ValueError("Another index version is already being built")
+    await refresh_index_configs(db)
+    return doc["building"]
+
+
+async def switch_to_build(db, version: int) -> bool:
+    """
+    Makes the built version active in one update; the old config is kept as
+    `previous`. Readers follow within INDEX_CONFIG_REFRESH_SECONDS.
+    """
+    result = await db.settings.update_one(
+        {"_id": SETTINGS_ID, "building.version": version},
+        [{"$set": {"previous": "$active", "active": "$building", "building": None,
+                   "switched_at": datetime.utcnow()}}]
+    )
+    await refresh_index_configs(db)
+    return result.modified_count == 1
+
+
+async def abandon_build(db, version: int) -> bool:
+    result = await db.settings.update_one(
+        {"_id": SETTINGS_ID, "building.version": version}, {"$set": {"building": None}})
+    await refresh_index_configs(db)
+    return result.modified_count == 1
@@ -0,0 +1,201 @@
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_BASE_SECONDS = int(os.getenv("JOB_BACKOFF_BASE_SECONDS", "30"))
+JOB_BACKOFF_MAX_SECONDS = int(os.getenv("JOB_BACKOFF_MAX_SECONDS", "3600"))
+
+INDEX_PDF_JOB = "index_pdf"
+DELETE_PDF_JOB = "delete_pdf"
+INDEX_PDF_BATCH_JOB = "index_pdf_batch"
+
+# Job lifecycle: queued -> running -> done, or back to queued with a backoff
+# on failure, until max_attempts is reached and the job is dead-lettered.
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+
+
+async def ensure_job_indexes(db):
+    await db.jobs.create_index([("status", 1), ("run_at", 1)])
+    await db.jobs.create_index([("status", 1), ("lease_expires_at", 1)])
+    # At most one queued or running job per dedupe_key, across all processes.
+    await db.jobs.create_index(
+        "dedupe_key", name="dedupe_key_active", unique=True,
+        partialFilterExpression={"dedupe_key": {"$exists": True},
+                                 "status": {"$in": [STATUS_QUEUED, STATUS_RUNNING]}})
+    try:
+        # Superseded by dedupe_key_active, which enforces the uniqueness.
+        await db.jobs.drop_index("dedupe_key_1_status_1")
+    except OperationFailure:
+        pass
+
+
+def backoff_seconds(attempts: int) -> int:
+    return min(JOB_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), JOB_BACKOFF_MAX_SECONDS)
+
+
+async def enqueue_job(db, job_type: str, payload: dict, max_attempts: Optional[int] = None, dedupe_key: Optional[str] = None) -> str:
+    """
+    Inserts a job and returns its id. With a dedupe_key, a queued or running
+    job with the same key is reused instead of adding a duplicate.
+    """
+    now = datetime.utcnow()
+    job_doc = {
+        "type": job_type,
+        "payload": payload,
+        "status": STATUS_QUEUED,
+        "attempts": 0,
+        "max_attempts": max_attempts or JOB_MAX_ATTEMPTS,
+        "run_at": now,
+        "lease_expires_at": None,
+        "worker_id": None,
+        "last_error": None,
+        "created_at": now,
+        "updated_at": now
+    }
+    if dedupe_key is None:
+        result = await db.jobs.insert_one(job_doc)
+        return str(result.inserted_id)
+
+    active = {"dedupe_key": dedupe_key, "status": {"$in": [STATUS_QUEUED, STATUS_RUNNING]}}
+    try:
+        job = await db.jobs.find_one_and_update(
+            active,
+            {"$setOnInsert": job_doc},
+            upsert=True,
+            projection={"_id": 1},
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # A concurrent enqueue inserted the job first; reuse it.
+        job = await db.jobs.find_one(active, {"_id": 1})
+        if job is None:
+            # It already finished in between, so this request needs its own run.
+            return await enqueue_job(db, job_type, payload, max_attempts, dedupe_key)
+    return str(job["_id"])
+
+
+async def enqueue_index_job(db, pdf_id: str, file_id: str) -> str:
+    return await enqueue_job(db, INDEX_PDF_JOB, {"pdf_id": pdf_id, "file_id": file_id},
+                             dedupe_key=f"{INDEX_PDF_JOB}:{pdf_id}:{file_id}")
+
+
+async def enqueue_batch_index_job(db, items: List[dict]) -> str:
+    # items: [{"pdf_id": ..., "file_id": ...}, ...]
+    return await enqueue_job(db, INDEX_PDF_BATCH_JOB, {"items": items})
+
+
+async def enqueue_delete_job(db, pdf_id: str, file_id: str) -> str:
+    return await enqueue_job(db, DELETE_PDF_JOB, {"pdf_id": pdf_id, "file_id": file_id})
+
+
+async def claim_job(db, worker_id: str, job_types: Optional[List[str]] = None, lease_seconds: int = JOB_LEASE_SECONDS):
+    """
+    Atomically leases the next runnable job. Jobs whose lease expired (the
+    worker holding them died) are picked up again.
+    """
+    now = datetime.utcnow()
+    query = {"$or": [
+        {"status": STATUS_QUEUED, "run_at": {"$lte": now}},
+        {"status": STATUS_RUNNING, "lease_expires_at": {"$lt": now}},
+    ]}
+    if job_types:
+        query["type"] = {"$in": job_types}
+
+    return await db.jobs.find_one_and_update(
+        query,
+        {
+            "$set": {
+                "status": STATUS_RUNNING,
+                "worker_id": worker_id,
+                "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                "started_at": now,
+                "updated_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("run_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def extend_lease(db, job: dict, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+    now = datetime.utcnow()
+    result = await db.jobs.update_one(
+        {"_id": job["_id"], "status": STATUS_RUNNING,
+            "worker_id": job["worker_id"]},
+        {"$set": {"lease_expires_at": now + timedelta(seconds=lease_seconds), "updated_at": now}}
+    )
+    return result.modified_count == 1
+
+
+async def complete_job(db, job: dict, result: Optional[dict] = None):
+    now = datetime.utcnow()
+    await db.jobs.update_one(
+        {"_id": job["_id"], "worker_id": job["worker_id"]},
+        {"$set": {
+            "status": STATUS_DONE,
+            "result": result,
+            "lease_expires_at": None,
+            "finished_at": now,
+            "updated_at": now
+        }}
+    )
+
+
+async def fail_job(db, job: dict, error: str) -> str:
+    """
+    Requeues the job with exponential backoff, or dead-letters it once it has
+    used up its attempts. Returns the new status.
+    """
+    now = datetime.utcnow()
+    if job["attempts"] >= job.get("max_attempts", JOB_MAX_ATTEMPTS):
+        update = {
+            "status": STATUS_DEAD,
+            "last_error": error,
+            "lease_expires_at": None,
+            "finished_at": now,
+            "updated_at": now
+        }
+    else:
+        update = {
+            "status": STATUS_QUEUED,
+            "last_error": error,
+            "run_at": now + timedelta(seconds=backoff_seconds(job["attempts"])),
+            "lease_expires_at": None,
+            "worker_id": None,
+            "updated_at": now
+        }
+
+    await db.jobs.update_one(
+        {"_id": job["_id"], "worker_id": job["worker_id"]},
+        {"$set": update, "$push": {"errors": {"$each": [{"at": now, "error": error}], "$slice": -10}}}
+    )
+    return update["status"]
+
+
+async def retry_dead_job(db, job_id: str) -> str:
+    """
+    Requeues a dead-lettered job with its attempts reset. Returns "requeued",
+    "not_dead" if no dead job has that id, or "already_active" if a newer
+    job with the same dedupe_key is queued or running and will do the work.
+    """
+    now = datetime.utcnow()
+    try:
+        result = await db.jobs.update_one(
+            {"_id": ObjectId(job_id), "status": STATUS_DEAD},
+            {"$set": {"status": STATUS_QUEUED, "attempts": 0, "run_at": now, "updated_at": now}}
+        )
+    except DuplicateKeyError:
+        return "already_active"
+    return "requeued" if result.modified_count == 1 else "not_dead"
@@ -0,0 +1,80 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class ArrayItemScanner:
+    """
+    Scans a JSON object of the form {"key": [{...}, {...}], ...} as it
+    streams in and returns each array element as soon as its closing brace
+    arrives, long before the whole document is complete or even valid.
+
+    Text before the first "{" (such as a ```json fence) and after the
+    object closes is ignored. An element that doesn't parse is returned as
+    None, so the caller can count it as missing.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        self._array_key = None
+        self._item_start = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Optional[Any]]]:
+        self._text += chunk
+        items = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            if self.done:
+                break
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._string_start is not None:
+                        self._last_string = _loads(text[self._string_start:i + 1])
+                        self._string_start = None
+                continue
+
+            depth = len(self._stack)
+            if c == '"':
+                self._in_string = True
+                # Only strings directly in the top-level object can be keys worth keeping.
+                if depth == 1:
+                    self._string_start = i
+            elif c == ":" and depth == 1:
+                self._key = self._last_string
+            elif c in "{[":
+                if depth == 0 and c != "{":
+                    continue
+                if depth == 1 and c == "[":
+                    self._array_key = self._key
+                elif depth == 2 and c == "{" and self._stack[-1] == "[":
+                    self._item_start = i
+                self._stack.append(c)
+            elif c in "}]" and depth:
+                self._stack.pop()
+                if depth == 3 and c == "}" and self._item_start is not None:
+                    items.append((self._array_key, _loads(text[self._item_start:i + 1])))
+                    self._item_start = None
+                elif depth == 1:
+                    self.done = True
+        self._pos = len(text)
+        return items
+
+
+def _loads(text: str) -> Optional[Any]:
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
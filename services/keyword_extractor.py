@@ -0,0 +1,49 @@
+import math
+import re
+from collections import Counter
+from typing import List
+
+TOKEN_RE = re.compile(r"[a-zA-Z][a-zA-Z\-]{2,}")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each either else etc even ever every few for
+from further had has have having he her here hers herself him himself his how however i if in into is it
+its itself just least less like made make many may me might more most much must my myself neither no nor
+not now of off often on once one only or other others our ours ourselves out over own per rather same
+shall she should since so some such than that the their theirs them themselves then there these they
+this those through thus to too two under until up upon us use used using very via was we well were what
+when where whether which while who whom whose why will with within without would yet you your yours
+yourself yourselves figure fig table chapter page section example examples shown show shows given called
+also therefore hence let see new first second third
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in (m.group(0).lower().strip("-") for m in TOKEN_RE.finditer(text))
+            if len(t) > 2 and t not in STOPWORDS]
+
+
+def extract_keywords(pages: List[str], top_n: int = 8) -> List[str]:
+    """
+    Ranks terms by TF-IDF, treating each page as a document, so terms that are
+    frequent in the book but concentrated on topical pages rank highest.
+    """
+    page_counts = [Counter(tokenize(page)) for page in pages]
+    page_counts = [counts for counts in page_counts if counts]
+    if not page_counts:
+        return []
+
+    n_pages = len(page_counts)
+    doc_freq = Counter()
+    for counts in page_counts:
+        doc_freq.update(counts.keys())
+
+    scores = Counter()
+    for counts in page_counts:
+        total = sum(counts.values())
+        for term, count in counts.items():
+            idf = math.log((1 + n_pages) / (1 + doc_freq[term])) + 1
+            scores[term] += (count / total) * idf
+
+    return [term for term, _ in scores.most_common(top_n)]
@@ -0,0 +1,95 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, generate_latest
+from pymongo import monitoring
+from services.request_timing import record_span
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HTTP_REQUESTS = Counter(
+    "revisely_http_requests_total", "HTTP requests handled", ["method", "route", "status"])
+HTTP_REQUEST_LATENCY = Histogram(
+    "revisely_http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=LATENCY_BUCKETS)
+
+STAGE_LATENCY = Histogram(
+    "revisely_stage_duration_seconds", "Latency of a processing stage (pdf_extract, embed, vector_query, gemini, ...)", ["stage"], buckets=LATENCY_BUCKETS)
+MONGO_COMMAND_LATENCY = Histogram(
+    "revisely_mongo_command_duration_seconds", "MongoDB command latency", ["command", "outcome"], buckets=LATENCY_BUCKETS)
+
+LLM_INFLIGHT = Gauge(
+    "revisely_llm_inflight_requests", "Gemini calls currently in flight", multiprocess_mode="livesum")
+LLM_QUEUED = Counter(
+    "revisely_llm_queued_total", "Gemini calls that waited for a free concurrency slot")
+LLM_QUEUE_WAIT = Histogram(
+    "revisely_llm_queue_wait_seconds", "Time spent waiting for a Gemini concurrency slot", buckets=LATENCY_BUCKETS)
+RATE_LIMITED = Counter(
+    "revisely_rate_limited_total", "Requests rejected with 429", ["route", "reason"])
+SINGLE_FLIGHT_CALLS = Counter(
+    "revisely_single_flight_calls_total", "Coalesced operation calls by outcome (executed, shared, reused)", ["operation", "outcome"])
+QUIZ_ITEMS = Counter(
+    "revisely_quiz_items_total", "Generated quiz questions by kind and outcome (valid, repaired, invalid)", ["kind", "outcome"])
+BLOB_CACHE_REQUESTS = Counter(
+    "revisely_blob_cache_requests_total", "PDF content lookups in the node-local blob cache by outcome (hit, miss)", ["outcome"])
+JOB_QUEUE_DEPTH = Gauge(
+    "revisely_job_queue_depth", "Jobs in the jobs collection by status", ["status"], multiprocess_mode="max")
+
+
+def render_metrics() -> bytes:
+    """
+    Renders this process's metrics, or those of every worker when running
+    under gunicorn with PROMETHEUS_MULTIPROC_DIR set.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """
+    Times the block into STAGE_LATENCY and, inside a request, into its
+    Server-Timing spans.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_LATENCY.labels(stage).observe(elapsed)
+        record_span(stage, elapsed)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Feeds every MongoDB command's duration into MONGO_COMMAND_LATENCY. Pass an
+    instance to the client via `event_listeners`.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name, "success").observe(
+            event.duration_micros / 1e6)
+        record_span("mongo", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name, "failure").observe(
+            event.duration_micros / 1e6)
+        record_span("mongo", event.duration_micros / 1e6)
+
+
+async def update_job_queue_depth(db):
+    counts = {status: 0 for status in ("queued", "running", "dead")}
+    async for row in db.jobs.aggregate([
+        {"$match": {"status": {"$in": list(counts)}}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]):
+        counts[row["_id"]] = row["count"]
+    for status, count in counts.items():
+        JOB_QUEUE_DEPTH.labels(status).set(count)
@@ -0,0 +1,69 @@
+import base64
+import orjson
+from datetime import datetime
+from typing import List, Optional, Tuple
+from bson.objectid import ObjectId
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+async def ensure_list_indexes(db):
+    # One index per keyset-paginated listing, matching its filter and sort.
+    await db.pdfs.create_index([("user_id", 1), ("_id", -1)])
+    await db.revise_chat_sessions.create_index([("user_id", 1), ("updated_at", -1), ("_id", -1)])
+    await db.quiz_attempts.create_index([("user_id", 1), ("_id", -1)])
+
+
+def encode_cursor(doc: dict, sort_field: Optional[str] = None) -> str:
+    value = doc[sort_field].isoformat() if sort_field else None
+    payload = orjson.dumps({"id": str(doc["_id"]), "v": value})
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: Optional[str] = None) -> Tuple[ObjectId, Optional[datetime]]:
+    """
+    Raises ValueError for cursors that weren't produced by encode_cursor.
+    """
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        last_id = ObjectId(payload["id"])
+        value = datetime.fromisoformat(payload["v"]) if sort_field else None
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    return last_id, value
+
+
+def keyset_filter(query: dict, cursor: Optional[str], sort_field: Optional[str] = None) -> dict:
+    """
+    Adds the "strictly after the cursor" condition for a descending sort on
+    (sort_field, _id), or on _id alone.
+    """
+    if not cursor:
+        return query
+    last_id, value = decode_cursor(cursor, sort_field)
+    if sort_field is None:
+        return {**query, "_id": {"$lt": last_id}}
+    return {**query, "$or": [
+        {sort_field: {"$lt": value}},
+        {sort_field: value, "_id": {"$lt": last_id}},
+    ]}
+
+
+def keyset_sort(sort_field: Optional[str] = None) -> List[tuple]:
+    if sort_field is None:
+        return [("_id", -1)]
+    return [(sort_field, -1), ("_id", -1)]
+
+
+async def fetch_page(collection, query: dict, projection: dict, limit: int, cursor: Optional[str] = None, sort_field: Optional[str] = None):
+    """
+    Returns (docs, next_cursor). Fetches one extra document to know whether
+    another page exists; next_cursor is None on the last page.
+    """
+    docs = await collection.find(keyset_filter(query, cursor, sort_field), projection) \
+        .sort(keyset_sort(sort_field)).limit(limit + 1).to_list(length=limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1], sort_field)
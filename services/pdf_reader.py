@@ -1,15 +1,41 @@
 import fitz
 import io
+import mmap
+import logging
+from typing import List, Union
+from services.metrics import observe_stage
 
+logger = logging.getLogger(__name__)
 
-def extract_text(pdf_content: bytes) -> str:
+
+def extract_text(pdf_content: Union[bytes, mmap.mmap, str]) -> str:
+    return "".join(extract_pages(pdf_content))
+
+
+def extract_pages(pdf_content: Union[bytes, mmap.mmap, str]) -> List[str]:
+    """
+    Returns the text of each page. `pdf_content` is the PDF's bytes, an mmap
+    of it (read in place, without a copy) or a path to it.
+    """
+    view = memoryview(pdf_content) if isinstance(pdf_content, mmap.mmap) else None
     try:
-        doc = fitz.open(stream=pdf_content, filetype="pdf")
-        text = ""
-        for page_num in range(doc.page_count):
-            page = doc.load_page(page_num)
-            text += page.get_text()
-        return text
+        with observe_stage("pdf_extract"):
+            if isinstance(pdf_content, str):
+                doc = fitz.open(pdf_content, filetype="pdf")
+            else:
+                doc = fitz.open(stream=view if view is not None else pdf_content, filetype="pdf")
+            try:
+                pages = []
+                for page_num in range(doc.page_count):
+                    page = doc.load_page(page_num)
+                    pages.append(page.get_text())
+                return pages
+            finally:
+                doc.close()
     except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
+        logger.error("Error extracting text from PDF: %s", e)
         raise
+    finally:
+        if view is not None:
+            # The mmap can't be closed while a view of it is alive.
+            view.release()
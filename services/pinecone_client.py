@@ -1,51 +1,86 @@
 import os
-from pinecone import Pinecone, ServerlessSpec
+import logging
+import threading
 from dotenv import load_dotenv
+from services.readiness import warming
 
 load_dotenv()
 
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT")
+logger = logging.getLogger(__name__)
 
-if not PINECONE_API_KEY or not PINECONE_ENVIRONMENT:
-    raise ValueError(
-        "PINECONE_API_KEY and PINECONE_ENVIRONMENT must be set in the .env file")
+REVISELY_INDEX_NAME = "revisely-documents"
 
-pinecone_client = Pinecone(api_key=PINECONE_API_KEY,
-                           environment=PINECONE_ENVIRONMENT)
+_pinecone_client = None
+_indexes = {}
+_lock = threading.Lock()
 
-REVISELY_INDEX_NAME = "revisely-documents"
+
+def pinecone_configured() -> bool:
+    return bool(os.getenv("PINECONE_API_KEY") and os.getenv("PINECONE_ENVIRONMENT"))
+
+
+def get_pinecone_client():
+    """
+    Returns the shared Pinecone client, creating it on first use. Missing
+    credentials only fail the calls that need Pinecone, not the import.
+    """
+    global _pinecone_client
+    if _pinecone_client is None:
+        with _lock:
+            if _pinecone_client is None:
+                api_key = os.getenv("PINECONE_API_KEY")
+                environment = os.getenv("PINECONE_ENVIRONMENT")
+                if not pinecone_configured():
+                    raise ValueError(
+                        "PINECONE_API_KEY and PINECONE_ENVIRONMENT must be set in the .env file")
+                from pinecone import Pinecone
+                with warming("pinecone"):
+                    _pinecone_client = Pinecone(
+                        api_key=api_key, environment=environment)
+    return _pinecone_client
+
+
+def reset_pinecone_client():
+    """
+    Drops the cached client and index handles, e.g. after a fork, so the
+    next call opens fresh connections in this process.
+    """
+    global _pinecone_client
+    with _lock:
+        _pinecone_client = None
+        _indexes.clear()
 
 
-def get_pinecone_index(dimension: int, metric: str = 'cosine'):
+def get_pinecone_index(dimension: int, metric: str = 'cosine', name: str = REVISELY_INDEX_NAME):
     """
     Initializes and returns a Pinecone index. Creates the index if it doesn't exist.
+    The handle is cached, so the index listing only happens once per process.
     """
+    index = _indexes.get(name)
+    if index is not None:
+        return index
+
+    from pinecone import ServerlessSpec
+    pinecone_client = get_pinecone_client()
     existing_indexes = pinecone_client.list_indexes()
     index_exists = False
     for index_info in existing_indexes:
-        if index_info['name'] == REVISELY_INDEX_NAME:
+        if index_info['name'] == name:
             index_exists = True
             break
 
     if not index_exists:
 
         pinecone_client.create_index(
-            name=REVISELY_INDEX_NAME,
+            name=name,
             dimension=dimension,
             metric=metric,
             spec=ServerlessSpec(cloud='aws', region='us-east-1')
         )
 
     else:
-        print(
-            f"Pinecone index '{REVISELY_INDEX_NAME}' already exists. Connecting to existing index.")
-    return pinecone_client.Index(REVISELY_INDEX_NAME)
-
-# Example usage (can be removed or commented out after initial setup)
-# if __name__ == "__main__":
-#     # Assuming you have an embedding model that outputs 768 dimensions
-#     # You'll need to replace this with your actual embedding dimension
-#     example_dimension = 768
-#     example_index = get_pinecone_index("revisely-test-index", example_dimension)
-#     print(f"Successfully connected to Pinecone index: {example_index.name}")
+        logger.debug(
+            "Pinecone index '%s' already exists. Connecting to existing index.", name)
+    index = pinecone_client.Index(name)
+    _indexes[name] = index
+    return index
@@ -0,0 +1,53 @@
+import gc
+import os
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+RAG_ENABLED = os.getenv("RAG_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def preload_shared_state():
+    """
+    Loads read-only state in the pre-fork parent so workers share it
+    copy-on-write: the embedding model and the Firebase credentials. Nothing
+    that holds sockets or threads (Mongo, Pinecone, Gemini gRPC, httpx) may
+    be created here; those are opened per worker after the fork.
+    """
+    from routers.auth import get_firebase_auth
+    from services.rag_engine import get_embeddings
+
+    if RAG_ENABLED:
+        try:
+            get_embeddings()
+        except Exception as e:
+            logger.warning("Failed to preload embedding model: %s", e)
+    try:
+        get_firebase_auth()
+    except Exception as e:
+        logger.warning("Failed to preload Firebase: %s", e)
+
+    # Move everything allocated so far out of the collector's generations, so
+    # the children's GC passes don't write to (and thereby copy) shared pages.
+    gc.collect()
+    gc.freeze()
+
+
+def reset_after_fork(workers: int = 1):
+    """
+    Called in each worker right after the fork: drops network clients
+    inherited from the parent and sizes the torch thread pool per worker.
+    """
+    from services import pinecone_client, youtube_recommender
+
+    pinecone_client.reset_pinecone_client()
+    youtube_recommender.reset_http_client()
+    random.seed()
+
+    threads = int(os.getenv("TORCH_THREADS_PER_WORKER", "0")) or max(1, (os.cpu_count() or 1) // workers)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
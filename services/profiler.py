@@ -0,0 +1,143 @@
+import os
+import re
+import sys
+import random
+import asyncio
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILING_REFRESH_SECONDS = float(os.getenv("PROFILING_REFRESH_SECONDS", "10"))
+SETTINGS_ID = "profiling"
+
+# This process's copy of the settings the admin API stores in Mongo,
+# refreshed every PROFILING_REFRESH_SECONDS; sampling is off by default.
+profiling_settings = {
+    "sample_rate": 0.0,
+    "interval_ms": 5.0,
+    "max_concurrent": 1,
+}
+
+_active_profiles = 0
+_active_lock = threading.Lock()
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread from a background thread and writes the
+    result in collapsed-stack format ("frame;frame;frame count" per line),
+    which flamegraph.pl, speedscope and inferno read directly.
+
+    For async endpoints the sampled thread is the event loop, so samples taken
+    while other requests' coroutines run are attributed to this profile too.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, name: str) -> Optional[str]:
+        if not self.samples:
+            return None
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_")
+        path = os.path.join(
+            PROFILE_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{safe_name}.folded")
+        with open(path, "w") as f:
+            for stack, count in self.samples.items():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def maybe_start_profiler() -> Optional[SamplingProfiler]:
+    """
+    Starts a profiler on the calling thread for a `sample_rate` fraction of
+    calls, up to `max_concurrent` at once. Returns None when not sampled.
+    """
+    global _active_profiles
+    if profiling_settings["sample_rate"] <= 0 or random.random() >= profiling_settings["sample_rate"]:
+        return None
+    with _active_lock:
+        if _active_profiles >= profiling_settings["max_concurrent"]:
+            return None
+        _active_profiles += 1
+
+    profiler = SamplingProfiler(
+        threading.get_ident(), profiling_settings["interval_ms"] / 1000)
+    profiler.start()
+    return profiler
+
+
+def finish_profiler(profiler: SamplingProfiler, name: str) -> Optional[str]:
+    global _active_profiles
+    profiler.stop()
+    with _active_lock:
+        _active_profiles -= 1
+    try:
+        return profiler.write(name)
+    except OSError as e:
+        logger.warning("Failed to write profile %s: %s", name, e)
+        return None
+
+
+async def refresh_profiling_settings(db):
+    doc = await db.settings.find_one({"_id": SETTINGS_ID})
+    if doc:
+        profiling_settings.update({key: doc[key] for key in profiling_settings if key in doc})
+
+
+async def save_profiling_settings(db, settings: dict):
+    """
+    Stores the settings for every process and applies them to this one at
+    once; the others pick them up on their next refresh.
+    """
+    await db.settings.update_one({"_id": SETTINGS_ID}, {"$set": settings}, upsert=True)
+    profiling_settings.update(settings)
+
+
+async def keep_profiling_settings_fresh(db, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await refresh_profiling_settings(db)
+        except Exception as e:
+            logger.warning("Failed to refresh profiling settings: %s", e)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=PROFILING_REFRESH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def list_profiles(limit: int = 50):
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = sorted(os.listdir(PROFILE_DIR), reverse=True)[:limit]
+    return [{"name": n, "size": os.path.getsize(os.path.join(PROFILE_DIR, n))} for n in names]
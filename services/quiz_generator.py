@@ -1,27 +1,118 @@
-import json
-from services.gemini_client import get_gemini_response
-from typing import Any, Optional
-from services.rag_engine import retrieve_top_k_if_exists
+import os
+import logging
+from pydantic import ValidationError
+from typing import AsyncIterator, Dict, Optional, Tuple
+from schemas import MCQ, SAQ, LAQ
+from services.gemini_client import stream_gemini_response
+from services.json_stream import ArrayItemScanner
+from services.metrics import QUIZ_ITEMS
 
+logger = logging.getLogger(__name__)
 
-async def generate_quiz_from_text(text: str, mcq: int = 5, saq: int = 3, laq: int = 1, context: Optional[str] = None) -> Any:
+QUIZ_MAX_TOKENS = 8192
+# Follow-up calls that regenerate only the items a reply was missing or got wrong.
+QUIZ_REPAIR_ROUNDS = int(os.getenv("QUIZ_REPAIR_ROUNDS", "1"))
+QUIZ_TEXT_CHARS = 3000
 
-    truncated = text[:3000] if text else ""
+QUIZ_SCHEMAS = {"mcqs": MCQ, "saqs": SAQ, "laqs": LAQ}
+
+_FORMAT = (
+    "Output strictly as JSON with keys: mcqs, saqs, laqs. "
+    "Each mcq: question, options (4 strings), answer_index (0-3), explanation. "
+    "Each saq: question, answer. Each laq: question, answer_outline (list of strings).\n"
+)
+
+
+class QuizGenerationError(Exception):
+    pass
+
+
+def _quiz_prompt(text: str, counts: Dict[str, int], context: Optional[str]) -> str:
     prompt = "You are an exam generator. From the textbook text below create:\n"
-    prompt += f"- {mcq} MCQs (each with 4 options). Mark the correct option and give a short 1-2 line explanation.\n"
-    prompt += f"- {saq} short-answer questions with short answers.\n"
-    prompt += f"- {laq} long-answer questions with answer outlines.\n\n"
+    if counts["mcqs"]:
+        prompt += f"- {counts['mcqs']} MCQs (each with 4 options). Mark the correct option and give a short 1-2 line explanation.\n"
+    if counts["saqs"]:
+        prompt += f"- {counts['saqs']} short-answer questions with short answers.\n"
+    if counts["laqs"]:
+        prompt += f"- {counts['laqs']} long-answer questions with answer outlines.\n"
+    prompt += "\n"
     if context:
         prompt += f"Use the following supporting context from the textbook when relevant:\n{context}\n\n"
-    prompt += f"Text:\n{truncated}\n\nOutput strictly as JSON with keys: mcqs, saqs, laqs. Each mcq: question, options[], answer_index, explanation.\n"
-    raw = await get_gemini_response(prompt, max_tokens=8192)
+    prompt += f"Text:\n{text}\n\n{_FORMAT}"
+    return prompt
+
+
+def _repair_prompt(text: str, missing: Dict[str, int], quiz: Dict[str, list], context: Optional[str]) -> str:
+    prompt = _quiz_prompt(text, missing, context)
+    asked = [q["question"] for items in quiz.values() for q in items]
+    if asked:
+        prompt += "Do not repeat any of these questions:\n" + "\n".join(f"- {q}" for q in asked) + "\n"
+    return prompt
 
+
+def _validate(kind: str, item) -> Optional[dict]:
+    if item is None:
+        return None
     try:
+        return QUIZ_SCHEMAS[kind].model_validate(item).model_dump()
+    except ValidationError as e:
+        logger.debug("Dropping invalid %s item: %s", kind, e)
+        return None
+
+
+async def stream_quiz_items(text: str, mcq: int = 5, saq: int = 3, laq: int = 1,
+                            context: Optional[str] = None) -> AsyncIterator[Tuple[str, int, dict]]:
+    """
+    Yields (kind, index, question) for each question as soon as the model
+    finishes writing it, validated against its schema. Items that are
+    missing, malformed or invalid are regenerated in up to
+    QUIZ_REPAIR_ROUNDS follow-up calls that ask for just those; the
+    questions already yielded are kept.
+    """
+    wanted = {"mcqs": mcq, "saqs": saq, "laqs": laq}
+    quiz = {kind: [] for kind in QUIZ_SCHEMAS}
+    truncated = text[:QUIZ_TEXT_CHARS] if text else ""
+    prompt = _quiz_prompt(truncated, wanted, context)
+
+    for attempt in range(1 + QUIZ_REPAIR_ROUNDS):
+        scanner = ArrayItemScanner()
+        try:
+            async for chunk in stream_gemini_response(prompt, max_tokens=QUIZ_MAX_TOKENS):
+                for kind, item in scanner.feed(chunk):
+                    if kind not in QUIZ_SCHEMAS or len(quiz[kind]) >= wanted[kind]:
+                        continue
+                    question = _validate(kind, item)
+                    if question is None:
+                        QUIZ_ITEMS.labels(kind, "invalid").inc()
+                        continue
+                    QUIZ_ITEMS.labels(kind, "repaired" if attempt else "valid").inc()
+                    quiz[kind].append(question)
+                    yield kind, len(quiz[kind]) - 1, question
+        except Exception as e:
+            if not any(quiz.values()):
+                raise
+            # Keep the questions already delivered rather than failing the whole quiz.
+            logger.warning("Quiz generation stopped early: %s", e)
+            return
+
+        missing = {kind: max(wanted[kind] - len(quiz[kind]), 0) for kind in QUIZ_SCHEMAS}
+        if not any(missing.values()):
+            return
+        if attempt < QUIZ_REPAIR_ROUNDS:
+            logger.info("Quiz reply was missing %s; regenerating them", missing)
+            prompt = _repair_prompt(truncated, missing, quiz, context)
+
+    logger.warning("Quiz still missing %s after %s repair rounds", missing, QUIZ_REPAIR_ROUNDS)
 
-        if raw.startswith("```json"):
-            raw = raw[7:-4]
-        parsed = json.loads(raw)
-        return parsed
-    except Exception:
 
-        return {"raw": raw}
+async def generate_quiz_from_text(text: str, mcq: int = 5, saq: int = 3, laq: int = 1, context: Optional[str] = None) -> dict:
+    """
+    Returns {"mcqs": [...], "saqs": [...], "laqs": [...]}, every question
+    schema-valid. Raises QuizGenerationError if none could be generated.
+    """
+    quiz = {kind: [] for kind in QUIZ_SCHEMAS}
+    async for kind, _, question in stream_quiz_items(text, mcq=mcq, saq=saq, laq=laq, context=context):
+        quiz[kind].append(question)
+    if not any(quiz.values()):
+        raise QuizGenerationError("The model returned no usable questions")
+    return quiz
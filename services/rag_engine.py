@@ -1,83 +1,235 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_pinecone import Pinecone
-import requests
+import mmap
+import time
+import logging
+import asyncio
+import heapq
+import threading
 import shutil
-from bson.objectid import ObjectId
-import motor.motor_asyncio
-from pymongo import MongoClient
+from typing import Callable, Dict, List, Optional, Union
 from services.gemini_client import get_gemini_response
-from services.pinecone_client import get_pinecone_index, REVISELY_INDEX_NAME
+from services.pinecone_client import get_pinecone_index
+from services.metrics import observe_stage
+from services.readiness import warming
+from services.context_builder import build_context_blocks, page_label
+from services.single_flight import SingleFlight
+from services.blob_cache import open_pdf
+from services.index_versions import DEFAULT_INDEX_CONFIG, active_config
+from services.index_status import STAGE_PROGRESS, STAGE_EXTRACTING, STAGE_SPLITTING, STAGE_EMBEDDING, STAGE_UPSERTING
 
+logger = logging.getLogger(__name__)
 
-async def build_vectorstore_for_pdf(pdf_id: str, file_id: str, db):
-    print(
-        f"Starting to build vector store for PDF {pdf_id} with file_id {file_id}")
-    temp_dir = f"temp_pdfs/{pdf_id}"
-    os.makedirs(temp_dir, exist_ok=True)
-    pdf_path = os.path.join(temp_dir, f"{pdf_id}.pdf")
+# Defaults of index version 0; the live settings come from services.index_versions.
+EMBEDDING_MODEL_NAME = DEFAULT_INDEX_CONFIG["model"]
+EMBEDDING_DIMENSION = DEFAULT_INDEX_CONFIG["dimension"]
+UPSERT_BATCH_SIZE = 100
+EMBED_BATCH_SIZE = 64
+# Concurrent namespace queries per multi-document retrieval.
+RETRIEVAL_FANOUT = int(os.getenv("RETRIEVAL_FANOUT", "8"))
 
-    try:
+_embeddings = None
+# Models other than the default, loaded while re-indexing to or serving another index version.
+_other_embeddings = {}
+_embeddings_lock = threading.Lock()
+# How long a finished answer is reused for identical questions; 0 turns reuse off.
+ANSWER_FLIGHT_GRACE_SECONDS = float(os.getenv("ANSWER_FLIGHT_GRACE_SECONDS", "5"))
+answer_flight = SingleFlight("answer_with_context", grace_seconds=ANSWER_FLIGHT_GRACE_SECONDS)
+
+
+def get_embeddings(model_name: Optional[str] = None):
+    """
+    Returns the process-wide embedding model (EMBEDDING_MODEL_NAME unless
+    another is named), loading it on first use. langchain and
+    sentence-transformers are only imported here.
+    """
+    global _embeddings
+    if model_name and model_name != EMBEDDING_MODEL_NAME:
+        if model_name not in _other_embeddings:
+            with _embeddings_lock:
+                if model_name not in _other_embeddings:
+                    from langchain_community.embeddings import HuggingFaceEmbeddings
+                    _other_embeddings[model_name] = HuggingFaceEmbeddings(model_name=model_name)
+        return _other_embeddings[model_name]
+
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                with warming("embeddings"):
+                    from langchain_community.embeddings import HuggingFaceEmbeddings
+                    _embeddings = HuggingFaceEmbeddings(
+                        model_name=EMBEDDING_MODEL_NAME)
+    return _embeddings
 
-        pdf_content_doc = await db.pdfs_content.find_one({"_id": ObjectId(file_id)})
-        if not pdf_content_doc:
-            raise FileNotFoundError(
-                f"PDF content not found for file_id: {file_id}")
 
-        pdf_content = pdf_content_doc["content"]
+def get_vector_index(config: dict):
+    return get_pinecone_index(config["dimension"], name=config["index_name"])
 
-        with open(pdf_path, "wb") as f:
-            f.write(pdf_content)
 
+def split_pdf_content(pdf_id: str, pdf_content: Union[bytes, mmap.mmap, str], report: Optional[Callable[[str], None]] = None, config: Optional[dict] = None):
+    """
+    Extracts a PDF's pages and splits them into chunks with the chunking
+    settings of `config` (default: the active index). `pdf_content` is the
+    PDF's bytes, an mmap of it, or a path to it. Returns (page count, chunks, timings).
+    `report` is called with each stage.
+    """
+    config = config or active_config()
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    temp_dir = f"temp_pdfs/{pdf_id}"
+    os.makedirs(temp_dir, exist_ok=True)
+    pdf_path = os.path.join(temp_dir, f"{pdf_id}.pdf")
+    timings = {}
+    try:
+        if report:
+            report(STAGE_EXTRACTING)
+        started = time.perf_counter()
+        if isinstance(pdf_content, str):
+            # Link the cached file so an eviction mid-parse can't pull it away.
+            # Raises FileNotFoundError if it was evicted before we got here.
+            try:
+                os.link(pdf_content, pdf_path)
+            except FileNotFoundError:
+                raise
+            except OSError:
+                # Cache and temp dir on different filesystems.
+                shutil.copyfile(pdf_content, pdf_path)
+        else:
+            with open(pdf_path, "wb") as f:
+                f.write(pdf_content)
         loader = PyPDFLoader(pdf_path)
         documents = loader.load()
+        timings["extract"] = time.perf_counter() - started
+
+        if report:
+            report(STAGE_SPLITTING)
+        started = time.perf_counter()
         text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=200)
+            chunk_size=config["chunk_size"], chunk_overlap=config["chunk_overlap"], add_start_index=True)
         texts = text_splitter.split_documents(documents)
+        timings["split"] = time.perf_counter() - started
+        return len(documents), texts, timings
+    finally:
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
 
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2")
 
-        dimension = 384
-        pinecone_index = get_pinecone_index(dimension)
+def upsert_chunks(pdf_id: str, texts, vectors, config: Optional[dict] = None):
+    pinecone_index = get_vector_index(config or active_config())
+    upsert_data = []
+    for i, text in enumerate(texts):
+        upsert_data.append({
+            "id": f"{pdf_id}-{i}",  # Unique ID for each vector
+            "values": vectors[i],
+            "metadata": {"page_content": text.page_content, **text.metadata}
+        })
+    for i in range(0, len(upsert_data), UPSERT_BATCH_SIZE):
+        pinecone_index.upsert(
+            vectors=upsert_data[i:i + UPSERT_BATCH_SIZE], namespace=str(pdf_id))
 
-        # Generate embeddings for the texts
-        vectors = embeddings.embed_documents([t.page_content for t in texts])
 
-        # Prepare data for upsert
-        upsert_data = []
-        for i, text in enumerate(texts):
-            upsert_data.append({
-                "id": f"{pdf_id}-{i}",  # Unique ID for each vector
-                "values": vectors[i],
-                "metadata": {"page_content": text.page_content, **text.metadata}
-            })
+def index_pdf_content(pdf_id: str, pdf_content: Union[bytes, mmap.mmap, str], on_stage: Optional[Callable[[str, int], None]] = None, config: Optional[dict] = None) -> dict:
+    """
+    Extracts, splits, embeds and upserts a PDF into its Pinecone namespace
+    of the index described by `config` (default: the active one).
+    Synchronous so it can run inside a worker process pool; `on_stage` is
+    called with (stage, progress percentage) as indexing advances.
+    """
+    config = config or active_config()
+    def report(stage: str, progress: Optional[int] = None):
+        if on_stage:
+            on_stage(stage, STAGE_PROGRESS[stage] if progress is None else progress)
 
-    except Exception as e:
+    pages, texts, timings = split_pdf_content(pdf_id, pdf_content, report, config)
 
-        raise
-    finally:
+    report(STAGE_EMBEDDING)
+    started = time.perf_counter()
+    embed_start = STAGE_PROGRESS[STAGE_EMBEDDING]
+    embed_span = STAGE_PROGRESS[STAGE_UPSERTING] - embed_start
+    vectors = []
+    for i in range(0, len(texts), EMBED_BATCH_SIZE):
+        vectors.extend(get_embeddings(config["model"]).embed_documents(
+            [t.page_content for t in texts[i:i + EMBED_BATCH_SIZE]]))
+        report(STAGE_EMBEDDING, embed_start + embed_span * len(vectors) // len(texts))
+    timings["embed"] = time.perf_counter() - started
 
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+    report(STAGE_UPSERTING)
+    started = time.perf_counter()
+    upsert_chunks(pdf_id, texts, vectors, config)
+    timings["upsert"] = time.perf_counter() - started
 
+    return {"pages": pages, "chunks": len(texts), "timings": timings}
 
-def retrieve_top_k_if_exists(pdf_id: str, query: str, k: int = 3):
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2")
 
-    try:
+def index_pdf_batch(items: List[tuple], on_stage: Optional[Callable[[str, str, int], None]] = None, config: Optional[dict] = None) -> Dict[str, dict]:
+    """
+    Indexes several PDFs, given as (pdf_id, content) pairs, with embedding
+    batches that span documents so small files still fill EMBED_BATCH_SIZE.
+    Returns {pdf_id: result} where a result is index_pdf_content's, or
+    {"error": ...} for a file that couldn't be extracted or upserted.
+    `on_stage` is called with (pdf_id, stage, progress percentage).
+    """
+    def report(pdf_id: str, stage: str, progress: Optional[int] = None):
+        if on_stage:
+            on_stage(pdf_id, stage, STAGE_PROGRESS[stage] if progress is None else progress)
+
+    config = config or active_config()
+    results = {}
+    split = []
+    for pdf_id, pdf_content in items:
+        try:
+            pages, texts, timings = split_pdf_content(
+                pdf_id, pdf_content, lambda stage: report(pdf_id, stage), config)
+        except Exception as e:
+            results[pdf_id] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        split.append((pdf_id, texts))
+        results[pdf_id] = {"pages": pages, "chunks": len(texts), "timings": timings}
+        report(pdf_id, STAGE_EMBEDDING)
+
+    # Embed every chunk of the batch in one stream, then hand each PDF its slice.
+    started = time.perf_counter()
+    all_texts = [t.page_content for _, texts in split for t in texts]
+    vectors = []
+    for i in range(0, len(all_texts), EMBED_BATCH_SIZE):
+        vectors.extend(get_embeddings(config["model"]).embed_documents(all_texts[i:i + EMBED_BATCH_SIZE]))
+    embed_seconds = time.perf_counter() - started
 
-        # Get the Pinecone index object
-        # Dimension must match embedding model
-        pinecone_index = get_pinecone_index(dimension=384)
+    offset = 0
+    for pdf_id, texts in split:
+        pdf_vectors = vectors[offset:offset + len(texts)]
+        offset += len(texts)
+        timings = results[pdf_id]["timings"]
+        # Shared embedding time is attributed to each PDF by its share of the chunks.
+        timings["embed"] = embed_seconds * len(texts) / max(len(all_texts), 1)
+        report(pdf_id, STAGE_UPSERTING)
+        started = time.perf_counter()
+        try:
+            upsert_chunks(pdf_id, texts, pdf_vectors, config)
+        except Exception as e:
+            results[pdf_id] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        timings["upsert"] = time.perf_counter() - started
+    return results
 
-        # Generate embedding for the query
-        query_embedding = embeddings.embed_query(query)
 
-        # Perform a raw query on the Pinecone index
+async def build_vectorstore_for_pdf(pdf_id: str, file_id: str, db):
+    async with open_pdf(db, file_id) as pdf_content:
+        if pdf_content is None:
+            raise FileNotFoundError(
+                f"PDF content not found for file_id: {file_id}")
+
+        return await asyncio.to_thread(index_pdf_content, pdf_id, pdf_content)
+
+
+def embed_query(query: str, config: Optional[dict] = None):
+    with observe_stage("embed"):
+        return get_embeddings((config or active_config())["model"]).embed_query(query)
+
+
+def query_namespace(pdf_id: str, query_embedding, k: int = 3, config: Optional[dict] = None):
+    pinecone_index = get_vector_index(config or active_config())
+    with observe_stage("vector_query"):
         query_results = pinecone_index.query(
             vector=query_embedding,
             top_k=k,
@@ -85,18 +237,65 @@ def retrieve_top_k_if_exists(pdf_id: str, query: str, k: int = 3):
             include_metadata=True
         )
 
-        docs = []
-        for match in query_results.matches:
-            docs.append(
-                {"page_content": match.metadata['page_content'], "metadata": match.metadata})
+    docs = []
+    for match in query_results.matches:
+        docs.append({"page_content": match.metadata['page_content'], "metadata": match.metadata,
+                     "score": match.score, "pdf_id": str(pdf_id)})
+    return docs
+
+
+def retrieve_top_k_if_exists(pdf_id: str, query: str, k: int = 3):
+    try:
+        # One config for both steps, so a switch between them can't mix models.
+        config = active_config()
+        return query_namespace(pdf_id, embed_query(query, config), k, config)
+    except Exception as e:
+        logger.warning("Retrieval failed for PDF %s: %s", pdf_id, e)
+        return []
+
 
-        return docs
+async def retrieve_top_k_across(pdf_ids: List[str], query: str, k: int = 4):
+    """
+    Embeds the query once, queries every PDF's namespace concurrently (at
+    most RETRIEVAL_FANOUT at a time) and returns the global top k by score.
+    A namespace that fails to answer is skipped rather than failing the rest.
+    """
+    config = active_config()
+    try:
+        query_embedding = await asyncio.to_thread(embed_query, query, config)
     except Exception as e:
+        logger.warning("Query embedding failed: %s", e)
         return []
 
+    semaphore = asyncio.Semaphore(RETRIEVAL_FANOUT)
+
+    async def query_one(pdf_id: str):
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(query_namespace, pdf_id, query_embedding, k, config)
+            except Exception as e:
+                logger.warning("Retrieval failed for PDF %s: %s", pdf_id, e)
+                return []
 
-async def answer_with_context(pdf_id: str, question: str, top_k: int = 4):
-    retrieved_docs = retrieve_top_k_if_exists(pdf_id, question, k=top_k)
+    results = await asyncio.gather(*(query_one(pdf_id) for pdf_id in pdf_ids))
+    return heapq.nlargest(k, (doc for docs in results for doc in docs), key=lambda doc: doc["score"])
+
+
+async def answer_with_context(pdf_ids: List[str], question: str, top_k: int = 4, titles: Optional[Dict[str, str]] = None):
+    """
+    Answers from the top_k chunks across all of pdf_ids. When more than one
+    PDF is searched, context blocks and sources name the PDF each came from
+    (its title from `titles`, falling back to the id). Identical questions
+    asked at the same time share one answer.
+    """
+    # Titles label the sources, so calls with different titles can't share an answer.
+    key = (tuple(pdf_ids), question.strip(), top_k, tuple(sorted((titles or {}).items())))
+    return await answer_flight.do(key, lambda: _answer_with_context(pdf_ids, question, top_k, titles))
+
+
+async def _answer_with_context(pdf_ids: List[str], question: str, top_k: int, titles: Optional[Dict[str, str]]):
+    retrieved_docs = await retrieve_top_k_across(pdf_ids, question, k=top_k)
+    multi_document = len(pdf_ids) > 1
 
     if not retrieved_docs:
         # If no context is found, ask Gemini for a general answer
@@ -104,7 +303,15 @@ async def answer_with_context(pdf_id: str, question: str, top_k: int = 4):
         general_answer = await get_gemini_response(prompt, max_tokens=1024)
         return {"answer": general_answer, "sources": []}
 
-    context_text = "\n\n".join([doc["page_content"] for doc in retrieved_docs])
+    def label(block: dict) -> str:
+        if not multi_document:
+            return page_label(block)
+        title = (titles or {}).get(block["pdf_id"], block["pdf_id"])
+        return f"{title}, {page_label(block)}"
+
+    blocks = build_context_blocks(retrieved_docs, label=label)
+    context_text = "\n\n".join(block["tagged"] for block in blocks)
+    citation_example = "(Biology Notes, p. 23)" if multi_document else "(p. 23)"
 
     # If context is found, use a more flexible prompt
     prompt = f"""
@@ -117,16 +324,14 @@ async def answer_with_context(pdf_id: str, question: str, top_k: int = 4):
     Question: {question}
     
     Provide a concise answer. If the answer is from the context, cite the source page numbers.
-    Example citation: (p. 23)
+    Example citation: {citation_example}
     """
 
     raw_answer = await get_gemini_response(prompt, max_tokens=1024)
 
     sources = []
-    for doc in retrieved_docs:
-        if "page" in doc["metadata"]:
-            sources.append(
-                f"p. {doc['metadata']['page']}: '{doc['page_content'][:100]}...'"
-            )
+    for block in blocks:
+        if multi_document or block["page"] is not None:
+            sources.append(f"{label(block)}: '{block['text'][:100]}...'")
 
     return {"answer": raw_answer, "sources": sources}
@@ -0,0 +1,115 @@
+import os
+import math
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from fastapi import HTTPException, Request
+from pymongo import ReturnDocument
+from services.metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# "memory" keeps buckets in this process; "mongo" shares them across
+# processes and instances. Memory buckets under several workers would
+# multiply every limit by the worker count, so those default to mongo.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "mongo" if WEB_CONCURRENCY > 1 else "memory")
+# Reverse proxies in front of the app that append to X-Forwarded-For.
+# Without them every caller would share the proxy's address and bucket.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+MEMORY_BUCKETS_MAX = 10000
+
+
+def _parse_rate(value: str):
+    # "N/S": a burst of N requests, refilled at N per S seconds.
+    requests, seconds = value.split("/")
+    return int(requests), int(requests) / float(seconds)
+
+
+RATE_LIMITS = {
+    "quiz_generate": _parse_rate(os.getenv("RATE_LIMIT_QUIZ_GENERATE", "5/60")),
+    "chat_ask": _parse_rate(os.getenv("RATE_LIMIT_CHAT_ASK", "30/60")),
+    "revise_chat_ask": _parse_rate(os.getenv("RATE_LIMIT_REVISE_CHAT_ASK", "30/60")),
+}
+
+_buckets = OrderedDict()
+
+
+async def ensure_rate_limit_indexes(db):
+    if RATE_LIMIT_BACKEND == "mongo":
+        await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+
+
+def client_address(request) -> str:
+    """
+    The caller's address: the X-Forwarded-For entry added by the outermost
+    of TRUSTED_PROXY_HOPS proxies, or the peer address without proxies.
+    Entries further left are client-supplied and ignored.
+    """
+    if TRUSTED_PROXY_HOPS > 0:
+        hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+def _take_memory(key: str, capacity: int, rate: float):
+    now = time.monotonic()
+    tokens, updated = _buckets.pop(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    _buckets[key] = (tokens, now)
+    while len(_buckets) > MEMORY_BUCKETS_MAX:
+        _buckets.popitem(last=False)
+    return allowed, tokens
+
+
+async def _take_mongo(db, key: str, capacity: int, rate: float):
+    """
+    Refills and takes a token in one atomic pipeline update, so concurrent
+    requests on any instance see a consistent bucket.
+    """
+    now = datetime.utcnow()
+    elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+    doc = await db.rate_limits.find_one_and_update(
+        {"_id": key},
+        [
+            {"$set": {"tokens": {"$min": [capacity, {"$add": [
+                {"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed, rate]}]}]}}},
+            {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+            {"$set": {
+                "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                "updated_at": now,
+                "expires_at": now + timedelta(seconds=capacity / rate),
+            }},
+        ],
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc["allowed"], doc["tokens"]
+
+
+async def check_rate_limit(request: Request, route: str, key: str):
+    if not RATE_LIMIT_ENABLED:
+        return
+    capacity, rate = RATE_LIMITS[route]
+    bucket_key = f"{route}:{key}"
+    if RATE_LIMIT_BACKEND == "mongo":
+        try:
+            allowed, tokens = await _take_mongo(request.app.db, bucket_key, capacity, rate)
+        except Exception as e:
+            # Fail open: a rate limiter outage shouldn't take the endpoints down with it.
+            logger.warning("Rate limit check failed for %s: %s", bucket_key, e)
+            return
+    else:
+        allowed, tokens = _take_memory(bucket_key, capacity, rate)
+
+    if not allowed:
+        RATE_LIMITED.labels(route, "rate_limit").inc()
+        retry_after = math.ceil((1 - tokens) / rate)
+        raise HTTPException(status_code=429, detail="Too many requests",
+                            headers={"Retry-After": str(retry_after)})
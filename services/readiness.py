@@ -0,0 +1,42 @@
+import time
+from typing import Dict
+
+# Subsystem name -> seconds it took to warm up. Filled in by the lazy
+# accessors (get_embeddings, get_pinecone_client, ...) the first time they run.
+_warmed: Dict[str, float] = {}
+
+SUBSYSTEMS = ("mongo", "firebase", "gemini", "pinecone", "embeddings")
+
+
+def mark_warm(name: str, seconds: float = 0.0):
+    _warmed.setdefault(name, round(seconds, 4))
+
+
+def mark_cold(name: str):
+    _warmed.pop(name, None)
+
+
+def is_warm(name: str) -> bool:
+    return name in _warmed
+
+
+def snapshot() -> Dict[str, dict]:
+    return {name: {"warm": name in _warmed, "warmup_seconds": _warmed.get(name)} for name in SUBSYSTEMS}
+
+
+class warming:
+    """
+    Context manager that marks `name` warm with the elapsed time on success.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            mark_warm(self.name, time.perf_counter() - self.started)
+        return False
@@ -0,0 +1,45 @@
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+# Spans recorded while handling the current request. The list object is shared
+# by every task and executor thread that inherits the request's context.
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "request_spans", default=None)
+
+
+def start_request_timing():
+    return _request_spans.set([])
+
+
+def end_request_timing(token) -> List[Tuple[str, float]]:
+    spans = _request_spans.get() or []
+    _request_spans.reset(token)
+    return spans
+
+
+def record_span(name: str, seconds: float):
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+def server_timing_header(spans: List[Tuple[str, float]], total: Optional[float] = None) -> str:
+    """
+    Formats spans as a Server-Timing header, summing repeated spans (e.g. many
+    Mongo commands) into one entry with a count.
+    """
+    totals = {}
+    counts = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+        counts[name] = counts.get(name, 0) + 1
+
+    entries = []
+    for name, seconds in totals.items():
+        entry = f"{name};dur={seconds * 1000:.1f}"
+        if counts[name] > 1:
+            entry += f';desc="x{counts[name]}"'
+        entries.append(entry)
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,56 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+from services.metrics import SINGLE_FLIGHT_CALLS
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one execution: the
+    first caller starts the work and later callers await the same task.
+    A successful result is then reused for `grace_seconds`, which absorbs
+    double clicks and client retries; failures are never reused.
+
+    The shared task is shielded, so a caller that disconnects doesn't
+    cancel the work for the others. Results are shared objects and must
+    not be mutated by callers. Coalescing is per process.
+    """
+
+    def __init__(self, operation: str, grace_seconds: float = 0.0, max_results: int = 1024):
+        self.operation = operation
+        self.grace_seconds = grace_seconds
+        self.max_results = max_results
+        self._inflight = {}
+        self._results = OrderedDict()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        cached = self._results.get(key)
+        if cached is not None:
+            expires_at, result = cached
+            if expires_at > time.monotonic():
+                SINGLE_FLIGHT_CALLS.labels(self.operation, "reused").inc()
+                return result
+            del self._results[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            SINGLE_FLIGHT_CALLS.labels(self.operation, "shared").inc()
+        else:
+            SINGLE_FLIGHT_CALLS.labels(self.operation, "executed").inc()
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if self.grace_seconds <= 0 or task.cancelled() or task.exception() is not None:
+            return
+        self._results[key] = (time.monotonic() + self.grace_seconds, task.result())
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    def forget(self, key: Hashable):
+        self._results.pop(key, None)
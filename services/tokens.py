@@ -0,0 +1,10 @@
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text; close enough for budgeting.
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "..."
@@ -1,27 +1,126 @@
 import os
-import requests
-from services.pdf_reader import extract_text
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+import httpx
+from services.pdf_reader import extract_pages
+from services.blob_cache import open_pdf
+from services.cleanup import NOT_DELETED
+from services.single_flight import SingleFlight
+from services.keyword_extractor import extract_keywords
 from bson.objectid import ObjectId
 
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
+# Overridable so tests and benchmarks can point at a local stand-in.
+YOUTUBE_API_URL = os.getenv(
+    "YOUTUBE_API_URL", "https://www.googleapis.com/youtube/v3")
+YOUTUBE_CACHE_TTL_SECONDS = int(os.getenv("YOUTUBE_CACHE_TTL_SECONDS", "86400"))
+YOUTUBE_MEMORY_CACHE_SIZE = 1024
+YOUTUBE_QUERY_KEYWORDS = 8
+
+_http_client = None
+_memory_cache = OrderedDict()
+youtube_flight = SingleFlight("youtube_search")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            base_url=YOUTUBE_API_URL,
+            timeout=10,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        )
+    return _http_client
+
+
+def reset_http_client():
+    # After a fork the inherited client's connections belong to the parent.
+    global _http_client
+    _http_client = None
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def ensure_youtube_cache_indexes(db):
+    await db.youtube_cache.create_index("created_at", expireAfterSeconds=YOUTUBE_CACHE_TTL_SECONDS)
+
+
+def _memory_cache_get(key):
+    entry = _memory_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, videos = entry
+    if expires_at < time.monotonic():
+        del _memory_cache[key]
+        return None
+    _memory_cache.move_to_end(key)
+    return videos
+
+
+def _memory_cache_set(key, videos, ttl: float = YOUTUBE_CACHE_TTL_SECONDS):
+    _memory_cache[key] = (time.monotonic() + ttl, videos)
+    _memory_cache.move_to_end(key)
+    while len(_memory_cache) > YOUTUBE_MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+async def get_search_keywords(pdf_metadata: dict, db) -> list:
+    """
+    Returns the PDF's search keywords, extracting them with TF-IDF on first
+    use and storing them on the PDF so the text is only parsed once.
+    """
+    if pdf_metadata.get("search_keywords"):
+        return pdf_metadata["search_keywords"]
+
+    async with open_pdf(db, pdf_metadata["file_id"]) as pdf_content:
+        if pdf_content is None:
+            raise Exception("PDF content not found")
+
+        pages = await asyncio.to_thread(extract_pages, pdf_content)
+    keywords = await asyncio.to_thread(extract_keywords, pages, YOUTUBE_QUERY_KEYWORDS)
+    await db.pdfs.update_one({"_id": pdf_metadata["_id"]}, {"$set": {"search_keywords": keywords}})
+    return keywords
 
 
 async def search_youtube_videos(pdf_id: str, db, max_results: int = 5):
     if not YOUTUBE_API_KEY:
         return []
 
-    pdf_metadata = await db.pdfs.find_one({"_id": ObjectId(pdf_id)})
+    # Checked before any cache, so a deleted PDF stops getting recommendations at once.
+    pdf_metadata = await db.pdfs.find_one({"_id": ObjectId(pdf_id), **NOT_DELETED}, {"file_id": 1, "title": 1, "search_keywords": 1})
     if not pdf_metadata:
         raise Exception("PDF not found")
 
-    pdf_content_doc = await db.pdfs_content.find_one({"_id": ObjectId(pdf_metadata["file_id"])})
-    if not pdf_content_doc:
-        raise Exception("PDF content not found")
+    cache_key = f"{pdf_id}:{max_results}"
+    videos = _memory_cache_get(cache_key)
+    if videos is not None:
+        return videos
+
+    # Many students opening the same PDF at once trigger one lookup between them.
+    return await youtube_flight.do(cache_key, lambda: _search_youtube_videos(pdf_metadata, db, max_results, cache_key))
+
 
-    text = extract_text(pdf_content_doc["content"])
-    query = " ".join(text.split()[:100])
+async def _search_youtube_videos(pdf_metadata: dict, db, max_results: int, cache_key: str):
+    pdf_id = str(pdf_metadata["_id"])
+    cached = await db.youtube_cache.find_one({"_id": cache_key})
+    if cached:
+        # Mongo's TTL monitor only runs once a minute, so check expiry here too.
+        remaining = YOUTUBE_CACHE_TTL_SECONDS - \
+            (datetime.utcnow() - cached["created_at"]).total_seconds()
+        if remaining > 0:
+            _memory_cache_set(cache_key, cached["videos"], ttl=remaining)
+            return cached["videos"]
+
+    keywords = await get_search_keywords(pdf_metadata, db)
+    query = " ".join(keywords) or pdf_metadata.get("title", "")
 
-    url = "https://www.googleapis.com/youtube/v3/search"
     params = {
         "part": "snippet",
         "q": query,
@@ -29,7 +128,7 @@ async def search_youtube_videos(pdf_id: str, db, max_results: int = 5):
         "maxResults": max_results,
         "key": YOUTUBE_API_KEY
     }
-    r = requests.get(url, params=params, timeout=10)
+    r = await get_http_client().get("/search", params=params)
     r.raise_for_status()
     data = r.json()
     videos = []
@@ -40,4 +139,12 @@ async def search_youtube_videos(pdf_id: str, db, max_results: int = 5):
             "description": item["snippet"]["description"],
             "thumbnail": item["snippet"]["thumbnails"]["default"]["url"]
         })
+
+    _memory_cache_set(cache_key, videos)
+    await db.youtube_cache.replace_one(
+        {"_id": cache_key},
+        {"pdf_id": pdf_id, "max_results": max_results,
+            "videos": videos, "created_at": datetime.utcnow()},
+        upsert=True
+    )
     return videos
@@ -0,0 +1,127 @@
+import os
+import mmap
+import time
+import asyncio
+from types import SimpleNamespace
+import pytest
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from services import blob_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_cache, "BLOB_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(blob_cache, "BLOB_CACHE_MAX_BYTES", 250)
+    return tmp_path
+
+
+def _store_aged(file_id, content, age):
+    path = blob_cache.store(file_id, content)
+    then = time.time() - age
+    os.utime(path, (then, then))
+    return path
+
+
+def test_store_then_open(cache_dir):
+    file_id = str(ObjectId())
+    assert blob_cache.store(file_id, b"%PDF-1") == os.path.join(str(cache_dir), f"{file_id}.pdf")
+    mm = blob_cache.open_cached(file_id)
+    try:
+        assert mm[:] == b"%PDF-1"
+    finally:
+        mm.close()
+
+
+def test_least_recently_used_file_is_evicted(cache_dir):
+    old, recent, new = (str(ObjectId()) for _ in range(3))
+    _store_aged(old, b"a" * 100, age=300)
+    _store_aged(recent, b"b" * 100, age=200)
+    blob_cache.store(new, b"c" * 100)
+
+    assert blob_cache.cached_path(old) is None
+    assert blob_cache.cached_path(recent) and blob_cache.cached_path(new)
+
+
+def test_a_hit_protects_the_file_from_eviction(cache_dir):
+    old, recent, new = (str(ObjectId()) for _ in range(3))
+    _store_aged(old, b"a" * 100, age=300)
+    _store_aged(recent, b"b" * 100, age=200)
+    assert blob_cache.cached_path(old)
+    blob_cache.store(new, b"c" * 100)
+
+    assert blob_cache.cached_path(old)
+    assert blob_cache.cached_path(recent) is None
+
+
+def test_mapping_outlives_eviction(cache_dir):
+    file_id = str(ObjectId())
+    blob_cache.store(file_id, b"x" * 100)
+    mm = blob_cache.open_cached(file_id)
+    blob_cache.evict(file_id)
+    try:
+        assert blob_cache.open_cached(file_id) is None
+        assert mm[:] == b"x" * 100
+    finally:
+        mm.close()
+
+
+def test_files_that_cannot_fit_are_not_stored(cache_dir):
+    assert blob_cache.store(str(ObjectId()), b"x" * 251) is None
+    assert blob_cache.store(str(ObjectId()), b"") is None
+    assert os.listdir(cache_dir) == []
+
+
+def test_stale_temp_files_are_removed(cache_dir):
+    stale = cache_dir / f"{blob_cache.TMP_PREFIX}crashed"
+    fresh = cache_dir / f"{blob_cache.TMP_PREFIX}writing"
+    stale.write_bytes(b"partial")
+    fresh.write_bytes(b"partial")
+    then = time.time() - blob_cache.STALE_TMP_SECONDS - 1
+    os.utime(stale, (then, then))
+    blob_cache.store(str(ObjectId()), b"x")
+
+    assert not stale.exists()
+    assert fresh.exists()
+
+
+def test_cache_disabled(cache_dir, monkeypatch):
+    file_id = str(ObjectId())
+    blob_cache.store(file_id, b"x")
+    monkeypatch.setattr(blob_cache, "BLOB_CACHE_MAX_BYTES", 0)
+    assert blob_cache.cached_path(file_id) is None
+    assert blob_cache.open_cached(file_id) is None
+
+
+def test_file_id_cannot_escape_the_cache_dir(cache_dir):
+    with pytest.raises(InvalidId):
+        blob_cache.cached_path("../../etc/passwd")
+
+
+class PdfsContent:
+    def __init__(self, docs):
+        self.docs = docs
+        self.reads = 0
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        await asyncio.sleep(0.01)
+        return self.docs.get(query["_id"])
+
+
+def test_open_pdf_fetches_a_miss_once_then_maps_the_hit(cache_dir):
+    file_id = str(ObjectId())
+    db = SimpleNamespace(pdfs_content=PdfsContent({ObjectId(file_id): {"content": b"%PDF-1"}}))
+
+    async def read():
+        async with blob_cache.open_pdf(db, file_id) as content:
+            return type(content), bytes(content)
+
+    async def main():
+        misses = await asyncio.gather(read(), read())
+        return misses, await read()
+
+    misses, hit = asyncio.run(main())
+    assert misses == [(bytes, b"%PDF-1")] * 2
+    assert hit == (mmap.mmap, b"%PDF-1")
+    assert db.pdfs_content.reads == 1
@@ -0,0 +1,57 @@
+from services.context_builder import _merge_segments, _overlap, build_context, build_context_blocks
+
+HEAD = "The mitochondria is the powerhouse of the cell. "
+MIDDLE = "It produces ATP through cellular respiration, which "
+TAIL = "happens in several stages across the inner membrane."
+
+
+def _chunk(text, page=1, start_index=None, pdf_id="p1", score=None):
+    metadata = {"page": page}
+    if start_index is not None:
+        metadata["start_index"] = start_index
+    return {"page_content": text, "metadata": metadata, "pdf_id": pdf_id, "score": score}
+
+
+def test_overlap_ignores_short_coincidences():
+    assert _overlap("abc the", "the xyz") == 0
+    assert _overlap(HEAD + MIDDLE, MIDDLE + TAIL) == len(MIDDLE)
+
+
+def test_overlapping_chunks_merge_by_start_index():
+    chunks = [_chunk(MIDDLE + TAIL, start_index=len(HEAD)), _chunk(HEAD + MIDDLE, start_index=0)]
+    assert _merge_segments(chunks) == [HEAD + MIDDLE + TAIL]
+
+
+def test_bridging_chunk_joins_earlier_segments():
+    # Retrieval order without start_index: the bridge arrives last.
+    chunks = [_chunk(HEAD + MIDDLE[:25]), _chunk(MIDDLE[25:] + TAIL), _chunk(MIDDLE)]
+    assert _merge_segments(chunks) == [HEAD + MIDDLE + TAIL]
+
+
+def test_contained_chunk_is_dropped():
+    assert _merge_segments([_chunk(MIDDLE), _chunk(HEAD + MIDDLE + TAIL)]) == [HEAD + MIDDLE + TAIL]
+
+
+def test_unrelated_chunks_stay_separate():
+    assert _merge_segments([_chunk(HEAD), _chunk(TAIL)]) == [HEAD.strip(), TAIL]
+
+
+def test_pages_are_ordered_by_best_score_and_tagged():
+    docs = [_chunk(HEAD, page=2, score=0.5), _chunk(TAIL, page=5, score=0.9), _chunk(MIDDLE, page=2, score=0.7)]
+    blocks = build_context_blocks(docs)
+    assert [(b["page"], b["score"]) for b in blocks] == [(5, 0.9), (2, 0.7)]
+    assert blocks[0]["tagged"].startswith("[p. 5]\n")
+
+
+def test_budget_truncates_the_last_page_or_drops_it():
+    long_text = "word " * 400
+    docs = [_chunk(long_text, page=1, score=0.9), _chunk(long_text, page=2, score=0.8)]
+    blocks = build_context_blocks(docs, token_budget=600)
+    assert [b["page"] for b in blocks] == [1, 2]
+    assert blocks[1]["text"].endswith("...")
+
+    assert [b["page"] for b in build_context_blocks(docs, token_budget=520)] == [1]
+
+
+def test_build_context_without_docs():
+    assert build_context([]) is None
@@ -0,0 +1,42 @@
+import asyncio
+from types import SimpleNamespace
+from bson.objectid import ObjectId
+from services.index_status import IndexStatusBroadcaster, STAGE_EMBEDDING
+
+
+class Pdfs:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        wanted = set(query["_id"]["$in"])
+        return _Cursor([doc for doc in self.docs if doc["_id"] in wanted])
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+
+def test_subscriber_with_uppercase_id_gets_updates():
+    pdf_id = ObjectId()
+    db = SimpleNamespace(pdfs=Pdfs([{"_id": pdf_id, "index_status": {"stage": STAGE_EMBEDDING, "progress": 40}}]))
+
+    async def main():
+        broadcaster = IndexStatusBroadcaster(poll_interval=0.01)
+        queue = broadcaster.subscribe(db, str(pdf_id).upper())
+        try:
+            return await asyncio.wait_for(queue.get(), timeout=1)
+        finally:
+            broadcaster.unsubscribe(str(pdf_id).upper(), queue)
+            assert broadcaster._subscribers == {}
+
+    update = asyncio.run(main())
+    assert (update["pdf_id"], update["stage"], update["progress"]) == (str(pdf_id), STAGE_EMBEDDING, 40)
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+from services import job_queue
+from services.job_queue import STATUS_DEAD, STATUS_QUEUED, backoff_seconds, fail_job, retry_dead_job
+
+
+class RecordingJobs:
+    def __init__(self):
+        self.updates = []
+
+    async def update_one(self, query, update):
+        self.updates.append((query, update))
+
+
+def _fail(job, error="boom"):
+    db = SimpleNamespace(jobs=RecordingJobs())
+    status = asyncio.run(fail_job(db, job, error))
+    return status, db.jobs.updates
+
+
+def test_backoff_doubles_from_the_base(monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_BACKOFF_BASE_SECONDS", 30)
+    monkeypatch.setattr(job_queue, "JOB_BACKOFF_MAX_SECONDS", 3600)
+    assert [backoff_seconds(n) for n in range(5)] == [30, 30, 60, 120, 240]
+
+
+def test_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_BACKOFF_BASE_SECONDS", 30)
+    monkeypatch.setattr(job_queue, "JOB_BACKOFF_MAX_SECONDS", 100)
+    assert backoff_seconds(3) == 100
+    assert backoff_seconds(50) == 100
+
+
+def test_failed_job_is_requeued_with_backoff():
+    job = {"_id": "j1", "worker_id": "w1", "attempts": 2, "max_attempts": 5}
+    before = datetime.utcnow()
+    status, updates = _fail(job)
+
+    assert status == STATUS_QUEUED
+    [(query, update)] = updates
+    assert query == {"_id": "j1", "worker_id": "w1"}
+    fields = update["$set"]
+    assert fields["worker_id"] is None and fields["lease_expires_at"] is None
+    assert fields["run_at"] >= before + timedelta(seconds=backoff_seconds(2))
+    assert update["$push"]["errors"]["$each"][0]["error"] == "boom"
+
+
+def test_job_is_dead_lettered_after_its_last_attempt():
+    job = {"_id": "j1", "worker_id": "w1", "attempts": 3, "max_attempts": 3}
+    status, updates = _fail(job, "still broken")
+
+    assert status == STATUS_DEAD
+    fields = updates[0][1]["$set"]
+    assert fields["status"] == STATUS_DEAD
+    assert fields["last_error"] == "still broken"
+    assert "run_at" not in fields
+
+
+def test_default_max_attempts_applies_without_one_on_the_job(monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 2)
+    assert _fail({"_id": "j1", "worker_id": "w1", "attempts": 1})[0] == STATUS_QUEUED
+    assert _fail({"_id": "j1", "worker_id": "w1", "attempts": 2})[0] == STATUS_DEAD
+
+
+class DedupedJobs:
+    def __init__(self, modified=1, duplicate=False):
+        self.modified = modified
+        self.duplicate = duplicate
+
+    async def update_one(self, query, update):
+        if self.duplicate:
+            raise DuplicateKeyError("E11000 duplicate key error index: dedupe_key_active")
+        return SimpleNamespace(modified_count=self.modified)
+
+
+@pytest.mark.parametrize("jobs, expected", [
+    (DedupedJobs(), "requeued"),
+    (DedupedJobs(modified=0), "not_dead"),
+    (DedupedJobs(duplicate=True), "already_active"),
+])
+def test_retry_dead_job(jobs, expected):
+    db = SimpleNamespace(jobs=jobs)
+    assert asyncio.run(retry_dead_job(db, str(ObjectId()))) == expected
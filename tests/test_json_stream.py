@@ -0,0 +1,61 @@
+import json
+import random
+from services.json_stream import ArrayItemScanner
+
+QUIZ = {
+    "mcqs": [{"question": "What is {x}?", "options": ["a", "b\"}", "c", "d"], "answer_index": 1,
+              "explanation": "Braces ] and } in strings don't count."}],
+    "saqs": [{"question": "Q1", "answer": "A1"}, {"question": "Q2", "answer": "A2"}],
+    "laqs": [{"question": "Long?", "answer_outline": ["one", "two"]}],
+}
+
+
+def _scan(chunks):
+    scanner = ArrayItemScanner()
+    items = []
+    for chunk in chunks:
+        items.extend(scanner.feed(chunk))
+    return scanner, items
+
+
+def _expected():
+    return [(kind, item) for kind, items in QUIZ.items() for item in items]
+
+
+def test_items_from_whole_document():
+    scanner, items = _scan([json.dumps(QUIZ)])
+    assert items == _expected()
+    assert scanner.done
+
+
+def test_items_are_the_same_for_any_chunking():
+    text = "```json\n" + json.dumps(QUIZ, indent=2) + "\n```"
+    rng = random.Random(0)
+    for _ in range(50):
+        cuts = sorted(rng.sample(range(1, len(text)), 12))
+        chunks = [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+        assert _scan(chunks)[1] == _expected()
+
+
+def test_item_is_returned_as_soon_as_it_closes():
+    scanner = ArrayItemScanner()
+    assert scanner.feed('{"saqs": [{"question": "Q1", "answer": "A1"}') == [
+        ("saqs", {"question": "Q1", "answer": "A1"})]
+    assert scanner.feed(', {"question": "Q2"') == []
+    assert not scanner.done
+
+
+def test_invalid_item_is_returned_as_none():
+    _, items = _scan(['{"saqs": [{"question": "Q1", "answer": tru}, {"question": "Q2", "answer": "A2"}]}'])
+    assert items == [("saqs", None), ("saqs", {"question": "Q2", "answer": "A2"})]
+
+
+def test_text_after_the_object_is_ignored():
+    scanner, items = _scan(['{"saqs": []} {"saqs": [{"question": "late"}]}'])
+    assert items == []
+    assert scanner.done
+
+
+def test_nested_objects_are_part_of_their_item():
+    _, items = _scan(['{"mcqs": [{"question": "Q", "meta": {"tags": [{"t": 1}]}}]}'])
+    assert items == [("mcqs", {"question": "Q", "meta": {"tags": [{"t": 1}]}})]
@@ -0,0 +1,39 @@
+from datetime import datetime
+import pytest
+from bson.objectid import ObjectId
+from services.pagination import decode_cursor, encode_cursor, keyset_filter, keyset_sort
+
+
+def test_id_cursor_round_trips():
+    doc = {"_id": ObjectId()}
+    cursor = encode_cursor(doc)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (doc["_id"], None)
+
+
+def test_sort_field_cursor_round_trips():
+    doc = {"_id": ObjectId(), "updated_at": datetime(2024, 5, 1, 12, 30, 15, 123000)}
+    assert decode_cursor(encode_cursor(doc, "updated_at"), "updated_at") == (doc["_id"], doc["updated_at"])
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", encode_cursor({"_id": ObjectId()})[:-4] + "!!!!"])
+def test_bad_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_id_cursor_used_with_a_sort_field_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor({"_id": ObjectId()}), "updated_at")
+
+
+def test_keyset_filter_continues_after_the_cursor():
+    doc = {"_id": ObjectId(), "updated_at": datetime(2024, 5, 1)}
+    assert keyset_filter({"user_id": "u"}, None) == {"user_id": "u"}
+    assert keyset_filter({"user_id": "u"}, encode_cursor(doc)) == {"user_id": "u", "_id": {"$lt": doc["_id"]}}
+    assert keyset_filter({"user_id": "u"}, encode_cursor(doc, "updated_at"), "updated_at") == {
+        "user_id": "u",
+        "$or": [{"updated_at": {"$lt": doc["updated_at"]}},
+                {"updated_at": doc["updated_at"], "_id": {"$lt": doc["_id"]}}],
+    }
+    assert keyset_sort("updated_at") == [("updated_at", -1), ("_id", -1)]
@@ -0,0 +1,76 @@
+import pytest
+from types import SimpleNamespace
+from services import rate_limit
+from services.rate_limit import _parse_rate, _take_memory, client_address
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=clock))
+    monkeypatch.setattr(rate_limit, "_buckets", type(rate_limit._buckets)())
+    return clock
+
+
+def test_parse_rate():
+    assert _parse_rate("5/60") == (5, 5 / 60)
+
+
+def test_burst_up_to_capacity_then_rejects(clock):
+    results = [_take_memory("user", 3, 1.0)[0] for _ in range(4)]
+    assert results == [True, True, True, False]
+
+
+def test_tokens_refill_over_time(clock):
+    for _ in range(2):
+        _take_memory("user", 2, 0.5)
+    assert _take_memory("user", 2, 0.5)[0] is False
+
+    clock.now += 2
+    allowed, tokens = _take_memory("user", 2, 0.5)
+    assert allowed is True
+    assert tokens == pytest.approx(0)
+
+
+def test_refill_is_capped_at_capacity(clock):
+    _take_memory("user", 2, 1.0)
+    clock.now += 3600
+    assert [_take_memory("user", 2, 1.0)[0] for _ in range(3)] == [True, True, False]
+
+
+def test_buckets_are_per_key(clock):
+    assert _take_memory("a", 1, 1.0)[0] is True
+    assert _take_memory("a", 1, 1.0)[0] is False
+    assert _take_memory("b", 1, 1.0)[0] is True
+
+
+def test_least_recently_used_buckets_are_dropped(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit, "MEMORY_BUCKETS_MAX", 2)
+    for key in ("a", "b", "a", "c"):
+        _take_memory(key, 5, 1.0)
+    assert list(rate_limit._buckets) == ["a", "c"]
+
+
+def _request(forwarded=None, host="10.0.0.1"):
+    headers = {"x-forwarded-for": forwarded} if forwarded is not None else {}
+    return SimpleNamespace(headers=headers, client=SimpleNamespace(host=host))
+
+
+def test_client_address_without_proxies_ignores_forwarded_for(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_HOPS", 0)
+    assert client_address(_request("1.2.3.4")) == "10.0.0.1"
+
+
+def test_client_address_takes_the_entry_added_by_the_outermost_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_HOPS", 2)
+    # The client spoofed the first entry; the two proxies added the last two.
+    assert client_address(_request("6.6.6.6, 1.2.3.4, 172.16.0.5")) == "1.2.3.4"
+    assert client_address(_request("172.16.0.5")) == "10.0.0.1"
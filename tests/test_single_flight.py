@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+from services.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"answer": 42}
+
+    async def main():
+        flight = SingleFlight("test")
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_different_keys_run_separately():
+    async def main():
+        flight = SingleFlight("test")
+        return await asyncio.gather(flight.do("a", _value("a")), flight.do("b", _value("b")))
+
+    assert asyncio.run(main()) == ["a", "b"]
+
+
+def test_result_is_reused_within_grace_period():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def main():
+        flight = SingleFlight("test", grace_seconds=60)
+        first = await flight.do("key", work)
+        second = await flight.do("key", work)
+        flight.forget("key")
+        third = await flight.do("key", work)
+        return first, second, third
+
+    assert asyncio.run(main()) == (1, 1, 2)
+
+
+def test_without_grace_period_sequential_calls_rerun():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def main():
+        flight = SingleFlight("test")
+        return await flight.do("key", work), await flight.do("key", work)
+
+    assert asyncio.run(main()) == (1, 2)
+
+
+def test_failures_are_shared_but_not_reused():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("down")
+
+    async def main():
+        flight = SingleFlight("test", grace_seconds=60)
+        results = await asyncio.gather(flight.do("key", work), flight.do("key", work), return_exceptions=True)
+        with pytest.raises(RuntimeError):
+            await flight.do("key", work)
+        return results
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert calls == 2
+
+
+def test_cancelled_caller_does_not_cancel_shared_work():
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        flight = SingleFlight("test")
+        impatient = asyncio.ensure_future(flight.do("key", work))
+        patient = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.005)
+        impatient.cancel()
+        return await patient
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_reused_results_are_bounded():
+    async def main():
+        flight = SingleFlight("test", grace_seconds=60, max_results=2)
+        for key in ("a", "b", "c"):
+            await flight.do(key, _value(key))
+        return list(flight._results)
+
+    assert asyncio.run(main()) == ["b", "c"]
+
+
+def _value(value):
+    async def fn():
+        return value
+    return fn
@@ -0,0 +1,26 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+import worker
+
+
+def _die():
+    os._exit(1)
+
+
+def test_broken_pool_is_replaced_once():
+    pool = worker.WorkerPool.__new__(worker.WorkerPool)
+    pool._new_executor = lambda model_names: ProcessPoolExecutor(max_workers=1)
+    pool.executor = broken = ProcessPoolExecutor(max_workers=1)
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(_die).result()
+
+    pool.replace_broken(broken)
+    replacement = pool.executor
+    pool.replace_broken(broken)
+    try:
+        assert replacement is not broken and pool.executor is replacement
+        assert replacement.submit(abs, -3).result() == 3
+    finally:
+        replacement.shutdown()
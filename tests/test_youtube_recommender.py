@@ -0,0 +1,151 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import fitz
+import httpx
+import pytest
+from bson.objectid import ObjectId
+from services import blob_cache, youtube_recommender
+
+
+class Collection:
+    """Just enough of a motor collection for the recommender: _id lookups and $set."""
+
+    def __init__(self, docs=None):
+        self.docs = {doc["_id"]: doc for doc in docs or []}
+        self.reads = 0
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        doc = self.docs.get(query["_id"])
+        if doc is None or any(doc.get(k) != v for k, v in query.items() if k != "_id"):
+            return None
+        return dict(doc)
+
+    async def update_one(self, query, update):
+        self.docs[query["_id"]].update(update["$set"])
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.docs[query["_id"]] = {"_id": query["_id"], **doc}
+
+
+def _pdf_bytes() -> bytes:
+    doc = fitz.open()
+    for topic in ("photosynthesis chlorophyll chloroplast", "respiration mitochondria glucose"):
+        doc.new_page().insert_text((72, 72), f"{topic} {topic} energy")
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+class FakeYouTube:
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        n = int(request.url.params["maxResults"])
+        return httpx.Response(200, json={"items": [{
+            "id": {"videoId": f"v{i}"},
+            "snippet": {"title": f"Video {i}", "description": "",
+                        "thumbnails": {"default": {"url": f"https://img/{i}.jpg"}}},
+        } for i in range(n)]})
+
+
+@pytest.fixture
+def youtube(monkeypatch):
+    fake = FakeYouTube()
+    transport = httpx.MockTransport(fake)
+    monkeypatch.setattr(youtube_recommender, "YOUTUBE_API_KEY", "test-key")
+    monkeypatch.setattr(youtube_recommender, "_memory_cache", type(youtube_recommender._memory_cache)())
+    monkeypatch.setattr(youtube_recommender, "_http_client", None)
+    # The real client class with its pool settings, only the network swapped out.
+    client_class = httpx.AsyncClient
+    monkeypatch.setattr(youtube_recommender.httpx, "AsyncClient",
+                        lambda **kwargs: client_class(transport=transport, **kwargs))
+    monkeypatch.setattr(blob_cache, "BLOB_CACHE_MAX_BYTES", 0)
+    return fake
+
+
+@pytest.fixture
+def db():
+    pdf_id, file_id = ObjectId(), ObjectId()
+    return SimpleNamespace(
+        pdf_id=str(pdf_id),
+        pdfs=Collection([{"_id": pdf_id, "file_id": str(file_id), "title": "Biology", "deleted_at": None}]),
+        pdfs_content=Collection([{"_id": file_id, "content": _pdf_bytes()}]),
+        youtube_cache=Collection(),
+    )
+
+
+def _search(db, **kwargs):
+    async def main():
+        try:
+            return await youtube_recommender.search_youtube_videos(db.pdf_id, db, **kwargs)
+        finally:
+            await youtube_recommender.close_http_client()
+    return asyncio.run(main())
+
+
+def test_searches_through_the_pooled_client(youtube, db):
+    async def main():
+        first = await youtube_recommender.search_youtube_videos(db.pdf_id, db, max_results=2)
+        client = youtube_recommender.get_http_client()
+        youtube_recommender._memory_cache.clear()
+        db.youtube_cache.docs.clear()
+        await youtube_recommender.search_youtube_videos(db.pdf_id, db, max_results=3)
+        assert youtube_recommender.get_http_client() is client
+        await youtube_recommender.close_http_client()
+        return first
+
+    videos = asyncio.run(main())
+    assert [v["videoId"] for v in videos] == ["v0", "v1"]
+    assert len(youtube.requests) == 2
+    request = youtube.requests[0]
+    assert str(request.url).startswith(youtube_recommender.YOUTUBE_API_URL + "/search")
+    assert request.url.params["key"] == "test-key"
+
+
+def test_keywords_are_extracted_once_and_stored(youtube, db):
+    _search(db, max_results=2)
+    pdf = db.pdfs.docs[ObjectId(db.pdf_id)]
+    assert "photosynthesis" in pdf["search_keywords"]
+    assert db.pdfs_content.reads == 1
+
+    youtube_recommender._memory_cache.clear()
+    db.youtube_cache.docs.clear()
+    _search(db, max_results=2)
+    assert db.pdfs_content.reads == 1
+    assert youtube.requests[1].url.params["q"] == " ".join(pdf["search_keywords"])
+
+
+def test_memory_cache_hit_skips_mongo_cache_and_api(youtube, db):
+    first = _search(db)
+    cache_reads = db.youtube_cache.reads
+    assert _search(db) == first
+    assert db.youtube_cache.reads == cache_reads
+    assert len(youtube.requests) == 1
+
+
+def test_mongo_cache_hit_and_expiry(youtube, db, monkeypatch):
+    cache_key = f"{db.pdf_id}:5"
+    cached = [{"videoId": "cached"}]
+    db.youtube_cache.docs[cache_key] = {"_id": cache_key, "videos": cached, "created_at": datetime.utcnow()}
+    assert _search(db) == cached
+    assert youtube.requests == []
+    assert youtube_recommender._memory_cache_get(cache_key) == cached
+
+    youtube_recommender._memory_cache.clear()
+    expired = datetime.utcnow() - timedelta(seconds=youtube_recommender.YOUTUBE_CACHE_TTL_SECONDS + 1)
+    db.youtube_cache.docs[cache_key]["created_at"] = expired
+    videos = _search(db)
+    assert [v["videoId"] for v in videos] == [f"v{i}" for i in range(5)]
+    assert len(youtube.requests) == 1
+    assert db.youtube_cache.docs[cache_key]["created_at"] > expired
+
+
+def test_deleted_pdf_is_not_served_from_cache(youtube, db):
+    _search(db)
+    db.pdfs.docs[ObjectId(db.pdf_id)]["deleted_at"] = datetime.utcnow()
+    with pytest.raises(Exception, match="PDF not found"):
+        _search(db)
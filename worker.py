@@ -0,0 +1,366 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import os
+import socket
+import signal
+import asyncio
+import argparse
+import logging
+import multiprocessing
+import queue
+import time
+import uuid
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from bson.objectid import ObjectId
+import motor.motor_asyncio
+from services import job_queue
+from services import cleanup
+from services import blob_cache
+from services.single_flight import SingleFlight
+from services.index_versions import refresh_index_configs, keep_index_configs_fresh, write_configs
+from services.logging_config import configure_logging
+from services.metrics import STAGE_LATENCY, MongoCommandListener, update_job_queue_depth
+from prometheus_client import start_http_server
+from services.index_status import set_index_status, STAGE_EXTRACTING, STAGE_INDEXED, STAGE_RETRYING, STAGE_FAILED
+
+logger = logging.getLogger("worker")
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/revisely_db")
+POLL_INTERVAL_SECONDS = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+
+index_flight = SingleFlight("index_pdf")
+
+
+def _init_index_process(model_names: list):
+    # Load the embedding models once per pool process instead of once per job.
+    from services.rag_engine import get_embeddings
+    for model_name in model_names:
+        get_embeddings(model_name)
+
+
+def _run_index_pdf(pdf_id: str, pdf_content, progress_queue, configs: list) -> dict:
+    """
+    Indexes into every index in `configs` (the active one, plus one being
+    re-indexed into); progress and the returned result are the active one's.
+    """
+    from services.rag_engine import index_pdf_content
+
+    def on_stage(stage: str, progress: int):
+        progress_queue.put((pdf_id, stage, progress))
+
+    result = index_pdf_content(pdf_id, pdf_content, on_stage=on_stage, config=configs[0])
+    for config in configs[1:]:
+        index_pdf_content(pdf_id, pdf_content, config=config)
+    return result
+
+
+async def _drain_progress(db, progress_queue, stop: asyncio.Event):
+    # Pool processes report stage changes through a manager queue; only the
+    # parent talks to Mongo.
+    while not stop.is_set():
+        try:
+            pdf_id, stage, progress = await asyncio.to_thread(progress_queue.get, True, 1)
+        except queue.Empty:
+            continue
+        try:
+            await set_index_status(db, pdf_id, stage, progress, only_if_active=True)
+        except Exception as e:
+            logger.warning("Failed to record index status for %s: %s", pdf_id, e)
+
+
+async def run_index_job(db, pool, job: dict) -> dict:
+    # Duplicate jobs for one file that reach this worker together index it once.
+    pdf_id = job["payload"]["pdf_id"]
+    file_id = job["payload"]["file_id"]
+    return await index_flight.do((pdf_id, file_id), lambda: _index_pdf(db, pool, pdf_id, file_id))
+
+
+async def _index_pdf(db, pool, pdf_id: str, file_id: str) -> dict:
+    if not await db.pdfs.find_one({"_id": ObjectId(pdf_id), **cleanup.NOT_DELETED}, {"_id": 1}):
+        # Deleted while queued; indexing now would leave orphan vectors behind.
+        return {"skipped": "pdf deleted"}
+
+    await set_index_status(db, pdf_id, STAGE_EXTRACTING, 0)
+    started = time.perf_counter()
+    # A path into the blob cache when possible, so the bytes aren't pickled to the pool process.
+    pdf_content = await blob_cache.load_pdf_source(db, file_id)
+    if pdf_content is None:
+        raise FileNotFoundError(
+            f"PDF content not found for file_id: {file_id}")
+    fetch_seconds = time.perf_counter() - started
+
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(pool.executor, _run_index_pdf, pdf_id, pdf_content, pool.progress_queue, write_configs())
+    except FileNotFoundError:
+        if not isinstance(pdf_content, str):
+            raise
+        # Evicted from the cache before the pool process linked it; read it from Mongo instead.
+        pdf_content = await blob_cache.fetch_pdf(db, file_id)
+        if pdf_content is None:
+            raise
+        result = await loop.run_in_executor(pool.executor, _run_index_pdf, pdf_id, pdf_content, pool.progress_queue, write_configs())
+    result["timings"] = {"fetch": fetch_seconds, **result["timings"]}
+    for stage, seconds in result["timings"].items():
+        STAGE_LATENCY.labels(f"index_{stage}").observe(seconds)
+
+    await db.pdfs.update_one(
+        {"_id": ObjectId(pdf_id)},
+        {"$set": {"is_indexed": True, "indexed_at": datetime.utcnow(),
+                  "index_timings": result["timings"]}}
+    )
+    await set_index_status(db, pdf_id, STAGE_INDEXED)
+    return result
+
+
+def _run_index_pdf_batch(items: list, progress_queue, configs: list) -> dict:
+    from services.rag_engine import index_pdf_batch
+
+    def on_stage(pdf_id: str, stage: str, progress: int):
+        progress_queue.put((pdf_id, stage, progress))
+
+    results = index_pdf_batch(items, on_stage=on_stage, config=configs[0])
+    for config in configs[1:]:
+        for pdf_id, result in index_pdf_batch(items, config=config).items():
+            if "error" in result:
+                results[pdf_id] = result
+    return results
+
+
+async def run_index_batch_job(db, pool, job: dict) -> dict:
+    """
+    Indexes a batch upload's files in one pool task so embedding batches
+    span documents. Files that fail are handed to their own index_pdf job,
+    which retries them individually.
+    """
+    items = job["payload"]["items"]
+    started = time.perf_counter()
+    live = {str(doc["_id"]) async for doc in db.pdfs.find(
+        {"_id": {"$in": [ObjectId(i["pdf_id"]) for i in items]}, **cleanup.NOT_DELETED}, {"_id": 1})}
+    items = [i for i in items if i["pdf_id"] in live]
+    contents = await blob_cache.load_pdfs(db, [i["file_id"] for i in items])
+    fetch_seconds = time.perf_counter() - started
+
+    batch = [(i["pdf_id"], contents[i["file_id"]]) for i in items if i["file_id"] in contents]
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(pool.executor, _run_index_pdf_batch, batch, pool.progress_queue, write_configs())
+
+    files = {}
+    for item in items:
+        pdf_id = item["pdf_id"]
+        result = results.get(pdf_id, {"error": "PDF content not found"})
+        if "error" in result:
+            await set_index_status(db, pdf_id, STAGE_RETRYING, error=result["error"])
+            await job_queue.enqueue_index_job(db, pdf_id, item["file_id"])
+            files[pdf_id] = {"status": "requeued", "error": result["error"]}
+            continue
+
+        result["timings"] = {"fetch": fetch_seconds / max(len(items), 1), **result["timings"]}
+        for stage, seconds in result["timings"].items():
+            STAGE_LATENCY.labels(f"index_{stage}").observe(seconds)
+        await db.pdfs.update_one(
+            {"_id": ObjectId(pdf_id)},
+            {"$set": {"is_indexed": True, "indexed_at": datetime.utcnow(),
+                      "index_timings": result["timings"]}}
+        )
+        await set_index_status(db, pdf_id, STAGE_INDEXED)
+        files[pdf_id] = {"status": "indexed", "pages": result["pages"], "chunks": result["chunks"]}
+    return {"files": files}
+
+
+async def on_index_batch_job_failed(db, job: dict, status: str, error: str):
+    stage = STAGE_FAILED if status == job_queue.STATUS_DEAD else STAGE_RETRYING
+    for item in job["payload"]["items"]:
+        await set_index_status(db, item["pdf_id"], stage, error=error)
+
+
+async def on_index_job_failed(db, job: dict, status: str, error: str):
+    stage = STAGE_FAILED if status == job_queue.STATUS_DEAD else STAGE_RETRYING
+    await set_index_status(db, job["payload"]["pdf_id"], stage, error=error)
+
+
+async def run_delete_job(db, pool, job: dict) -> dict:
+    payload = job["payload"]
+    return {"deleted": await cleanup.delete_pdf_cascade(db, payload["pdf_id"], payload["file_id"])}
+
+
+JOB_HANDLERS = {
+    job_queue.INDEX_PDF_JOB: run_index_job,
+    job_queue.INDEX_PDF_BATCH_JOB: run_index_batch_job,
+    job_queue.DELETE_PDF_JOB: run_delete_job,
+}
+
+FAILURE_HANDLERS = {
+    job_queue.INDEX_PDF_JOB: on_index_job_failed,
+    job_queue.INDEX_PDF_BATCH_JOB: on_index_batch_job_failed,
+}
+
+
+class WorkerPool:
+    def __init__(self, concurrency: int, model_names: list):
+        # spawn, not fork: the parent already runs an event loop and motor threads.
+        self.ctx = multiprocessing.get_context("spawn")
+        self.concurrency = concurrency
+        self.manager = self.ctx.Manager()
+        self.progress_queue = self.manager.Queue()
+        self.executor = self._new_executor(model_names)
+
+    def _new_executor(self, model_names: list) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.concurrency,
+            mp_context=self.ctx,
+            initializer=_init_index_process,
+            initargs=(model_names,)
+        )
+
+    def replace_broken(self, executor: ProcessPoolExecutor):
+        """
+        Swaps in a fresh executor after a pool process died (e.g. OOM-killed),
+        which leaves a ProcessPoolExecutor broken for good. Slots that failed
+        on the same broken executor only replace it once.
+        """
+        if self.executor is not executor:
+            return
+        logger.warning("Index process pool broke; starting a new one")
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self._new_executor([config["model"] for config in write_configs()])
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.manager.shutdown()
+
+
+async def _keep_lease(db, job: dict):
+    while True:
+        await asyncio.sleep(job_queue.JOB_LEASE_SECONDS / 3)
+        if not await job_queue.extend_lease(db, job):
+            logger.warning("Lost lease on job %s", job["_id"])
+            return
+
+
+async def _process_job(db, pool, job: dict):
+    handler = JOB_HANDLERS[job["type"]]
+    heartbeat = asyncio.create_task(_keep_lease(db, job))
+    started = time.perf_counter()
+    executor = pool.executor
+    try:
+        result = await handler(db, pool, job)
+        await job_queue.complete_job(db, job, result)
+        logger.info("Job %s (%s) done in %.2fs", job["_id"], job["type"], time.perf_counter() - started,
+                    extra={"job_id": str(job["_id"]), "timings": result.get("timings")})
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            # The job still counts as failed: it may be what killed the process.
+            pool.replace_broken(executor)
+        error = f"{type(e).__name__}: {e}"
+        status = await job_queue.fail_job(db, job, error)
+        logger.error("Job %s (%s) failed on attempt %s, now %s: %s",
+                     job["_id"], job["type"], job["attempts"], status, e,
+                     extra={"job_id": str(job["_id"]), "job_status": status})
+        on_failed = FAILURE_HANDLERS.get(job["type"])
+        if on_failed:
+            await on_failed(db, job, status, error)
+    finally:
+        heartbeat.cancel()
+
+
+async def _worker_slot(db, pool, worker_id: str, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            job = await job_queue.claim_job(db, worker_id, job_types=list(JOB_HANDLERS))
+        except Exception as e:
+            logger.error("Failed to claim job: %s", e)
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        await _process_job(db, pool, job)
+
+
+async def _report_queue_depth(db, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await update_job_queue_depth(db)
+        except Exception as e:
+            logger.warning("Failed to read job queue depth: %s", e)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=15)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _sweep_orphans(db, worker_id: str, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            if await cleanup.acquire_sweep_lock(db, worker_id):
+                started = time.perf_counter()
+                counts = await cleanup.sweep_orphans(db)
+                logger.info("Orphan sweep done in %.2fs: %s", time.perf_counter() - started, counts)
+        except Exception as e:
+            logger.warning("Orphan sweep failed: %s", e)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=cleanup.ORPHAN_SWEEP_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_worker(concurrency: int, metrics_port: int = 0):
+    client = motor.motor_asyncio.AsyncIOMotorClient(
+        MONGODB_URI, event_listeners=[MongoCommandListener()])
+    db = client.get_database("revisely_db")
+    await job_queue.ensure_job_indexes(db)
+    await cleanup.ensure_cleanup_indexes(db)
+    await refresh_index_configs(db)
+
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    pool = WorkerPool(concurrency, [config["model"] for config in write_configs()])
+    drain = asyncio.create_task(_drain_progress(db, pool.progress_queue, stop))
+    sweep = asyncio.create_task(_sweep_orphans(db, worker_id, stop))
+    configs = asyncio.create_task(keep_index_configs_fresh(db, stop))
+    if metrics_port:
+        start_http_server(metrics_port)
+        depth = asyncio.create_task(_report_queue_depth(db, stop))
+    logger.info("Worker %s started with concurrency %s", worker_id, concurrency)
+    try:
+        await asyncio.gather(*(_worker_slot(db, pool, worker_id, stop) for _ in range(concurrency)))
+    finally:
+        await drain
+        await sweep
+        await configs
+        if metrics_port:
+            await depth
+        pool.shutdown()
+        client.close()
+        logger.info("Worker %s stopped", worker_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Revisely background job worker")
+    parser.add_argument("--concurrency", type=int,
+                        default=int(os.getenv("WORKER_CONCURRENCY", "2")),
+                        help="number of jobs to run in parallel (one pool process each)")
+    parser.add_argument("--metrics-port", type=int,
+                        default=int(os.getenv("WORKER_METRICS_PORT", "0")),
+                        help="serve Prometheus metrics on this port (0 disables)")
+    args = parser.parse_args()
+
+    configure_logging()
+    asyncio.run(run_worker(args.concurrency, args.metrics_port))
+
+
+if __name__ == "__main__":
+    main()